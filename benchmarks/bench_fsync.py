@@ -0,0 +1,60 @@
+"""
+Compares the latency of the atomic rc-file write under each fsync policy.
+
+    python benchmarks/bench_fsync.py --iterations 200 --size 4096
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from setenvironment.util import FSYNC_POLICIES, atomic_write_bytes
+
+
+def bench_policy(path: str, data: bytes, policy: str, iterations: int) -> list[float]:
+    """Returns the duration of each write in seconds."""
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        atomic_write_bytes(path, data, fsync=policy)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def bench_in_place(path: str, data: bytes, iterations: int) -> list[float]:
+    """The truncate and rewrite the package used before atomic writes."""
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        with open(path, mode="wb") as file:
+            file.write(data)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark atomic write fsync policies")
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--size", type=int, default=4096, help="Bytes per write")
+    parser.add_argument("--dir", default=None, help="Directory to write in, e.g. an NFS home")
+    args = parser.parse_args()
+    data = b"export FOO=bar\n" * max(1, args.size // 15)
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmpdir:
+        path = os.path.join(tmpdir, "bench.bashrc")
+        results = {"in-place": bench_in_place(path, data, args.iterations)}
+        for policy in FSYNC_POLICIES:
+            results[policy] = bench_policy(path, data, policy, args.iterations)
+    print(f"{'policy':<10} {'mean ms':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for name, timings in results.items():
+        timings.sort()
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        print(
+            f"{name:<10} {statistics.mean(timings) * 1000:>10.3f}"
+            f" {timings[len(timings) // 2] * 1000:>10.3f} {p99 * 1000:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Compares the path group operations on a PathList against the plain list
+`while p in paths: paths.remove(p)` loops they replaced, for long PATHs.
+
+    python benchmarks/bench_paths.py --sizes 1000 2000 5000 10000
+"""
+
+import argparse
+import time
+
+from setenvironment.types import Environment
+
+
+def _make_paths(size: int) -> list[str]:
+    # Stacked toolchain modules repeat a few directories many times.
+    return [f"/opt/toolchain/{i % (size // 2 or 1)}/bin" for i in range(size)]
+
+
+def legacy_remove_path_group(paths: list[str], group: list[str]) -> None:
+    for path in group:
+        while path in paths:
+            paths.remove(path)
+
+
+def legacy_add_to_path_group(paths: list[str], new_path: str) -> None:
+    while new_path in paths:
+        paths.remove(new_path)
+    paths.insert(0, new_path)
+
+
+def _time(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_size(size: int, group_size: int, repeat: int) -> dict[str, float]:
+    """Returns the best time in seconds of each operation for one PATH size."""
+    paths = _make_paths(size)
+    group = paths[: group_size * 2 : 2]
+    results = {}
+
+    def legacy_add() -> None:
+        copy = list(paths)
+        for path in group:
+            legacy_add_to_path_group(copy, path)
+
+    def new_add() -> None:
+        env = Environment(vars={}, paths=paths)
+        for path in group:
+            env.path_list().move_to_front(path)
+
+    def legacy_remove() -> None:
+        legacy_remove_path_group(list(paths), group)
+
+    def new_remove() -> None:
+        env = Environment(vars={"GROUP": ":".join(group)}, paths=paths)
+        env.remove_path_group("GROUP")
+
+    results["add legacy"] = _time(legacy_add, repeat)
+    results["add PathList"] = _time(new_add, repeat)
+    results["remove legacy"] = _time(legacy_remove, repeat)
+    results["remove PathList"] = _time(new_remove, repeat)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark PATH list operations")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 2000, 5000, 10000])
+    parser.add_argument("--group", type=int, default=50, help="Paths in the path group")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(f"{'entries':>8} {'operation':<16} {'best ms':>10}")
+    for size in args.sizes:
+        for name, seconds in bench_size(size, args.group, args.repeat).items():
+            print(f"{size:>8} {name:<16} {seconds * 1000:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Compares the latency of capturing the environment of the shell: the old
+temp script + `python -m setenvironment.os_env_json` against `env -0`.
+
+By default both run against an empty HOME so that the cost of ~/.profile
+doesn't drown out the difference, pass --real-home to source your own.
+
+    python benchmarks/bench_shell_capture.py --iterations 20
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from setenvironment.bash_parser import bash_rc_file
+from setenvironment.setenv_unix import parse_shell_capture, shell_capture_script
+
+
+def legacy_capture(settings_file: str, env: dict[str, str]) -> dict:
+    """The capture get_env_vars_from_shell did before env -0."""
+    delim = "-------- BEGIN setenviorment.os_env_json --------"
+    cmd = [
+        "source ~/.profile",
+        f'source "{settings_file}"',
+        f'echo "{delim}"',
+        f'"{sys.executable}" -m setenvironment.os_env_json',
+    ]
+    with tempfile.NamedTemporaryFile(suffix=".sh", delete=False) as tmpfile:
+        tmp_filename = tmpfile.name
+        tmpfile.write("; ".join(cmd).encode("utf-8"))
+    os.chmod(tmp_filename, os.stat(tmp_filename).st_mode | 0o111)
+    completed_process = subprocess.run(
+        ["/bin/bash", tmp_filename],
+        capture_output=True,
+        universal_newlines=True,
+        check=True,
+        env=env,
+    )
+    os.remove(tmp_filename)
+    return json.loads(completed_process.stdout.split(delim)[1])
+
+
+def env0_capture(settings_file: str, env: dict[str, str]) -> dict:
+    """The capture get_env_vars_from_shell does now."""
+    completed_process = subprocess.run(
+        ["/bin/bash", "-c", shell_capture_script(settings_file)],
+        capture_output=True,
+        check=True,
+        env=env,
+    )
+    return parse_shell_capture(completed_process.stdout).vars
+
+
+def bench(func, settings_file: str, env: dict[str, str], iterations: int) -> list[float]:
+    """Returns the duration of each capture in seconds."""
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func(settings_file, env)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark shell environment capture")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--config", default=None, help="rc file to source")
+    parser.add_argument("--real-home", action="store_true", help="Source your own ~/.profile")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as home:
+        env: dict[str, str] = {}
+        if not args.real_home:
+            env["HOME"] = home
+            open(os.path.join(home, ".profile"), mode="w").close()
+        settings_file = args.config or (bash_rc_file() if args.real_home else os.devnull)
+        results = {
+            "python -m os_env_json": bench(legacy_capture, settings_file, env, args.iterations),
+            "env -0": bench(env0_capture, settings_file, env, args.iterations),
+        }
+    print(f"{'capture':<22} {'mean ms':>10} {'p50 ms':>10} {'min ms':>10}")
+    for name, timings in results.items():
+        print(
+            f"{name:<22} {statistics.mean(timings) * 1000:>10.2f}"
+            f" {statistics.median(timings) * 1000:>10.2f} {min(timings) * 1000:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
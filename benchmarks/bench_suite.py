@@ -0,0 +1,262 @@
+"""
+Times every public operation against synthetic rc files at several scales and
+writes the results as JSON, so that two versions can be compared.
+
+    python benchmarks/bench_suite.py --output before.json
+    git checkout my-branch
+    python benchmarks/bench_suite.py --output after.json --compare before.json
+
+Each scale is a generated .bashrc (see setenvironment.testing.corpus) in a
+temporary HOME: "small" is 10 exports, 10 PATH entries and 1 KB, "large" is
+5,000 exports, 10,000 PATH entries and 10 MB. Every operation is timed
+--repeat times with a fresh copy of the rc file, then run once more under
+tracemalloc for its peak Python memory. The CLI entry points run as child
+processes and report their peak RSS instead.
+
+get_env and reload_environment start bash, which sources your own
+~/.profile, as they do in production. The on disk cache of the shell
+environment is off unless --env-cache is passed. Unix only.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Callable
+
+from setenvironment import env_cache, setenv
+from setenvironment.bash_parser import bash_cache_clear, bash_rc_set_file
+from setenvironment.testing.corpus import make_paths, write_corpus
+
+# name -> (exports, PATH entries, rc file bytes)
+SCALES = {
+    "small": (10, 10, 1024),
+    "medium": (500, 1000, 100 * 1024),
+    "large": (5000, 10000, 10 * 1024 * 1024),
+}
+GROUP = "CORPUS_GROUP_0"
+GROUP_SIZE = 10
+
+
+@dataclass
+class Result:
+    scale: str
+    operation: str
+    repeat: int
+    min: float  # seconds
+    median: float
+    mean: float
+    peak_bytes: int  # tracemalloc peak, or the peak RSS of a child process
+
+
+@dataclass
+class Operation:
+    name: str
+    run: Callable[[], object]
+    setup: Callable[[], None] | None = None  # untimed, before every run
+    child: list[str] | None = None  # argv of a child process instead of run
+
+
+def _version() -> str:
+    try:
+        from importlib.metadata import version
+
+        return version("setenvironment")
+    except Exception:  # pylint: disable=broad-except
+        return "unknown"
+
+
+def _cli(*args: str) -> list[str]:
+    return [sys.executable, "-m", "setenvironment.main", *args]
+
+
+def _operations(rc_file: str, paths: list[str]) -> list[Operation]:
+    """The operations timed at every scale, against rc_file."""
+    new_path = "/opt/bench/new/bin"
+    existing = paths[len(paths) // 2]
+
+    def add_group() -> None:
+        setenv.add_to_path_group(GROUP, new_path)
+
+    return [
+        Operation("set_env_var", lambda: setenv.set_env_var("BENCH_VAR", "value")),
+        Operation("get_env_var", lambda: setenv.get_env_var("CORPUS_VAR_0")),
+        Operation("unset_env_var", lambda: setenv.unset_env_var("CORPUS_VAR_1")),
+        Operation("get_paths", setenv.get_paths),
+        Operation("add_env_path", lambda: setenv.add_env_path(new_path)),
+        Operation("remove_env_path", lambda: setenv.remove_env_path(existing)),
+        Operation("add_to_path_group", add_group),
+        Operation(
+            "remove_from_path_group",
+            lambda: setenv.remove_from_path_group(GROUP, new_path),
+            setup=add_group,
+        ),
+        Operation("remove_path_group", lambda: setenv.remove_path_group(GROUP)),
+        Operation("get_env", setenv.get_env),
+        Operation("reload_environment", setenv.reload_environment),
+        Operation("cli get", lambda: None, child=_cli("--config", rc_file, "get", "CORPUS_VAR_0")),
+        Operation("cli set", lambda: None, child=_cli("--config", rc_file, "set", "BENCH_VAR", "v")),
+        Operation("cli addpath", lambda: None, child=_cli("--config", rc_file, "addpath", new_path)),
+        Operation("cli has", lambda: None, child=_cli("--config", rc_file, "has", "CORPUS_VAR_0")),
+    ]
+
+
+def _run_child(argv: list[str]) -> tuple[float, int]:
+    """Returns the duration and the peak RSS in bytes of a child process."""
+    start = time.perf_counter()
+    proc = subprocess.Popen(argv, stdout=subprocess.DEVNULL)
+    _, status, rusage = os.wait4(proc.pid, 0)
+    seconds = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(argv)} exited with {proc.returncode}")
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    scale = 1 if sys.platform == "darwin" else 1024
+    return seconds, rusage.ru_maxrss * scale
+
+
+def _measure(op: Operation, reset: Callable[[], None], repeat: int) -> tuple[list[float], int]:
+    timings = []
+    peak = 0
+    saved_environ = dict(os.environ)
+    try:
+        for i in range(repeat + 1):
+            os.environ.clear()
+            os.environ.update(saved_environ)
+            reset()
+            if op.setup is not None:
+                op.setup()
+            if op.child is not None:
+                seconds, rss = _run_child(op.child)
+                peak = max(peak, rss)
+            elif i == repeat:
+                # The last run is only for the memory, tracemalloc slows it down.
+                tracemalloc.start()
+                op.run()
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                continue
+            else:
+                start = time.perf_counter()
+                op.run()
+                seconds = time.perf_counter() - start
+            if i < repeat:
+                timings.append(seconds)
+    finally:
+        os.environ.clear()
+        os.environ.update(saved_environ)
+    return timings, peak
+
+
+def bench_scale(
+    scale: str, workdir: str, repeat: int, only: list[str] | None = None
+) -> list[Result]:
+    """Returns the results of every operation at one scale."""
+    exports, path_count, size = SCALES[scale]
+    home = os.path.join(workdir, scale)
+    kwargs = dict(exports=exports, paths=path_count, size=size, groups=1, group_size=GROUP_SIZE)
+    pristine = write_corpus(home, **kwargs)
+    rc_file = os.path.join(home, "bench.bashrc")
+    paths = make_paths(path_count)
+
+    def reset() -> None:
+        shutil.copyfile(pristine, rc_file)
+        # The copy can land within the same mtime tick as the last write.
+        bash_cache_clear()
+
+    bash_rc_set_file(rc_file)
+    results = []
+    try:
+        for op in _operations(rc_file, paths):
+            if only and op.name not in only:
+                continue
+            timings, peak = _measure(op, reset, repeat)
+            results.append(
+                Result(
+                    scale=scale,
+                    operation=op.name,
+                    repeat=repeat,
+                    min=min(timings),
+                    median=statistics.median(timings),
+                    mean=statistics.mean(timings),
+                    peak_bytes=peak,
+                )
+            )
+            print(
+                f"{scale:<7} {op.name:<24} {results[-1].median * 1000:>10.2f} ms"
+                f" {peak / 1024:>10.0f} KiB",
+                file=sys.stderr,
+            )
+    finally:
+        bash_rc_set_file(None)
+    return results
+
+
+def compare(base: dict, new: dict, threshold: float) -> list[str]:
+    """Prints the median and peak memory ratios of new against base. Returns the
+    operations that got slower or bigger than threshold times."""
+    old = {(r["scale"], r["operation"]): r for r in base["results"]}
+    regressions = []
+    print(f"{'scale':<7} {'operation':<24} {'median':>8} {'peak':>8}")
+    for r in new["results"]:
+        key = (r["scale"], r["operation"])
+        if key not in old:
+            continue
+        time_ratio = r["median"] / max(old[key]["median"], 1e-9)
+        mem_ratio = r["peak_bytes"] / max(old[key]["peak_bytes"], 1)
+        flag = ""
+        if time_ratio > threshold or mem_ratio > threshold:
+            regressions.append(f"{key[0]} {key[1]}")
+            flag = "  REGRESSION"
+        print(f"{key[0]:<7} {key[1]:<24} {time_ratio:>7.2f}x {mem_ratio:>7.2f}x{flag}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the setenvironment API")
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=list(SCALES))
+    parser.add_argument("--operations", nargs="+", default=None, help="Only these operations")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file")
+    parser.add_argument("--compare", default=None, help="Results of an earlier run to compare to")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Ratio that is a regression")
+    parser.add_argument("--env-cache", action="store_true", help="Keep the shell environment cache")
+    args = parser.parse_args()
+    if sys.platform == "win32":
+        print("The benchmark suite works on bash files, unix only.", file=sys.stderr)
+        return 1
+    env_cache.set_env_cache(args.env_cache)
+    with tempfile.TemporaryDirectory() as workdir:
+        results = []
+        for scale in args.scales:
+            results += bench_scale(scale, workdir, args.repeat, args.operations)
+    data = {
+        "version": _version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "results": [asdict(result) for result in results],
+    }
+    if args.output:
+        with open(args.output, encoding="utf-8", mode="w") as file:
+            json.dump(data, file, indent=2)
+    else:
+        print(json.dumps(data, indent=2))
+    if args.compare:
+        with open(args.compare, encoding="utf-8", mode="r") as file:
+            base = json.load(file)
+        if compare(base, data, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,59 @@
 """
 setenvironment
+
+The API below is imported on first use, so that `import setenvironment` (and
+with it every run of the command line tools) does not load the modules that
+a command never calls.
 """
 
-from .setenv import (
-    Environment,
-    add_env_path,
-    get_env,
-    get_env_var,
-    get_paths,
-    reload_environment,
-    remove_env_path,
-    set_env_var,
-    unset_env_var,
-)
-
-Environment = Environment
-add_env_path = add_env_path
-get_env_var = get_env_var
-remove_env_path = remove_env_path
-set_env_var = set_env_var
-unset_env_var = unset_env_var
-reload_environment = reload_environment
-get_env = get_env
-get_paths = get_paths
+# pylint: disable=import-outside-toplevel
+
+from typing import TYPE_CHECKING
+
+# name -> module that defines it
+_EXPORTS = {
+    "Environment": "setenvironment.setenv",
+    "add_env_path": "setenvironment.setenv",
+    "get_env": "setenvironment.setenv",
+    "get_env_var": "setenvironment.setenv",
+    "get_paths": "setenvironment.setenv",
+    "reload_environment": "setenvironment.setenv",
+    "remove_env_path": "setenvironment.setenv",
+    "set_env_var": "setenvironment.setenv",
+    "transaction": "setenvironment.setenv",
+    "unset_env_var": "setenvironment.setenv",
+    "which": "setenvironment.exe_index",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module 'setenvironment' has no attribute {name!r}")
+    import importlib
+
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(_EXPORTS))
+
+
+if TYPE_CHECKING:
+    from .exe_index import which
+    from .setenv import (
+        Environment,
+        add_env_path,
+        get_env,
+        get_env_var,
+        get_paths,
+        reload_environment,
+        remove_env_path,
+        set_env_var,
+        transaction,
+        unset_env_var,
+    )
@@ -0,0 +1,282 @@
+"""
+Asyncio versions of the setenvironment API.
+
+The shell capture of get_env() and reload_environment() runs bash with
+asyncio.create_subprocess_exec, everything else (reading and writing the
+bash file, the registry on windows) runs in the default executor so the
+event loop is never blocked.
+
+Cancelling a call, or running past its timeout, kills the bash process. A
+mutation waits at most its timeout for the lock of the bash file, and is
+skipped if it is cancelled before it gets the lock; once it holds the lock it
+runs to completion, so the bash file is never left half written.
+
+Transactions are per thread and do not span these calls: the mutations raise
+RuntimeError inside setenvironment.transaction(), whose lock the calling
+thread holds, instead of waiting for it from the executor.
+"""
+
+# pylint: disable=import-outside-toplevel,protected-access
+
+import asyncio
+import functools
+import os
+import signal
+import subprocess
+import sys
+import threading
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any, Callable, Optional, TypeVar, Union
+
+from setenvironment import setenv
+from setenvironment.types import Environment
+
+_IS_WINDOWS = sys.platform == "win32"
+SHELL_TIMEOUT = 30.0  # seconds
+
+T = TypeVar("T")
+
+
+async def _run_in_executor(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+
+def _call_unless_cancelled(
+    cancelled: threading.Event, timeout: Optional[float], func: Callable[..., None], args, kwargs
+) -> None:
+    if _IS_WINDOWS:
+        lock: Any = nullcontext()
+    else:
+        from setenvironment.bash_parser import bash_rc_file
+        from setenvironment.lock import rc_file_lock
+
+        # The mutation takes the same lock again, which is reentrant.
+        lock = rc_file_lock(bash_rc_file(), timeout)
+    with lock:
+        if not cancelled.is_set():
+            func(*args, **kwargs)
+
+
+async def _mutate(
+    func: Callable[..., None], *args: Any, timeout: Optional[float] = None, **kwargs: Any
+) -> None:
+    """Runs the mutation in the executor. timeout bounds the wait for the
+    lock of the bash file, None means lock.LOCK_TIMEOUT. Raises
+    LockTimeoutError when it runs out."""
+    if not _IS_WINDOWS:
+        from setenvironment.setenv_unix import _current_transaction
+
+        if _current_transaction() is not None:
+            raise RuntimeError(
+                f"aio.{func.__name__}() can't run inside setenvironment.transaction(),"
+                f" use setenvironment.{func.__name__}() there"
+            )
+    cancelled = threading.Event()
+    try:
+        await _run_in_executor(_call_unless_cancelled, cancelled, timeout, func, args, kwargs)
+    except asyncio.CancelledError:
+        cancelled.set()
+        raise
+
+
+async def _capture(script: str, timeout: Optional[float]) -> bytes:
+    """Runs the capture script with bash, returns its stdout."""
+    proc = await asyncio.create_subprocess_exec(
+        "/bin/bash",
+        "-c",
+        script,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        env={},  # do not inherit parent environment
+        start_new_session=True,  # so that a kill takes its children too
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+    except BaseException:  # timeout or cancellation
+        if proc.returncode is None:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await proc.wait()
+        raise
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(
+            proc.returncode or 0, ["/bin/bash", "-c", script], stdout, stderr
+        )
+    return stdout
+
+
+async def get_env_vars_from_shell(
+    settings_file: Optional[str] = None, timeout: Optional[float] = SHELL_TIMEOUT
+) -> Environment:
+    """Async version of setenv_unix.get_env_vars_from_shell."""
+    from setenvironment.bash_parser import bash_rc_file
+    from setenvironment.setenv_unix import parse_shell_capture, shell_capture_script
+
+    settings_file = settings_file or bash_rc_file()
+    stdout = await _capture(shell_capture_script(settings_file), timeout)
+    return parse_shell_capture(stdout)
+
+
+def _file_digests(settings_file: str) -> dict[str, Optional[str]]:
+    from setenvironment import env_cache
+
+    return {path: env_cache.file_digest(path) for path in env_cache.watched_files(settings_file)}
+
+
+async def _unix_get_env(timeout: Optional[float]) -> Environment:
+    from setenvironment import env_cache
+    from setenvironment.bash_parser import bash_rc_file
+    from setenvironment.setenv_unix import (
+        combine_os_environment,
+        parse_shell_capture,
+        parse_sourced_files,
+        shell_capture_script,
+    )
+
+    settings_file = bash_rc_file()
+    if not env_cache.ENV_CACHE:
+        shell_env = await get_env_vars_from_shell(settings_file, timeout)
+        return combine_os_environment(shell_env)
+    script = shell_capture_script(settings_file, record_sources=True)
+    cached = await _run_in_executor(env_cache.cache_load, settings_file, script)
+    if cached is None:
+        digests = await _run_in_executor(_file_digests, settings_file)
+        stdout = await _capture(script, timeout)
+        cached = parse_shell_capture(stdout)
+        await _run_in_executor(
+            env_cache.cache_store,
+            settings_file,
+            script,
+            cached,
+            parse_sourced_files(stdout),
+            digests,
+        )
+    return combine_os_environment(cached)
+
+
+async def get_env(timeout: Optional[float] = SHELL_TIMEOUT) -> Environment:
+    """Gets the environment."""
+    if _IS_WINDOWS:
+        return await _run_in_executor(setenv.get_env)
+    return await _unix_get_env(timeout)
+
+
+async def reload_environment(
+    verbose=False,
+    resolve=False,
+    fast=False,
+    normalize=False,
+    realpath=False,
+    timeout: Optional[float] = SHELL_TIMEOUT,
+) -> None:
+    """Reloads the environment."""
+    if _IS_WINDOWS:
+        await _run_in_executor(
+            setenv.reload_environment, verbose=verbose, normalize=normalize, realpath=realpath
+        )
+        return
+    from setenvironment.setenv_unix import _fast_reload, apply_environment
+
+    if not (fast and await _run_in_executor(_fast_reload)):
+        env = await _unix_get_env(timeout)
+        apply_environment(env, resolve)
+    if normalize or realpath:
+        await _run_in_executor(setenv._normalize_os_path, realpath)
+
+
+async def set_env_var(
+    var_name: str,
+    var_value: Union[str, Path, int, float],
+    verbose=False,
+    update_curr_environment: bool = True,
+    namespace: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> None:
+    """Sets an environment variable for the platform."""
+    await _mutate(
+        setenv.set_env_var,
+        var_name,
+        var_value,
+        verbose=verbose,
+        update_curr_environment=update_curr_environment,
+        namespace=namespace,
+        timeout=timeout,
+    )
+
+
+async def get_env_var(
+    var_name: str, verbose=False, resolve=None, namespace: Optional[str] = None
+) -> Optional[str]:
+    """Gets an environment variable for the platform."""
+    return await _run_in_executor(
+        setenv.get_env_var, var_name, verbose=verbose, resolve=resolve, namespace=namespace
+    )
+
+
+async def unset_env_var(
+    var_name: str,
+    verbose=False,
+    namespace: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> None:
+    """Unsets an environment variable for the platform."""
+    await _mutate(
+        setenv.unset_env_var, var_name, verbose=verbose, namespace=namespace, timeout=timeout
+    )
+
+
+async def add_env_path(
+    new_path: Union[Path, str],
+    namespace: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> None:
+    """Adds a path to the front of the PATH environment variable."""
+    await _mutate(setenv.add_env_path, new_path, namespace=namespace, timeout=timeout)
+
+
+async def remove_env_path(
+    path: Union[Path, str],
+    namespace: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> None:
+    """Removes a path from the PATH environment variable."""
+    await _mutate(setenv.remove_env_path, path, namespace=namespace, timeout=timeout)
+
+
+async def add_to_path_group(
+    group_name: str,
+    new_path: str,
+    namespace: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> None:
+    """Adds a path to the path group and to the PATH."""
+    await _mutate(
+        setenv.add_to_path_group, group_name, new_path, namespace=namespace, timeout=timeout
+    )
+
+
+async def remove_from_path_group(
+    group_name: str,
+    path_to_remove: str,
+    namespace: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> None:
+    """Removes a path from the path group and from the PATH."""
+    await _mutate(
+        setenv.remove_from_path_group,
+        group_name,
+        path_to_remove,
+        namespace=namespace,
+        timeout=timeout,
+    )
+
+
+async def remove_path_group(
+    group_name: str, namespace: Optional[str] = None, timeout: Optional[float] = None
+) -> None:
+    """Removes the path group and all of its paths from the PATH."""
+    await _mutate(setenv.remove_path_group, group_name, namespace=namespace, timeout=timeout)
@@ -0,0 +1,189 @@
+"""
+Tokenizer and AST for the setenvironment managed block of a bash file.
+"""
+
+import re
+from dataclasses import dataclass, field
+
+from setenvironment.types import BashEnvironment, Environment
+
+_EXPORT_RE = re.compile(r"^\s*export\s+([A-Za-z_][A-Za-z0-9_]*)=(.*)$")
+_PATH_SELF_REFS = {"$path", "${path}"}
+
+
+@dataclass(frozen=True)
+class BlockNode:
+    """One line of the managed block."""
+
+    kind: str  # "export", "comment", "blank" or "command"
+    text: str  # the raw line, written back verbatim
+    name: str | None = None
+    value: str | None = None  # value as written, quotes included
+    quote: str = ""  # quote character that wraps the value, if any
+
+
+def _quote_of(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+        return value[0]
+    return ""
+
+
+def _make_export(name: str, value: str) -> BlockNode:
+    return BlockNode(
+        kind="export",
+        text=f"export {name}={value}",
+        name=name,
+        value=value,
+        quote=_quote_of(value),
+    )
+
+
+def tokenize_line(line: str) -> BlockNode:
+    """Classifies a single line of the managed block."""
+    match = _EXPORT_RE.match(line)
+    if match is not None:
+        value = match.group(2).strip()
+        return BlockNode(
+            kind="export",
+            text=line,
+            name=match.group(1),
+            value=value,
+            quote=_quote_of(value),
+        )
+    stripped = line.strip()
+    if not stripped:
+        return BlockNode(kind="blank", text=line)
+    if stripped.startswith("#"):
+        return BlockNode(kind="comment", text=line)
+    return BlockNode(kind="command", text=line)
+
+
+def _parse_path_value(value: str) -> list[str]:
+    paths = [p.strip() for p in value.split(":")]
+    return [p for p in paths if p and p.lower() not in _PATH_SELF_REFS]
+
+
+@dataclass
+class ManagedBlock:
+    """The lines between START_MARKER and END_MARKER, indexed by variable name.
+
+    Nodes are never mutated, edits swap in new nodes so that a copy of the
+    block can be edited without touching the original."""
+
+    nodes: list[BlockNode] = field(default_factory=list)
+    index: dict[str, int] = field(default_factory=dict)  # name -> last node position
+    start_lineno: int = -1  # line of the START_MARKER in the file, -1 if absent
+
+    def copy(self) -> "ManagedBlock":
+        return ManagedBlock(list(self.nodes), dict(self.index), self.start_lineno)
+
+    def get(self, name: str) -> BlockNode | None:
+        """Returns the export node that wins for this name."""
+        pos = self.index.get(name)
+        if pos is None:
+            return None
+        return self.nodes[pos]
+
+    def lineno_of(self, name: str) -> int | None:
+        """Returns the line number of the export in the file (0 based)."""
+        pos = self.index.get(name)
+        if pos is None:
+            return None
+        return self.start_lineno + 1 + pos
+
+    def lines(self) -> list[str]:
+        return [node.text for node in self.nodes]
+
+    def append_line(self, line: str) -> None:
+        """Appends a raw line, e.g. a command, to the end of the block."""
+        node = tokenize_line(line)
+        if node.name is not None:
+            self.index[node.name] = len(self.nodes)
+        self.nodes.append(node)
+
+    def has_line(self, line: str) -> bool:
+        """Returns True if the block holds this exact line."""
+        return any(node.text == line for node in self.nodes)
+
+    def set_var(self, name: str, value: str) -> None:
+        """Sets a variable, rewriting only its own line."""
+        pos = self.index.get(name)
+        if pos is None:
+            self.index[name] = len(self.nodes)
+            self.nodes.append(_make_export(name, value))
+        elif self.nodes[pos].value != value:
+            self.nodes[pos] = _make_export(name, value)
+
+    def remove_vars(self, names: set[str]) -> None:
+        """Removes every export of the given names in a single pass."""
+        names = {name for name in names if name in self.index}
+        if not names:
+            return
+        self.nodes = [node for node in self.nodes if node.name not in names]
+        self._reindex()
+
+    def to_environment(self) -> BashEnvironment:
+        vars: dict[str, str] = {}
+        paths: list[str] = []
+        for name, pos in self.index.items():
+            value = self.nodes[pos].value or ""
+            if name == "PATH":
+                paths = _parse_path_value(value)
+            else:
+                vars[name] = value
+        return BashEnvironment(vars, paths)
+
+    def apply(self, environment: Environment) -> None:
+        """Updates the block to hold the environment, keeping comments, other
+        commands and the lines of unchanged variables as they are."""
+        removed = {name for name in self.index if name != "PATH"}
+        removed.difference_update(environment.vars)
+        self.remove_vars(removed)
+        pending: list[BlockNode] = []
+        for name, value in environment.vars.items():
+            if name in self.index:
+                self.set_var(name, value)
+            else:
+                pending.append(_make_export(name, value))
+        if pending:
+            # New exports go after the other exports, in front of the PATH
+            # line and of any commands that come after them.
+            positions = [pos for name, pos in self.index.items() if name != "PATH"]
+            if positions:
+                insert_at = max(positions) + 1
+            else:
+                insert_at = self.index.get("PATH", 0)
+            self.nodes[insert_at:insert_at] = pending
+            self._reindex()
+        if "PATH" in environment.vars:
+            # PATH was set as a plain variable, e.g. by set_paths(), and the
+            # loop above already wrote its line.
+            return
+        env_paths_str = ":".join(environment.paths)
+        if env_paths_str.endswith(":"):
+            env_paths_str = env_paths_str[:-1]
+        if env_paths_str.startswith(":"):
+            env_paths_str = env_paths_str[1:]
+        if env_paths_str.strip():
+            self.set_var("PATH", f"{env_paths_str}:$PATH")
+        else:
+            self.remove_vars({"PATH"})
+
+    def _reindex(self) -> None:
+        self.index = {}
+        for pos, node in enumerate(self.nodes):
+            if node.name is not None:
+                self.index[node.name] = pos
+
+
+def tokenize_block(lines: list[str], start_lineno: int = -1) -> ManagedBlock:
+    """Builds the AST of the managed block in a single pass over its lines."""
+    block = ManagedBlock(start_lineno=start_lineno)
+    nodes = block.nodes
+    index = block.index
+    for line in lines:
+        node = tokenize_line(line)
+        if node.name is not None:
+            index[node.name] = len(nodes)
+        nodes.append(node)
+    return block
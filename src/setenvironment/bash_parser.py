@@ -1,15 +1,60 @@
+import mmap
 import os
+import re
 import sys
+import threading
+import time
 import warnings
+from dataclasses import dataclass
 
+from setenvironment import journal, trace
+from setenvironment.bash_ast import ManagedBlock, tokenize_block
+from setenvironment.journal import (
+    journal_append,
+    journal_clear,
+    journal_path,
+    journal_read,
+    journal_record,
+    journal_source_line,
+)
+from setenvironment.lock import rc_file_lock
 from setenvironment.types import BashEnvironment, Environment
-from setenvironment.util import read_utf8, write_utf8
+from setenvironment.util import atomic_write_bytes
 
 START_MARKER = "# START setenvironment"
 END_MARKER = "# END setenvironment"
 
+# Independent tools can each own a block, e.g. "# START setenvironment:toolchain",
+# by passing a namespace. None is the plain block above.
+_NAMESPACE_RE = re.compile(r"^[A-Za-z0-9_.-]+$")
+# A marker is only matched when it is not followed by one of these, so that
+# the plain START_MARKER does not match a namespaced one.
+_MARKER_CONTINUATION = frozenset(
+    b":_.-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+)
+
 BASH_FILE_OVERRIDE: str | None = None
 
+# Files modified this recently are not trusted by the parse cache, because a
+# second in-place write within the same mtime tick could keep the same key.
+_RACY_WINDOW_NS = 100_000_000
+
+
+@dataclass
+class _ParseCacheEntry:
+    key: tuple[int, int, int]
+    block: ManagedBlock
+    env: BashEnvironment
+    journal_hooked: bool  # the block sources its journal
+
+
+_PARSE_CACHE: dict[tuple[str, str | None], _ParseCacheEntry] = {}
+_PARSE_CACHE_LOCK = threading.Lock()
+
+# Serializes journal appends against compaction within this process.
+_JOURNAL_LOCK = threading.RLock()
+_COMPACTIONS: dict[tuple[str, str | None], threading.Thread] = {}
+
 
 def __get_system_bash_file() -> str:
     if sys.platform == "win32":
@@ -45,61 +90,231 @@ def bash_rc_set_file(filepath: str | None) -> None:
     os.environ["SETENVIRONMENT_CONFIG_FILE"] = filepath
 
 
-def set_bash_file_lines(input_lines: list[str], shell_file: str) -> None:
+def start_marker(namespace: str | None = None) -> str:
+    """Returns the line that opens the block of the namespace."""
+    if namespace is None:
+        return START_MARKER
+    if not _NAMESPACE_RE.match(namespace):
+        raise ValueError(f"Invalid namespace {namespace!r}, use letters, digits and _.-")
+    return f"{START_MARKER}:{namespace}"
+
+
+def end_marker(namespace: str | None = None) -> str:
+    """Returns the line that closes the block of the namespace."""
+    if namespace is None:
+        return END_MARKER
+    if not _NAMESPACE_RE.match(namespace):
+        raise ValueError(f"Invalid namespace {namespace!r}, use letters, digits and _.-")
+    return f"{END_MARKER}:{namespace}"
+
+
+def _key_of(st: os.stat_result) -> tuple[int, int, int]:
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _stat_key(path: str) -> tuple[int, int, int] | None:
+    """Returns the (st_ino, st_mtime_ns, st_size) cache key of a file."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return _key_of(st)
+
+
+def _cache_store(
+    filepath: str,
+    namespace: str | None,
+    block: ManagedBlock,
+    trusted: bool,
+    st: os.stat_result | None = None,
+) -> _ParseCacheEntry:
+    """Stores the parsed block in the cache if the file is stable. st is the
+    stat of the file the block was written to, when known."""
+    entry = _ParseCacheEntry(
+        key=(0, 0, 0),
+        block=block,
+        env=block.to_environment(),
+        journal_hooked=block.has_line(journal_source_line(journal_path(filepath, namespace))),
+    )
+    key = _stat_key(filepath) if st is None else _key_of(st)
+    if key is None:
+        return entry
+    entry.key = key
+    if not trusted and time.time_ns() - key[1] < _RACY_WINDOW_NS:
+        # Racily clean, re-read next time.
+        return entry
+    with _PARSE_CACHE_LOCK:
+        _PARSE_CACHE[(os.path.abspath(filepath), namespace)] = entry
+    return entry
+
+
+def _cache_load(filepath: str, namespace: str | None = None) -> _ParseCacheEntry | None:
+    """Returns the parsed managed block of the file, from the cache when valid."""
+    key = _stat_key(filepath)
+    if key is None:
+        return None
+    with _PARSE_CACHE_LOCK:
+        entry = _PARSE_CACHE.get((os.path.abspath(filepath), namespace))
+    if entry is not None and entry.key == key:
+        return entry
+    block = _read_block(filepath, namespace)
+    return _cache_store(filepath, namespace, block, trusted=False)
+
+
+def bash_cache_clear() -> None:
+    """Drops every cached parse of the bash files."""
+    with _PARSE_CACHE_LOCK:
+        _PARSE_CACHE.clear()
+
+
+def set_bash_file_lines(
+    input_lines: list[str], shell_file: str, namespace: str | None = None
+) -> bool:
     """Adds new lines to the start of the bash file in the START_MARKER
-    to END_MARKER section."""
-    if os.path.exists(shell_file) is False:
-        # Create the file.
-        with open(shell_file, encoding="utf8", mode="w") as file:
-            file.write("")
-    file_read = read_utf8(shell_file)
-    if START_MARKER not in file_read:
+    to END_MARKER section. Returns False if the file already held them and
+    the write was skipped."""
+    return _write_block(shell_file, tokenize_block(list(input_lines)), namespace)
+
+
+def _find_marker(data: bytes | mmap.mmap, marker: bytes, start: int) -> int:
+    """Returns the offset of the first line at or after start that begins
+    with the marker, or -1."""
+    size = len(data)
+    needle = b"\n" + marker
+    if start == 0 and data[: len(marker)] == marker:
+        pos = 0
+    else:
+        pos = data.find(needle, max(start - 1, 0))
+        pos = -1 if pos == -1 else pos + 1
+    while pos != -1:
+        after = pos + len(marker)
+        if after >= size or data[after] not in _MARKER_CONTINUATION:
+            return pos
+        pos = data.find(needle, after - 1)
+        pos = -1 if pos == -1 else pos + 1
+    return -1
+
+
+def _locate_block(
+    data: bytes | mmap.mmap, namespace: str | None = None
+) -> tuple[int, int, bool] | None:
+    """Returns the byte offsets (begin, end) of the lines between the markers
+    and whether the END_MARKER was found, or None if there is no block."""
+    start = _find_marker(data, start_marker(namespace).encode("utf-8"), 0)
+    if start == -1:
+        return None
+    begin = data.find(b"\n", start)
+    begin = len(data) if begin == -1 else begin + 1
+    end = _find_marker(data, end_marker(namespace).encode("utf-8"), begin)
+    if end == -1:
+        return begin, len(data), False
+    return begin, end, True
+
+
+def bash_namespaces(filepath: str | None = None) -> list[str | None]:
+    """Returns the namespaces of the managed blocks in the file, in file order.
+    None stands for the plain block."""
+    filepath = filepath or bash_rc_file()
+    try:
+        with open(filepath, mode="rb") as file:
+            data = file.read()
+    except FileNotFoundError:
+        return []
+    marker = START_MARKER.encode("utf-8")
+    out: list[str | None] = []
+    for line in (b"\n" + data).split(b"\n" + marker)[1:]:
+        rest = line.split(b"\n", 1)[0].rstrip()
+        if not rest:
+            out.append(None)
+        elif rest[:1] == b":" and _NAMESPACE_RE.match(rest[1:].decode("utf-8", "replace")):
+            out.append(rest[1:].decode("utf-8"))
+    return list(dict.fromkeys(out))
+
+
+def _encode_lines(lines: list[str]) -> bytes:
+    return "".join(line + "\n" for line in lines).encode("utf-8", "surrogateescape")
+
+
+def _write_block(shell_file: str, block: ManagedBlock, namespace: str | None = None) -> bool:
+    """Writes the block between the START_MARKER and END_MARKER, unless the
+    file already holds exactly these lines. Only the block is re-encoded, the
+    bytes before and after it are copied as they are."""
+    input_lines = block.lines()
+    entry = _cache_load(shell_file, namespace)
+    if entry is not None and entry.block.lines() == input_lines:
+        # Nothing changed, don't touch the file (or its mtime).
+        return False
+    data = b""
+    if os.path.exists(shell_file):
+        with trace.span("read", path=shell_file) as span, open(shell_file, mode="rb") as file:
+            data = file.read()
+            span.add_bytes(len(data))
+    block_bytes = _encode_lines(input_lines)
+    end_line = end_marker(namespace).encode("utf-8") + b"\n"
+    location = _locate_block(data, namespace)
+    if location is None:
         # Append markers onto this.
-        file_read += "\n" + START_MARKER + "\n" + END_MARKER + "\n"
-        write_utf8(shell_file, file_read)
-        file_read = read_utf8(shell_file)  # read again
-    orig_lines = file_read.splitlines()
-    # read all lines from START_MARKER to END_MARKER
-    outlines = []
-    found_start_marker = False
-    found_end_marker = False
-    for line in orig_lines:
-        if line.startswith(START_MARKER):
-            outlines.append(line)
-            found_start_marker = True
-            outlines.extend(input_lines)
-            continue
-        if line.startswith(END_MARKER):
-            found_end_marker = True
-            outlines.append(line)
-            continue
-        if not found_start_marker or found_end_marker:
-            outlines.append(line)
-            continue
-    write_utf8(shell_file, "\n".join(outlines))
-
-
-def read_bash_file_lines(filepath: str) -> list[str]:
+        prefix = data if not data or data.endswith(b"\n") else data + b"\n"
+        block.start_lineno = prefix.count(b"\n")
+        head = prefix + start_marker(namespace).encode("utf-8") + b"\n"
+        tail = end_line
+    else:
+        begin, end, found_end = location
+        head = data[:begin]
+        if not head.endswith(b"\n"):
+            head += b"\n"  # The START_MARKER was the last line.
+        block.start_lineno = head.count(b"\n") - 1
+        tail = data[end:] if found_end else end_line
+        if head == data[:begin] and tail == data[end:] and block_bytes == data[begin:end]:
+            return False
+    with trace.span("write", path=shell_file) as span:
+        data = head + block_bytes + tail
+        written = atomic_write_bytes(shell_file, data)
+        span.add_bytes(len(data))
+    # We wrote the block ourselves so the cache can trust it straight away,
+    # under the stat of our write even if another writer has replaced it since.
+    _cache_store(shell_file, namespace, block, trusted=True, st=written)
+    return True
+
+
+def read_bash_file_lines(filepath: str, namespace: str | None = None) -> list[str]:
     """Reads a bash file."""
-    if os.path.exists(filepath) is False:
-        return []
-    filepath = filepath
-    with open(filepath, encoding="utf8", mode="r") as file:
-        lines = file.read().splitlines()
-    # read all lines from START_MARKER to END_MARKER
-    start_index = -1
-    end_index = -1
-    for i, line in enumerate(lines):
-        if line.startswith(START_MARKER):
-            start_index = i + 1
-        if line.startswith(END_MARKER):
-            end_index = i
-    if start_index == -1:
+    entry = _cache_load(filepath, namespace)
+    if entry is None:
         return []
-    if end_index == -1:
-        warnings.warn(f"Could not find {END_MARKER} in {filepath}")
-        return lines[start_index:]
-    return lines[start_index:end_index]
+    return entry.block.lines()
+
+
+def bash_read_block(filepath: str | None = None, namespace: str | None = None) -> ManagedBlock:
+    """Returns a copy of the parsed managed block, safe to edit."""
+    entry = _cache_load(filepath or bash_rc_file(), namespace)
+    if entry is None:
+        return ManagedBlock()
+    return entry.block.copy()
+
+
+def _read_block(filepath: str, namespace: str | None = None) -> ManagedBlock:
+    """Reads and tokenizes the managed block of the file, decoding only the
+    bytes between the markers."""
+    if os.path.exists(filepath) is False:
+        return ManagedBlock()
+    with trace.span("read", path=filepath) as span, open(filepath, mode="rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if size == 0:
+            return ManagedBlock()
+        span.add_bytes(size)
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            location = _locate_block(data, namespace)
+            if location is None:
+                return ManagedBlock()
+            begin, end, found_end = location
+            start_lineno = data[:begin].count(b"\n") - 1
+            text = data[begin:end].decode("utf-8", "surrogateescape")
+    if not found_end:
+        warnings.warn(f"Could not find {end_marker(namespace)} in {filepath}")
+    with trace.span("parse", path=filepath) as span:
+        span.add_bytes(end - begin)
+        return tokenize_block(text.splitlines(), start_lineno=start_lineno)
 
 
 def bash_append_lines(write_lines: list[str]) -> None:
@@ -121,56 +336,109 @@ def bash_read_lines() -> list[str]:
     return read_bash_file_lines(bash_rc_file())
 
 
-def bash_write_lines(lines: list[str]) -> None:
-    """Writes lines to the bash file."""
-    set_bash_file_lines(lines, bash_rc_file())
+def bash_write_lines(lines: list[str]) -> bool:
+    """Writes lines to the bash file, returns False if nothing changed."""
+    return set_bash_file_lines(lines, bash_rc_file())
 
 
-def bash_read_variable(name: str) -> str | None:
-    """Gets an environment variable."""
-    lines = bash_read_lines()
-    for line in lines:
-        if line.startswith("export " + name + "="):
-            out = line[7:].split("=")[1].strip()
-            if name != "PATH":
-                return out
-            out = out.replace(":$PATH", "")
-            return out
-    return None
-
-
-def bash_make_environment() -> BashEnvironment:
-    """Makes an environment from the bash file."""
-    lines = bash_read_lines()
-    vars: dict[str, str] = {}
-    paths: list[str] = []
-    for line in lines:
-        if line.startswith("export "):
-            line = line[7:]
-            if "=" not in line:
-                continue
-            name, value = line.split("=", 1)
-            name = name.strip()
-            value = value.strip()
-            if name == "PATH":
-                paths = value.split(":")
-                paths = [p for p in paths if p.lower() != "$path"]
+def _environment_of(shell_file: str, namespace: str | None) -> BashEnvironment:
+    """The block of the namespace with its journal replayed on top."""
+    entry = _cache_load(shell_file, namespace)
+    if entry is None:
+        env = BashEnvironment({}, [], namespace)
+    else:
+        # Hand out a copy, callers mutate the result.
+        env = BashEnvironment(dict(entry.env.vars), list(entry.env.paths), namespace)
+    state = journal_read(journal_path(shell_file, namespace))
+    if state is not None:
+        for name, value in state.overrides.items():
+            if value is None:
+                env.vars.pop(name, None)
             else:
-                vars[name] = value
-    paths = [p.strip() for p in paths if p.strip()]
-    return BashEnvironment(vars, paths)
-
-
-def bash_save(environment: Environment) -> None:
-    """Saves the environment to the bash file."""
-    lines = []
-    for name, value in environment.vars.items():
-        lines.append(f"export {name}={value}")
-    env_paths_str = ":".join(environment.paths)
-    if env_paths_str.endswith(":"):
-        env_paths_str = env_paths_str[:-1]
-    if env_paths_str.startswith(":"):
-        env_paths_str = env_paths_str[1:]
-    if env_paths_str.strip():
-        lines.append(f"export PATH={env_paths_str}:$PATH")
-    bash_write_lines(lines)
+                env.vars[name] = value
+    return env
+
+
+def _save_to(shell_file: str, environment: Environment, namespace: str | None) -> bool:
+    block = bash_read_block(shell_file, namespace)
+    block.apply(environment)
+    written = _write_block(shell_file, block, namespace)
+    # The block now holds everything, any journal records are stale.
+    journal_clear(journal_path(shell_file, namespace))
+    return written
+
+
+def bash_read_variable(name: str, namespace: str | None = None) -> str | None:
+    """Gets an environment variable."""
+    shell_file = bash_rc_file()
+    state = journal_read(journal_path(shell_file, namespace))
+    if state is not None and name in state.overrides:
+        return state.overrides[name]
+    entry = _cache_load(shell_file, namespace)
+    if entry is None:
+        return None
+    node = entry.block.get(name)
+    if node is None:
+        return None
+    if name != "PATH":
+        return node.value
+    return ":".join(entry.env.paths)
+
+
+def bash_make_environment(namespace: str | None = None) -> BashEnvironment:
+    """Makes an environment from the block of the namespace in the bash file."""
+    return _environment_of(bash_rc_file(), namespace)
+
+
+def bash_save(environment: Environment, namespace: str | None = None) -> bool:
+    """Saves the environment to the block of the namespace in the bash file.
+    Returns True if the file was written, False if the block already matched."""
+    with _JOURNAL_LOCK:
+        return _save_to(bash_rc_file(), environment, namespace)
+
+
+def bash_journal_write(name: str, value: str | None, namespace: str | None = None) -> None:
+    """Records a single set (or with None, unset) of a variable by appending
+    to the journal of the block, and starts a compaction in the background
+    once the journal is over its thresholds."""
+    shell_file = bash_rc_file()
+    journal_file = journal_path(shell_file, namespace)
+    with _JOURNAL_LOCK:
+        entry = _cache_load(shell_file, namespace)
+        if entry is None or not entry.journal_hooked:
+            # First journaled write, hook the journal into the block.
+            block = bash_read_block(shell_file, namespace)
+            block.append_line(journal_source_line(journal_file))
+            _write_block(shell_file, block, namespace)
+        state = journal_append(journal_file, [journal_record(name, value)])
+        full = state.records >= journal.JOURNAL_MAX_RECORDS
+        full = full or state.size >= journal.JOURNAL_MAX_BYTES
+        key = (shell_file, namespace)
+        if full and key not in _COMPACTIONS:
+            thread = threading.Thread(
+                target=_compact, args=(shell_file, namespace), name="setenvironment-compact"
+            )
+            _COMPACTIONS[key] = thread
+            thread.start()
+
+
+def _compact(shell_file: str, namespace: str | None) -> None:
+    try:
+        with rc_file_lock(shell_file), _JOURNAL_LOCK:
+            _save_to(shell_file, _environment_of(shell_file, namespace), namespace)
+    finally:
+        with _JOURNAL_LOCK:
+            _COMPACTIONS.pop((shell_file, namespace), None)
+
+
+def bash_journal_compact(namespace: str | None = None) -> None:
+    """Folds the journal into the managed block now, waiting for any
+    compaction that is already running."""
+    shell_file = bash_rc_file()
+    with _JOURNAL_LOCK:
+        thread = _COMPACTIONS.get((shell_file, namespace))
+    if thread is not None:
+        thread.join()
+    with rc_file_lock(shell_file), _JOURNAL_LOCK:
+        if journal_read(journal_path(shell_file, namespace)) is not None:
+            _save_to(shell_file, _environment_of(shell_file, namespace), namespace)
@@ -1,28 +1,23 @@
 """
 CLI interface for setenvironment
+
+setenvironment_get only reads the bash file, so it is answered before
+argparse or setenvironment.setenv are imported, see _fast_getenv().
 """
 
+# pylint: disable=import-outside-toplevel
 # flake8: noqa: E501
 
-import argparse
 import os
 import sys
 
-from setenvironment.bash_parser import bash_rc_set_file
-from setenvironment.setenv import (
-    add_env_path,
-    get_env_var,
-    remove_env_path,
-    set_env_var,
-    unset_env_var,
-)
-from setenvironment.util import write_utf8
-
 
-def _init_config_file(args):
+def _init_config_file(config: str | None) -> None:
     """Initialize the path to the config file."""
-    config = args.config_file
     if config is not None and sys.platform != "win32":
+        from setenvironment.bash_parser import bash_rc_set_file
+        from setenvironment.util import write_utf8
+
         bash_rc_set_file(config)
         if not os.path.exists(config):
             os.makedirs(os.path.dirname(config), exist_ok=True)
@@ -31,23 +26,72 @@ def _init_config_file(args):
 
 def setenv() -> None:
     """Set environment variables from the command line."""
+    import argparse
+
     parser = argparse.ArgumentParser(description="Set environment variables")
     parser.add_argument("var_name", help="The name of the environment variable")
     parser.add_argument("var_value", help="The value of the environment variable")
     parser.add_argument("--config-file", help="The config file to use")
     args = parser.parse_args()
-    _init_config_file(args)
+    _init_config_file(args.config_file)
+    from setenvironment.setenv import set_env_var
+
     set_env_var(args.var_name, args.var_value)
     sys.exit(0)
 
 
+def _fast_getenv(argv: list[str]) -> str | None:
+    """Returns the name to read when argv is only a name and --config-file,
+    None for anything else, e.g. --help, which getenv() parses with argparse."""
+    if sys.platform == "win32":
+        return None  # The registry is read through setenv_win32.
+    names: list[str] = []
+    config: str | None = None
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg.startswith("-"):
+            name, sep, value = arg.partition("=")
+            if name != "--config-file" or config is not None:
+                return None
+            if not sep:
+                if i + 1 == len(argv):
+                    return None
+                i += 1
+                value = argv[i]
+            if not value or value.startswith("-"):
+                return None
+            config = value
+        else:
+            names.append(arg)
+        i += 1
+    if len(names) != 1:
+        return None
+    _init_config_file(config)
+    return names[0]
+
+
 def getenv() -> None:
     """Get environment variables from the command line."""
+    name = _fast_getenv(sys.argv[1:])
+    if name is not None:
+        from setenvironment.bash_parser import bash_read_variable
+
+        # Same as get_env_var(), there is no transaction open in a new process.
+        var = bash_read_variable(name)
+        if var is None:
+            sys.exit(1)
+        print(var)
+        sys.exit(0)
+    import argparse
+
     parser = argparse.ArgumentParser(description="Get environment variables")
     parser.add_argument("var_name", help="The name of the environment variable")
     parser.add_argument("--config-file", help="The config file to use")
     args = parser.parse_args()
-    _init_config_file(args)
+    _init_config_file(args.config_file)
+    from setenvironment.setenv import get_env_var
+
     var = get_env_var(args.var_name)
     if var is None:
         sys.exit(1)
@@ -57,36 +101,48 @@ def getenv() -> None:
 
 def unsetenv() -> None:
     """Unset environment variables from the command line."""
+    import argparse
+
     parser = argparse.ArgumentParser(description="Unset environment variables")
     parser.add_argument("var_name", help="The name of the environment variable")
     parser.add_argument("--config-file", help="The config file to use")
     args = parser.parse_args()
-    _init_config_file(args)
+    _init_config_file(args.config_file)
+    from setenvironment.setenv import unset_env_var
+
     unset_env_var(args.var_name)
     sys.exit(0)
 
 
 def addpath() -> None:
     """Add a path to the PATH environment variable."""
+    import argparse
+
     parser = argparse.ArgumentParser(
         description="Add a path to the PATH environment variable"
     )
     parser.add_argument("path", help="The path to add")
     parser.add_argument("--config-file", help="The config file to use")
     args = parser.parse_args()
-    _init_config_file(args)
+    _init_config_file(args.config_file)
+    from setenvironment.setenv import add_env_path
+
     add_env_path(args.path)
     sys.exit(0)
 
 
 def removepath() -> None:
     """Remove a path from the PATH environment variable."""
+    import argparse
+
     parser = argparse.ArgumentParser(
         description="Remove a path from the PATH environment variable"
     )
     parser.add_argument("path", help="The path to remove")
     parser.add_argument("--config-file", help="The config file to use")
     args = parser.parse_args()
-    _init_config_file(args)
+    _init_config_file(args.config_file)
+    from setenvironment.setenv import remove_env_path
+
     remove_env_path(args.path)
     sys.exit(0)
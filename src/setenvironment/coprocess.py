@@ -0,0 +1,200 @@
+"""
+A long lived bash process that keeps ~/.profile and the bash file sourced, so
+repeated get_env()/reload_environment() calls don't pay for a fresh shell.
+
+It starts with an empty environment, like get_env_vars_from_shell, sources
+the files once and then answers each snapshot with `env -0` over its pipes.
+When one of the sourced files changes, the process is replaced by a fresh
+one, since sourcing into the same shell again could not drop variables that
+were removed from the files.
+"""
+
+# pylint: disable=consider-using-with
+
+import atexit
+import os
+import selectors
+import shlex
+import subprocess
+import threading
+import time
+
+from setenvironment.env_cache import sourced_files
+from setenvironment.setenv_unix import SHELL_CAPTURE_DELIM, parse_shell_capture
+from setenvironment.types import Environment
+
+WARM_SHELL = os.environ.get("SETENVIRONMENT_WARM_SHELL", "") == "1"
+
+_READY = b"-------- setenvironment coprocess ready --------"
+_END = b"-------- setenvironment coprocess end --------"
+
+
+class CoprocessError(RuntimeError):
+    """The bash coprocess died or stopped answering."""
+
+
+def set_warm_shell(enabled: bool) -> None:
+    """Makes get_env_vars_from_shell use the shared coprocess."""
+    global WARM_SHELL
+    WARM_SHELL = enabled
+    if not enabled:
+        shutdown_all()
+
+
+def _mtime(path: str) -> int | None:
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class BashCoprocess:
+    """A bash process with the settings sourced, owned by this interpreter."""
+
+    def __init__(self, settings_file: str, timeout: float = 30.0) -> None:
+        self.settings_file = settings_file
+        self.timeout = timeout
+        self.restarts = 0
+        self._lock = threading.Lock()
+        self._proc: subprocess.Popen | None = None
+        self._buffer = b""
+        self._mtimes: dict[str, int | None] = {}
+
+    def _start(self) -> None:
+        self._mtimes = self._watched()
+        self._buffer = b""
+        self._proc = subprocess.Popen(
+            ["/bin/bash", "--noprofile", "--norc"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            env={},  # do not inherit parent environment
+        )
+        ready = shlex.quote(_READY.decode())
+        self._send(
+            f"source ~/.profile; source {shlex.quote(self.settings_file)}; "
+            f"printf '%s\\0' {ready}\n"
+        )
+        self._read_until(_READY + b"\0", self.timeout)
+
+    def _send(self, command: str) -> None:
+        assert self._proc is not None and self._proc.stdin is not None
+        try:
+            self._proc.stdin.write(command.encode("utf-8"))
+            self._proc.stdin.flush()
+        except (BrokenPipeError, OSError) as exc:
+            raise CoprocessError("bash coprocess is gone") from exc
+
+    def _read_until(self, token: bytes, timeout: float) -> bytes:
+        """Reads stdout up to and including the token, returns what came before it."""
+        assert self._proc is not None and self._proc.stdout is not None
+        fd = self._proc.stdout.fileno()
+        deadline = time.monotonic() + timeout
+        with selectors.DefaultSelector() as selector:
+            selector.register(fd, selectors.EVENT_READ)
+            while True:
+                pos = self._buffer.find(token)
+                if pos != -1:
+                    out = self._buffer[:pos]
+                    self._buffer = self._buffer[pos + len(token) :]
+                    return out
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not selector.select(remaining):
+                    raise CoprocessError(f"bash coprocess did not answer in {timeout}s")
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    raise CoprocessError("bash coprocess exited")
+                self._buffer += chunk
+
+    def _watched(self) -> dict[str, int | None]:
+        """The mtimes of the startup files in the home bash uses, the bash file
+        and the journals of every block in it. A journal that appears changes
+        the keys, which counts as a change too."""
+        return {path: _mtime(path) for path in sourced_files(self.settings_file)}
+
+    def _stale(self) -> bool:
+        return self._watched() != self._mtimes
+
+    def _ensure(self) -> None:
+        if self._proc is not None and (self._proc.poll() is not None or self._stale()):
+            self._stop()
+        if self._proc is None:
+            self._start()
+
+    def _snapshot_once(self) -> Environment:
+        self._ensure()
+        delim = shlex.quote(SHELL_CAPTURE_DELIM.decode())
+        end = shlex.quote(_END.decode())
+        self._send(f"printf '%s\\0' {delim}; env -0; printf '%s\\0' {end}\n")
+        return parse_shell_capture(self._read_until(_END + b"\0", self.timeout))
+
+    def snapshot(self) -> Environment:
+        """Returns the environment of the sourced settings. A crashed or hung
+        coprocess is restarted once before giving up."""
+        with self._lock:
+            try:
+                return self._snapshot_once()
+            except CoprocessError:
+                self._stop()
+                self.restarts += 1
+                return self._snapshot_once()
+
+    def ping(self, timeout: float = 1.0) -> bool:
+        """Health check, True if the coprocess is alive and answering."""
+        with self._lock:
+            if self._proc is None or self._proc.poll() is not None:
+                return False
+            try:
+                self._send("printf '%s\\0' pong\n")
+                self._read_until(b"pong\0", timeout)
+                return True
+            except CoprocessError:
+                return False
+
+    def _stop(self) -> None:
+        proc = self._proc
+        self._proc = None
+        if proc is None:
+            return
+        try:
+            if proc.stdin is not None:
+                proc.stdin.write(b"exit\n")
+                proc.stdin.close()
+            proc.wait(timeout=1.0)
+        except (OSError, subprocess.TimeoutExpired):
+            proc.kill()
+            proc.wait()
+        if proc.stdout is not None:
+            proc.stdout.close()
+
+    def close(self) -> None:
+        """Shuts the coprocess down."""
+        with self._lock:
+            self._stop()
+
+
+_SHARED: dict[str, BashCoprocess] = {}
+_SHARED_LOCK = threading.Lock()
+
+
+def shared_coprocess(settings_file: str) -> BashCoprocess:
+    """Returns the coprocess of this interpreter for the settings file."""
+    key = os.path.abspath(settings_file)
+    with _SHARED_LOCK:
+        coprocess = _SHARED.get(key)
+        if coprocess is None:
+            coprocess = BashCoprocess(key)
+            _SHARED[key] = coprocess
+        return coprocess
+
+
+def shutdown_all() -> None:
+    """Shuts down every shared coprocess, runs at interpreter exit."""
+    with _SHARED_LOCK:
+        coprocesses = list(_SHARED.values())
+        _SHARED.clear()
+    for coprocess in coprocesses:
+        coprocess.close()
+
+
+atexit.register(shutdown_all)
@@ -0,0 +1,259 @@
+"""
+Health check of the PATH entries and path groups in the settings.
+
+Every entry is stat'ed, and its executables listed, on a pool of daemon
+threads, so a hung NFS mount only costs its own timeout and never blocks
+the interpreter from exiting. The report lists missing, slow and hung
+directories, duplicate entries and executables that are shadowed by one of
+the same name earlier in the PATH. prune() drops the missing entries with
+one write of the settings.
+"""
+
+# pylint: disable=import-outside-toplevel
+
+import os
+import queue
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Mapping
+
+from setenvironment.exe_index import scan_directory
+from setenvironment.util import expand_path
+
+DEFAULT_TIMEOUT = 2.0  # seconds before an entry counts as hung
+DEFAULT_SLOW = 0.1  # seconds before an entry counts as slow
+DEFAULT_WORKERS = 16
+
+
+@dataclass
+class EntryCheck:
+    """The result for one directory."""
+
+    path: str  # as spelled in the settings, e.g. $HOME/bin
+    status: str = "pending"  # "ok", "slow", "missing", "error", "timeout" or "unexpanded"
+    expanded: str | None = None  # the directory that is checked, path when None
+    seconds: float = 0.0
+    groups: list[str] = field(default_factory=list)  # path groups holding it
+    error: str | None = None
+    executables: list[str] = field(default_factory=list)
+
+
+@dataclass
+class DoctorReport:
+    """What doctor() found."""
+
+    entries: list[EntryCheck] = field(default_factory=list)  # in PATH order
+    duplicates: dict[str, int] = field(default_factory=dict)  # path -> times listed
+    shadowed: dict[str, list[str]] = field(default_factory=dict)  # name -> dirs, winner first
+
+    def with_status(self, *statuses: str) -> list[EntryCheck]:
+        return [entry for entry in self.entries if entry.status in statuses]
+
+    @property
+    def healthy(self) -> bool:
+        return not (
+            self.with_status("missing", "error", "timeout", "slow")
+            or self.duplicates
+            or self.shadowed
+        )
+
+    def format(self) -> str:
+        """Formats the report for the terminal."""
+        out = []
+        for title, statuses in [
+            ("Missing", ("missing",)),
+            ("Unreadable", ("error",)),
+            ("Timed out", ("timeout",)),
+            ("Slow", ("slow",)),
+            ("Not expandable here", ("unexpanded",)),
+        ]:
+            entries = self.with_status(*statuses)
+            if entries:
+                out.append(f"{title}:")
+                for entry in entries:
+                    groups = f" (groups: {', '.join(entry.groups)})" if entry.groups else ""
+                    out.append(f"  {entry.seconds * 1000:8.1f} ms  {entry.path}{groups}")
+        if self.duplicates:
+            out.append("Duplicates:")
+            for path, count in self.duplicates.items():
+                out.append(f"  {count}x  {path}")
+        if self.shadowed:
+            out.append("Shadowed executables:")
+            for name, dirs in sorted(self.shadowed.items()):
+                out.append(f"  {name}: {dirs[0]} shadows {', '.join(dirs[1:])}")
+        if not out:
+            out.append(f"All {len(self.entries)} entries are healthy.")
+        return "\n".join(out)
+
+
+def _check(path: str, slow: float) -> tuple[str, float, str | None, list[str]]:
+    """Returns (status, seconds, error, executables) of one directory."""
+    start = time.monotonic()
+    status, error, executables = "ok", None, []
+    try:
+        listing = scan_directory(path)
+        if listing.mtime_ns is None:
+            status = "missing"
+        elif not os.path.isdir(path):
+            status, error = "missing", "not a directory"
+        else:
+            executables = sorted(set(listing.names.values()))
+    except OSError as exc:
+        status, error = "error", str(exc)
+    seconds = time.monotonic() - start
+    if status == "ok" and seconds > slow:
+        status = "slow"
+    return status, seconds, error, executables
+
+
+def check_entries(
+    entries: list[EntryCheck],
+    timeout: float = DEFAULT_TIMEOUT,
+    slow: float = DEFAULT_SLOW,
+    max_workers: int = DEFAULT_WORKERS,
+) -> None:
+    """Checks the pending entries concurrently on at most max_workers live
+    threads. An entry that runs past its timeout is marked "timeout", its
+    thread is left behind and replaced so the other entries still get checked."""
+    entries = [entry for entry in entries if entry.status == "pending"]
+    todo: queue.Queue = queue.Queue()
+    for i in range(len(entries)):
+        todo.put(i)
+    cond = threading.Condition()
+    started: dict[int, float] = {}
+    done: set[int] = set()
+    hung: set[int] = set()
+
+    def worker() -> None:
+        while True:
+            try:
+                i = todo.get_nowait()
+            except queue.Empty:
+                return
+            with cond:
+                started[i] = time.monotonic()
+            result = _check(entries[i].expanded or entries[i].path, slow)
+            with cond:
+                if i in hung:
+                    return  # reported as a timeout already, and replaced
+                entry = entries[i]
+                entry.status, entry.seconds, entry.error, entry.executables = result
+                done.add(i)
+                cond.notify_all()
+
+    def spawn() -> None:
+        threading.Thread(target=worker, name="setenvironment-doctor", daemon=True).start()
+
+    for _ in range(min(max_workers, len(entries))):
+        spawn()
+    with cond:
+        while len(done) + len(hung) < len(entries):
+            now = time.monotonic()
+            deadlines = []
+            for i, start in started.items():
+                if i in done or i in hung:
+                    continue
+                if now - start >= timeout:
+                    hung.add(i)
+                    entries[i].status, entries[i].seconds = "timeout", now - start
+                    spawn()
+                else:
+                    deadlines.append(start + timeout)
+            wait = min(deadlines) - now if deadlines else timeout
+            cond.wait(max(wait, 0.001))
+
+
+def detect_path_groups(env_vars: Mapping[str, str], paths: list[str]) -> dict[str, list[str]]:
+    """Finds the variables that are path groups: every entry of the value is
+    an absolute path, once expanded, that is also on the PATH."""
+    on_path = set(paths)
+    groups: dict[str, list[str]] = {}
+    for name, value in env_vars.items():
+        if name == "PATH" or not value:
+            continue
+        entries = [entry for entry in value.split(os.pathsep) if entry]
+        if entries and all(
+            os.path.isabs(expand_path(entry) or entry) and entry in on_path for entry in entries
+        ):
+            groups[name] = entries
+    return groups
+
+
+def _settings() -> tuple[list[str], dict[str, str]]:
+    from setenvironment.setenv import get_paths
+
+    paths = get_paths()
+    if sys.platform == "win32":
+        from setenvironment.setenv_win32 import query_registry_environment
+
+        return paths, dict(query_registry_environment().user.vars)
+    from setenvironment.bash_parser import bash_make_environment
+
+    return paths, dict(bash_make_environment().vars)
+
+
+def doctor(
+    paths: list[str] | None = None,
+    groups: dict[str, list[str]] | None = None,
+    timeout: float = DEFAULT_TIMEOUT,
+    slow: float = DEFAULT_SLOW,
+    max_workers: int = DEFAULT_WORKERS,
+) -> DoctorReport:
+    """Checks the PATH entries of the settings (get_paths()) and of every path
+    group. paths and groups default to the ones in the settings."""
+    if paths is None or groups is None:
+        settings_paths, settings_vars = _settings()
+        paths = settings_paths if paths is None else paths
+        if groups is None:
+            groups = detect_path_groups(settings_vars, paths)
+    report = DoctorReport()
+    by_path: dict[str, EntryCheck] = {}
+    counts: dict[str, int] = {}
+
+    def entry_of(path: str) -> EntryCheck:
+        if path not in by_path:
+            # The settings hold entries like $HOME/bin as written, they are
+            # checked expanded and reported (and pruned) as written.
+            entry = by_path[path] = EntryCheck(path, expanded=expand_path(path))
+            if entry.expanded is None:
+                entry.status = "unexpanded"
+        return by_path[path]
+
+    for path in paths:
+        counts[path] = counts.get(path, 0) + 1
+        entry_of(path)
+    for group, entries in groups.items():
+        for path in entries:
+            entry_of(path).groups.append(group)
+    report.entries = list(by_path.values())
+    report.duplicates = {path: n for path, n in counts.items() if n > 1}
+    check_entries(report.entries, timeout=timeout, slow=slow, max_workers=max_workers)
+    owners: dict[str, list[str]] = {}
+    for path in dict.fromkeys(paths):
+        for name in by_path[path].executables:
+            owners.setdefault(name, []).append(path)
+    report.shadowed = {name: dirs for name, dirs in owners.items() if len(dirs) > 1}
+    return report
+
+
+def prune(report: DoctorReport, statuses: tuple[str, ...] = ("missing",)) -> list[str]:
+    """Removes the entries with these statuses from the PATH and from their
+    path groups, in one write of the settings. Returns the removed paths."""
+    from setenvironment.setenv import (
+        remove_env_path,
+        remove_from_path_group,
+        transaction,
+    )
+
+    dead = report.with_status(*statuses)
+    if not dead:
+        return []
+    with transaction():
+        for entry in dead:
+            for group in entry.groups:
+                remove_from_path_group(group, entry.path)
+            for _ in range(report.duplicates.get(entry.path, 1)):
+                remove_env_path(entry.path)
+    return [entry.path for entry in dead]
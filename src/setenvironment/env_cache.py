@@ -0,0 +1,159 @@
+"""
+On disk cache of the environment that bash evaluates from ~/.profile and the
+bash file, so get_env() only runs bash when one of those files changed.
+
+The cache lives in $XDG_CACHE_HOME/setenvironment (~/.cache/setenvironment),
+readable by the user only since it holds the whole environment. An entry
+records the digest of every file the shell sourced while it was made, as
+reported by the shell itself, e.g. nvm.sh pulled in by ~/.bashrc, along with
+the usual startup files and journals even when they don't exist yet. It is
+used only while all of them are unchanged. A file that the startup files
+would source only once it exists is not noticed when it appears. Set
+SETENVIRONMENT_NO_CACHE=1 to turn the cache off.
+"""
+
+import hashlib
+import json
+import os
+
+from setenvironment import trace
+from setenvironment.types import Environment
+from setenvironment.util import atomic_write_bytes, login_home
+
+ENV_CACHE = os.environ.get("SETENVIRONMENT_NO_CACHE", "") != "1"
+
+# Startup files that ~/.profile or the bash file commonly source, relative to
+# the home bash resolves ~ to.
+_STARTUP_FILES = [
+    ".profile",
+    ".bashrc",
+    ".bash_profile",
+    ".bash_login",
+    ".bash_aliases",
+]
+_CACHE_VERSION = "2"
+
+
+def set_env_cache(enabled: bool) -> None:
+    """Turns the on disk cache of the shell environment on or off."""
+    global ENV_CACHE
+    ENV_CACHE = enabled
+
+
+def cache_dir() -> str:
+    """Returns the directory of the cache."""
+    root = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(root, "setenvironment")
+
+
+def sourced_files(settings_file: str) -> list[str]:
+    """Returns the files that can change what the shell evaluates whether or
+    not it sourced them last time: the startup files, the bash file and the
+    journals of its managed blocks."""
+    settings_file = os.path.abspath(settings_file)
+    home = login_home()
+    files = [os.path.join(home, name) for name in _STARTUP_FILES]
+    files.append(settings_file)
+    # The journals of the managed blocks, see setenvironment.journal.
+    directory, name = os.path.split(settings_file)
+    prefix = f"{name}.setenvironment."
+    try:
+        entries = sorted(os.listdir(directory))
+    except OSError:
+        entries = []
+    for entry in entries:
+        if entry.startswith(prefix) and entry.endswith(".journal"):
+            files.append(os.path.join(directory, entry))
+    return files
+
+
+def file_digest(path: str) -> str | None:
+    """Returns the sha256 of the contents of the file, None if it is missing."""
+    try:
+        with open(path, mode="rb") as file:
+            return hashlib.sha256(file.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def _script_digest(script: str) -> str:
+    return hashlib.sha256(script.encode("utf-8")).hexdigest()
+
+
+def _cache_file(settings_file: str) -> str:
+    name = hashlib.sha256(os.path.abspath(settings_file).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir(), f"{name}.json")
+
+
+def _read_entry(settings_file: str) -> dict | None:
+    try:
+        with trace.span("cache load", path=settings_file) as span:
+            with open(_cache_file(settings_file), mode="rb") as file:
+                raw = file.read()
+            span.add_bytes(len(raw))
+            data = json.loads(raw)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get("version") != _CACHE_VERSION:
+        return None
+    return data
+
+
+def watched_files(settings_file: str) -> list[str]:
+    """Returns sourced_files() and the files the last entry recorded."""
+    files = sourced_files(settings_file)
+    entry = _read_entry(settings_file)
+    if entry is not None:
+        files += [path for path in entry.get("files", {}) if path not in files]
+    return files
+
+
+def cache_load(settings_file: str, script: str) -> Environment | None:
+    """Returns the cached environment if it was made by this script and none
+    of the files it depends on changed since."""
+    entry = _read_entry(settings_file)
+    if entry is None or entry.get("script") != _script_digest(script):
+        return None
+    files: dict[str, str | None] = entry.get("files", {})
+    if any(path not in files for path in sourced_files(settings_file)):
+        return None  # e.g. a journal that appeared since
+    for path, digest in files.items():
+        if file_digest(path) != digest:
+            return None
+    return Environment(vars=entry["vars"], paths=entry["paths"])
+
+
+def cache_store(
+    settings_file: str,
+    script: str,
+    env: Environment,
+    sourced: list[str],
+    digests: dict[str, str | None] | None = None,
+) -> None:
+    """Stores the environment that the script evaluated, with the files it
+    sourced. digests are the ones taken before the shell ran, used where
+    known so that a file that changed meanwhile does not match the next
+    load. The cache is best effort, errors writing it are ignored."""
+    digests = digests or {}
+    files: dict[str, str | None] = {}
+    for path in sourced_files(settings_file) + sourced:
+        path = os.path.abspath(path)
+        if path not in files:
+            files[path] = digests[path] if path in digests else file_digest(path)
+    payload = {
+        "version": _CACHE_VERSION,
+        "script": _script_digest(script),
+        "files": files,
+        "vars": dict(env.vars),
+        "paths": list(env.paths),
+    }
+    try:
+        with trace.span("cache store", path=settings_file) as span:
+            data = json.dumps(payload).encode("utf-8")
+            directory = cache_dir()
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            os.chmod(directory, 0o700)  # made by an older version with the umask
+            atomic_write_bytes(_cache_file(settings_file), data, fsync="none", mode=0o600)
+            span.add_bytes(len(data))
+    except OSError:
+        pass
@@ -0,0 +1,181 @@
+"""
+Index of the executables on the PATH, for repeated "which binary would run"
+questions.
+
+Each PATH directory is listed once and its executables are kept, together
+with the mtime of the directory. A lookup only stats the directories up to
+the one that answers it, and rescans just the ones whose mtime moved. When
+the PATH itself changes, e.g. after add_env_path(), the name -> directory
+map is rebuilt from the listings already held, without rescanning.
+"""
+
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+
+from setenvironment.util import expand_path
+
+# Directories modified this recently are rescanned on the next lookup, since
+# a second change within the same mtime tick would go unnoticed.
+_RACY_WINDOW_NS = 100_000_000
+_MAX_RETRIES = 3
+
+
+@dataclass
+class DirListing:
+    """The executables of one PATH directory."""
+
+    mtime_ns: int | None  # None: the directory does not exist
+    names: dict[str, str]  # name as looked up -> file name
+    trusted: bool  # the mtime was old enough when the listing was made
+
+
+def _normcase(name: str) -> str:
+    return name.lower() if sys.platform == "win32" else name
+
+
+def _windows_names(filename: str, exts: list[str]) -> list[str]:
+    """Windows runs foo.exe for foo, so both names are indexed."""
+    name = filename.lower()
+    stem, ext = os.path.splitext(name)
+    return [name, stem] if ext in exts else []
+
+
+def scan_directory(directory: str) -> DirListing:
+    """Lists the executables in the directory, without raising if it can't be read."""
+    try:
+        mtime_ns = os.stat(directory).st_mtime_ns
+    except OSError:
+        return DirListing(None, {}, True)
+    exts = [ext.lower() for ext in os.environ.get("PATHEXT", ".COM;.EXE;.BAT;.CMD").split(";")]
+    names: dict[str, str] = {}
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+                if sys.platform == "win32":
+                    for name in _windows_names(entry.name, exts):
+                        names.setdefault(name, entry.name)
+                elif os.access(entry.path, os.X_OK):
+                    names[entry.name] = entry.name
+    except OSError:
+        pass
+    trusted = time.time_ns() - mtime_ns > _RACY_WINDOW_NS
+    return DirListing(mtime_ns, names, trusted)
+
+
+def _stale(directory: str, listing: DirListing) -> bool:
+    if not listing.trusted:
+        return True
+    try:
+        return os.stat(directory).st_mtime_ns != listing.mtime_ns
+    except OSError:
+        return listing.mtime_ns is not None
+
+
+def search_dirs(paths: list[str]) -> list[str]:
+    """The directories paths name, with ~ and variables expanded and without
+    duplicates. Entries that can't be expanded here are left out rather than
+    looked up relative to the current directory."""
+    dirs = (expand_path(path) for path in paths if path)
+    return list(dict.fromkeys(directory for directory in dirs if directory))
+
+
+def current_paths() -> list[str]:
+    """The PATH a new shell would search: the entries of the bash file (or
+    the registry) in front of the PATH of this process, expanded and without
+    duplicates."""
+    from setenvironment.setenv import get_paths
+
+    return search_dirs(get_paths() + os.environ.get("PATH", "").split(os.pathsep))
+
+
+class ExecutableIndex:
+    """Maps command names to the first PATH directory that holds them."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._listings: dict[str, DirListing] = {}  # absolute directory -> listing
+        self._paths: tuple[str, ...] = ()
+        self._keys: tuple[str, ...] = ()  # absolute _paths
+        self._first: dict[str, int] = {}  # name -> position in _paths
+        self.scans = 0  # directory listings made, for tests and benchmarks
+
+    def _listing(self, key: str) -> DirListing:
+        listing = self._listings.get(key)
+        if listing is None:
+            listing = self._listings[key] = scan_directory(key)
+            self.scans += 1
+        return listing
+
+    def _rebuild(self, paths: tuple[str, ...]) -> None:
+        keys = tuple(os.path.abspath(directory) for directory in paths)
+        first: dict[str, int] = {}
+        for pos, key in enumerate(keys):
+            for name in self._listing(key).names:
+                first.setdefault(name, pos)
+        self._paths = paths
+        self._keys = keys
+        self._first = first
+
+    def _rescan_stale(self, keys: tuple[str, ...]) -> bool:
+        changed = False
+        for key in keys:
+            listing = self._listings.get(key)
+            if listing is not None and _stale(key, listing):
+                self._listings[key] = scan_directory(key)
+                self.scans += 1
+                changed = True
+        return changed
+
+    def lookup(self, name: str, paths: list[str] | None = None) -> str | None:
+        """Returns the executable that `name` runs, or None."""
+        if os.sep in name or (os.altsep and os.altsep in name):
+            return name if os.access(name, os.X_OK) else None
+        key = _normcase(name)
+        with self._lock:
+            path_key = tuple(current_paths() if paths is None else search_dirs(paths))
+            if path_key != self._paths:
+                self._rebuild(path_key)
+            for _ in range(_MAX_RETRIES):
+                end = self._first.get(key, len(self._paths))
+                # Only the directories in front of the answer can change it.
+                if not self._rescan_stale(self._keys[: end + 1]):
+                    break
+                self._rebuild(self._paths)
+            pos = self._first.get(key)
+            if pos is None:
+                return None
+            filename = self._listing(self._keys[pos]).names[key]
+            return os.path.join(self._paths[pos], filename)
+
+    def refresh(self, paths: list[str] | None = None) -> None:
+        """Rescans every directory whose mtime moved."""
+        with self._lock:
+            path_key = tuple(current_paths() if paths is None else search_dirs(paths))
+            if path_key != self._paths:
+                self._rebuild(path_key)
+            if self._rescan_stale(self._keys):
+                self._rebuild(path_key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._listings.clear()
+            self._paths = ()
+            self._keys = ()
+            self._first = {}
+
+
+_INDEX = ExecutableIndex()
+
+
+def which(name: str) -> str | None:
+    """Returns the executable that a new shell would run for name, using the
+    shared index."""
+    return _INDEX.lookup(name)
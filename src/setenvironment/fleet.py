@@ -0,0 +1,140 @@
+"""
+Bulk API for provisioning many homes (or rootfs trees) from one process.
+
+Every target is handled in a worker process of a ProcessPoolExecutor, so the
+bash file override and the os.environ updates that the regular API makes
+stay inside the worker and never touch the caller. Unix only.
+
+    results = run_fleet(
+        [
+            Target("/srv/homes/alice", [("set", "FOO", "bar"), ("addpath", "/opt/bin")]),
+            Target("/srv/homes/bob/.bashrc", [("get", "FOO"), ("env",)]),
+        ],
+        max_workers=8,
+    )
+
+The operations are named after the commands of the command line interface:
+("set", name, value), ("unset", name), ("get", name), ("addpath", path),
+("delpath", path), ("add_to_path_group", group, path),
+("remove_from_path_group", group, path), ("remove_path_group", group) and
+("env",), which evaluates the target with bash, HOME set to its home.
+"""
+
+# pylint: disable=import-outside-toplevel
+
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any
+
+_RC_FILES = [".bashrc", ".profile", ".bash_profile"]
+
+
+@dataclass
+class Target:
+    """A home directory or bash file, and the operations to run on it in order."""
+
+    path: str
+    operations: list[tuple[str, ...]] = field(default_factory=list)
+    namespace: str | None = None
+
+
+@dataclass
+class TargetResult:
+    """What run_fleet did for one target."""
+
+    path: str
+    rc_file: str = ""
+    results: list[Any] = field(default_factory=list)  # one per operation that ran
+    timings: list[float] = field(default_factory=list)  # seconds, one per operation
+    seconds: float = 0.0  # the whole target
+    error: str | None = None  # the operation that failed stops the target
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def resolve_target(path: str) -> tuple[str, str]:
+    """Returns the (home, bash file) of a target. A directory is a home, its
+    bash file is picked like the one of the current user."""
+    path = os.path.abspath(os.path.expanduser(path))
+    if not os.path.isdir(path):
+        return os.path.dirname(path), path
+    for name in _RC_FILES:
+        rc_file = os.path.join(path, name)
+        if os.path.exists(rc_file):
+            return path, rc_file
+    return path, os.path.join(path, _RC_FILES[0])
+
+
+def _run_operation(
+    operation: tuple[str, ...], home: str, rc_file: str, namespace: str | None
+) -> Any:
+    from setenvironment import setenv_unix
+
+    name, args = operation[0], operation[1:]
+    if name == "set":
+        return setenv_unix.set_env_var(args[0], args[1], namespace=namespace)
+    if name == "unset":
+        return setenv_unix.unset_env_var(args[0], namespace=namespace)
+    if name == "get":
+        return setenv_unix.get_env_var(args[0], namespace=namespace)
+    if name == "addpath":
+        return setenv_unix.add_env_path(args[0], namespace=namespace)
+    if name == "delpath":
+        return setenv_unix.remove_env_path(args[0], namespace=namespace)
+    if name == "add_to_path_group":
+        return setenv_unix.add_path_group(args[0], args[1], namespace=namespace)
+    if name == "remove_from_path_group":
+        return setenv_unix.remove_from_path_group(args[0], args[1], namespace=namespace)
+    if name == "remove_path_group":
+        return setenv_unix.remove_path_group(args[0], namespace=namespace)
+    if name == "env":
+        return setenv_unix.get_env_vars_from_shell(rc_file, home=home)
+    raise ValueError(f"Unknown operation {name!r}")
+
+
+def run_target(target: Target) -> TargetResult:
+    """Runs the operations of one target in this process. The bash file
+    override and os.environ are put back afterwards, since pool workers are
+    reused for other targets."""
+    from setenvironment import bash_parser
+
+    start = time.perf_counter()
+    home, rc_file = resolve_target(target.path)
+    out = TargetResult(path=target.path, rc_file=rc_file)
+    saved_environ = dict(os.environ)
+    saved_override = bash_parser.BASH_FILE_OVERRIDE
+    try:
+        bash_parser.bash_rc_set_file(rc_file)
+        for operation in target.operations:
+            op_start = time.perf_counter()
+            try:
+                out.results.append(_run_operation(operation, home, rc_file, target.namespace))
+            except Exception as exc:  # pylint: disable=broad-except
+                out.error = f"{operation[0]}: {type(exc).__name__}: {exc}"
+                break
+            finally:
+                out.timings.append(time.perf_counter() - op_start)
+    finally:
+        bash_parser.BASH_FILE_OVERRIDE = saved_override
+        os.environ.clear()
+        os.environ.update(saved_environ)
+    out.seconds = time.perf_counter() - start
+    return out
+
+
+def run_fleet(targets: list[Target], max_workers: int | None = None) -> list[TargetResult]:
+    """Runs the targets across a process pool with at most max_workers processes
+    (the number of CPUs by default). Returns one result per target, in order."""
+    if sys.platform == "win32":
+        raise NotImplementedError("run_fleet works on bash files, unix only.")
+    if not targets:
+        return []
+    max_workers = min(max_workers or os.cpu_count() or 1, len(targets))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(run_target, target) for target in targets]
+        return [future.result() for future in futures]
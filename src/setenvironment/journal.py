@@ -0,0 +1,162 @@
+"""
+Append-only journal of variable writes, kept in a sidecar file next to the
+bash file.
+
+In journal mode a single set/unset appends one record instead of rewriting
+the managed block. The block sources the journal, so shells see the records
+straight away, and the journal is compacted back into the block once it
+grows past JOURNAL_MAX_RECORDS or JOURNAL_MAX_BYTES.
+"""
+
+import os
+import shlex
+import threading
+from dataclasses import dataclass, field
+
+from setenvironment import util
+from setenvironment.bash_ast import tokenize_line
+
+JOURNAL_MODE = os.environ.get("SETENVIRONMENT_JOURNAL", "") == "1"
+JOURNAL_MAX_RECORDS = 256
+JOURNAL_MAX_BYTES = 64 * 1024
+_TAIL_BYTES = 64  # parsed bytes kept to check that the file is still the same
+
+
+@dataclass
+class JournalState:
+    """The records of a journal, folded into the last value of each name."""
+
+    key: tuple[int, int, int] = (0, 0, 0)  # (st_dev, st_ino, bytes parsed so far)
+    records: int = 0
+    overrides: dict[str, str | None] = field(default_factory=dict)  # None: unset
+    ctime_ns: int = 0  # st_ctime_ns when the state was read
+    tail: bytes = b""  # the last bytes parsed
+
+    @property
+    def size(self) -> int:
+        return self.key[2]
+
+
+_JOURNAL_CACHE: dict[str, JournalState] = {}
+_JOURNAL_CACHE_LOCK = threading.Lock()
+
+
+def journal_set_mode(
+    enabled: bool, max_records: int | None = None, max_bytes: int | None = None
+) -> None:
+    """Turns journal mode on or off and optionally sets the compaction thresholds."""
+    global JOURNAL_MODE, JOURNAL_MAX_RECORDS, JOURNAL_MAX_BYTES
+    JOURNAL_MODE = enabled
+    if max_records is not None:
+        JOURNAL_MAX_RECORDS = max_records
+    if max_bytes is not None:
+        JOURNAL_MAX_BYTES = max_bytes
+
+
+def journal_path(shell_file: str, namespace: str | None = None) -> str:
+    """Returns the sidecar journal of the block of the namespace in the bash file."""
+    suffix = "journal" if namespace is None else f"{namespace}.journal"
+    return f"{os.path.abspath(shell_file)}.setenvironment.{suffix}"
+
+
+def journal_source_line(journal_file: str) -> str:
+    """The line of the managed block that sources the journal."""
+    quoted = shlex.quote(journal_file)
+    return f"if [ -f {quoted} ]; then . {quoted}; fi"
+
+
+def journal_record(name: str, value: str | None) -> str:
+    """Returns the journal line that sets (or with None, unsets) a variable."""
+    if value is None:
+        return f"unset {name}"
+    return f"export {name}={value}"
+
+
+def _parse_records(data: bytes, state: JournalState) -> None:
+    for line in data.decode("utf-8", "surrogateescape").splitlines():
+        node = tokenize_line(line)
+        if node.name is not None:
+            state.overrides[node.name] = node.value
+            state.records += 1
+            continue
+        parts = line.split()
+        if len(parts) == 2 and parts[0] == "unset":
+            state.overrides[parts[1]] = None
+            state.records += 1
+
+
+def _cached_state(journal_file: str, st: os.stat_result) -> JournalState | None:
+    """The cached state of the journal if the file is still the one it was
+    read from, checked by device, inode, size and, for a grown file, by the
+    last bytes parsed. A journal compacted and recreated by another process
+    can reuse the inode."""
+    with _JOURNAL_CACHE_LOCK:
+        cached = _JOURNAL_CACHE.get(journal_file)
+    if cached is None or cached.key[:2] != (st.st_dev, st.st_ino) or cached.size > st.st_size:
+        return None
+    if cached.size == st.st_size and cached.ctime_ns != st.st_ctime_ns:
+        return None  # rewritten in place
+    return cached
+
+
+def journal_read(journal_file: str) -> JournalState | None:
+    """Returns the folded records of the journal, or None if it is empty. Only
+    the bytes appended since the last call are parsed."""
+    try:
+        st = os.stat(journal_file)
+    except FileNotFoundError:
+        return None
+    if st.st_size == 0:
+        return None
+    cached = _cached_state(journal_file, st)
+    if cached is not None and cached.size == st.st_size:
+        return cached
+    with open(journal_file, mode="rb") as file:
+        if cached is not None:
+            file.seek(cached.size - len(cached.tail))
+            data = file.read()
+            if data.startswith(cached.tail):
+                data = data[len(cached.tail) :]
+            else:
+                cached = None
+        if cached is None:
+            file.seek(0)
+            data = file.read()
+    if cached is None:
+        state = JournalState(key=(st.st_dev, st.st_ino, 0))
+    else:
+        state = JournalState(cached.key, cached.records, dict(cached.overrides), tail=cached.tail)
+    # A record that is still being appended is picked up on the next read.
+    complete = data.rfind(b"\n") + 1
+    _parse_records(data[:complete], state)
+    state.key = (st.st_dev, st.st_ino, state.size + complete)
+    state.ctime_ns = st.st_ctime_ns
+    state.tail = (state.tail + data[:complete])[-_TAIL_BYTES:]
+    with _JOURNAL_CACHE_LOCK:
+        _JOURNAL_CACHE[journal_file] = state
+    return state
+
+
+def journal_append(journal_file: str, records: list[str]) -> JournalState:
+    """Appends records with a single write and returns the new journal state."""
+    data = "".join(record + "\n" for record in records).encode("utf-8", "surrogateescape")
+    fd = os.open(journal_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, data)
+        if util.FSYNC_POLICY != "none":
+            os.fsync(fd)
+    finally:
+        os.close(fd)
+    state = journal_read(journal_file)
+    assert state is not None
+    return state
+
+
+def journal_clear(journal_file: str) -> None:
+    """Removes the journal, after its records were compacted into the block."""
+    try:
+        os.remove(journal_file)
+    except FileNotFoundError:
+        pass
+    with _JOURNAL_CACHE_LOCK:
+        _JOURNAL_CACHE.pop(journal_file, None)
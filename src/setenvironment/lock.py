@@ -0,0 +1,148 @@
+"""
+Advisory locking of the bash file, so that concurrent writers don't lose
+each other's updates.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:  # windows, where the registry is used instead.
+    fcntl = None  # type: ignore
+
+LOCK_TIMEOUT = float(os.environ.get("SETENVIRONMENT_LOCK_TIMEOUT", "30"))
+
+
+class LockTimeoutError(TimeoutError):
+    """Raised when the lock of the bash file could not be taken in time."""
+
+
+@dataclass
+class LockStats:
+    """Contention counters of rc_file_lock, for this process."""
+
+    acquisitions: int = 0
+    contended: int = 0  # acquisitions that had to wait for another holder
+    timeouts: int = 0
+    total_wait: float = 0.0  # seconds
+    max_wait: float = 0.0  # seconds
+
+
+@dataclass
+class _HeldLock:
+    mutex: threading.RLock
+    fd: int = -1
+    depth: int = 0
+
+
+_STATS = LockStats()
+_STATS_LOCK = threading.Lock()
+_LOCKS: dict[str, _HeldLock] = {}
+_LOCKS_GUARD = threading.Lock()
+
+
+def get_lock_stats() -> LockStats:
+    """Returns a snapshot of the lock counters."""
+    with _STATS_LOCK:
+        return replace(_STATS)
+
+
+def reset_lock_stats() -> None:
+    """Zeroes the lock counters."""
+    global _STATS
+    with _STATS_LOCK:
+        _STATS = LockStats()
+
+
+def set_lock_timeout(seconds: float) -> None:
+    """Sets how long rc_file_lock waits before raising LockTimeoutError."""
+    global LOCK_TIMEOUT
+    LOCK_TIMEOUT = seconds
+
+
+def lock_path(shell_file: str) -> str:
+    """Returns the lock file that guards the bash file."""
+    return f"{os.path.realpath(shell_file)}.setenvironment.lock"
+
+
+def _record(wait: float, contended: bool, timed_out: bool) -> None:
+    with _STATS_LOCK:
+        if timed_out:
+            _STATS.timeouts += 1
+        else:
+            _STATS.acquisitions += 1
+        if contended:
+            _STATS.contended += 1
+        _STATS.total_wait += wait
+        _STATS.max_wait = max(_STATS.max_wait, wait)
+
+
+def _flock(fd: int, deadline: float) -> bool:
+    """Takes the flock, polling until the deadline. Returns True if it had to wait."""
+    assert fcntl is not None
+    delay = 0.001
+    contended = False
+    while True:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return contended
+        except BlockingIOError:
+            contended = True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.05)
+
+
+@contextmanager
+def rc_file_lock(shell_file: str, timeout: float | None = None) -> Iterator[None]:
+    """Holds an exclusive lock on the bash file for a read-modify-write.
+
+    The lock is reentrant within the process, nested calls from the same
+    thread only count the outermost acquisition."""
+    if fcntl is None:
+        yield
+        return
+    timeout = LOCK_TIMEOUT if timeout is None else timeout
+    lock_file = lock_path(shell_file)
+    with _LOCKS_GUARD:
+        held = _LOCKS.setdefault(lock_file, _HeldLock(threading.RLock()))
+    start = time.monotonic()
+    deadline = start + timeout
+    if not held.mutex.acquire(timeout=timeout):
+        _record(time.monotonic() - start, True, True)
+        raise LockTimeoutError(f"Timed out after {timeout}s waiting for {lock_file}")
+    try:
+        if held.depth == 0:
+            contended = time.monotonic() - start > 0.001
+            fd = os.open(lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                contended = _flock(fd, deadline) or contended
+            except BlockingIOError:
+                os.close(fd)
+                _record(time.monotonic() - start, True, True)
+                raise LockTimeoutError(
+                    f"Timed out after {timeout}s waiting for {lock_file}"
+                ) from None
+            except BaseException:
+                os.close(fd)
+                raise
+            held.fd = fd
+            _record(time.monotonic() - start, contended, False)
+        held.depth += 1
+        try:
+            yield
+        finally:
+            held.depth -= 1
+            if held.depth == 0:
+                fcntl.flock(held.fd, fcntl.LOCK_UN)
+                os.close(held.fd)
+                held.fd = -1
+    finally:
+        held.mutex.release()
@@ -1,50 +1,66 @@
+"""
+The setenvironment command.
+
+get, has and bashrc only read the bash file, so main() answers them before
+argparse or setenvironment.setenv are imported, see _fast_main(). The other
+commands import what they use when they run.
+"""
+
+# pylint: disable=import-outside-toplevel
 # flake8: noqa: E501
 
-import argparse
 import os
-import subprocess
 import sys
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import argparse
 
-from setenvironment.bash_parser import bash_rc_file, bash_rc_set_file
-from setenvironment.setenv import (
-    add_env_path,
-    get_env,
-    get_env_var,
-    reload_environment,
-    remove_env_path,
-    set_env_var,
-    unset_env_var,
-)
+# Read-only commands that _fast_main() handles -> number of arguments.
+_FAST_COMMANDS = {"get": 1, "has": 1, "bashrc": 0}
+_FAST_OPTIONS = ("--config", "--namespace")
 
 
-def do_get(key: str) -> str:
+def do_get(key: str, namespace: str | None = None) -> str:
     """Get the value of an environment variable."""
-    return get_env_var(key) or ""
+    from setenvironment.setenv import get_env_var
 
+    return get_env_var(key, namespace=namespace) or ""
 
-def do_set(key: str, val: str) -> None:
+
+def do_set(key: str, val: str, namespace: str | None = None) -> None:
     """Set an environment variable."""
-    set_env_var(key, val)
+    from setenvironment.setenv import set_env_var
+
+    set_env_var(key, val, namespace=namespace)
 
 
-def do_del(key: str) -> None:
+def do_del(key: str, namespace: str | None = None) -> None:
     """Delete an environment variable."""
-    unset_env_var(key)
+    from setenvironment.setenv import unset_env_var
+
+    unset_env_var(key, namespace=namespace)
 
 
-def do_addpath(path: str) -> None:
+def do_addpath(path: str, namespace: str | None = None) -> None:
     """Add a path to the PATH environment variable."""
-    add_env_path(path)
+    from setenvironment.setenv import add_env_path
 
+    add_env_path(path, namespace=namespace)
 
-def do_delpath(path: str) -> None:
+
+def do_delpath(path: str, namespace: str | None = None) -> None:
     """Remove a path from the PATH environment variable."""
-    remove_env_path(path)
+    from setenvironment.setenv import remove_env_path
+
+    remove_env_path(path, namespace=namespace)
 
 
-def do_has(key: str) -> bool:
+def do_has(key: str, namespace: str | None = None) -> bool:
     """Check if an environment variable exists."""
-    return get_env_var(key) is not None
+    from setenvironment.setenv import get_env_var
+
+    return get_env_var(key, namespace=namespace) is not None
 
 
 def do_show() -> None:
@@ -55,18 +71,16 @@ def do_show() -> None:
         env = query_registry_environment()
         print(env.to_json())
         return
+    from setenvironment.setenv import get_env
+
     env = get_env()
     print(env.to_json())
-    return
-    bashrc_path = bash_rc_file()
-    with open(bashrc_path, encoding="utf8", mode="r") as f:
-        contents = f.read()
-    msg = f"{os.path.abspath(bashrc_path)}:\n{contents}"
-    print(msg)
 
 
 def do_show_bashrc() -> None:
     """Show the path to the bashrc file."""
+    from setenvironment.bash_parser import bash_rc_file
+
     bashrc_path = bash_rc_file()
     with open(bashrc_path, encoding="utf8", mode="r") as f:
         contents = f.read()
@@ -76,19 +90,61 @@ def do_show_bashrc() -> None:
 
 def do_refresh(cmd: str) -> None:
     """Refreshes from the system environment."""
+    from setenvironment.setenv import get_env, reload_environment
+
     reload_environment()
     if cmd:
+        import subprocess
+
         subprocess.call(cmd, shell=True, env=os.environ)
     else:
         env = get_env()
         print(env.to_json())
 
 
-def parse_args() -> argparse.Namespace:
+def do_profile(top: int, bash: str) -> None:
+    """Profiles the startup files that get_env() sources."""
+    from setenvironment.profiler import profile_startup
+
+    print(profile_startup(bash=bash).format(top=top))
+
+
+def do_which(name: str) -> str | None:
+    """Returns the executable that a new shell would run for the name."""
+    from setenvironment.exe_index import which
+
+    return which(name)
+
+
+def do_doctor(timeout: float, slow: float, prune: bool) -> bool:
+    """Checks the PATH entries and path groups, returns True if all are healthy."""
+    from setenvironment import doctor
+
+    report = doctor.doctor(timeout=timeout, slow=slow)
+    print(report.format())
+    if prune:
+        removed = doctor.prune(report)
+        print(f"Pruned {len(removed)} missing entries.")
+    return report.healthy
+
+
+def parse_args() -> "argparse.Namespace":
+    import argparse
+
     parser = argparse.ArgumentParser(
         description="Set environment variables from the command line."
     )
     parser.add_argument("--config", help="Path to the config file", default=None)
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="Print a tree of the time spent in reads, parses, writes and subprocesses to stderr",
+    )
+    parser.add_argument(
+        "--namespace",
+        help="Named block of the config file to use, unix only",
+        default=None,
+    )
     subparsers = parser.add_subparsers(
         dest="command", required=True, help="Sub-command help"
     )
@@ -126,28 +182,114 @@ def parse_args() -> argparse.Namespace:
         "refresh", help="Refreshes from the system environment"
     )
     parser_refresh.add_argument("cmd", nargs="?", default="")
+    parser_which = subparsers.add_parser(
+        "which", help="Show the executable a new shell would run for a command"
+    )
+    parser_which.add_argument("name", help="Name of the command")
+    parser_doctor = subparsers.add_parser(
+        "doctor", help="Check the PATH entries and path groups for dead or slow entries"
+    )
+    parser_doctor.add_argument(
+        "--timeout", type=float, default=2.0, help="Seconds before an entry counts as hung"
+    )
+    parser_doctor.add_argument(
+        "--slow", type=float, default=0.1, help="Seconds before an entry counts as slow"
+    )
+    parser_doctor.add_argument(
+        "--prune", action="store_true", help="Remove the missing entries in one write"
+    )
+    parser_profile = subparsers.add_parser(
+        "profile", help="Time the lines and files that the shell sources, unix only"
+    )
+    parser_profile.add_argument(
+        "--top", type=int, default=10, help="Number of slowest lines to show"
+    )
+    parser_profile.add_argument(
+        "--bash", default="/bin/bash", help="bash 5 or later to profile with"
+    )
 
     return parser.parse_args()
 
 
+def _fast_main(argv: list[str]) -> int | None:
+    """Runs get, has and bashrc with nothing more than the bash parser
+    imported. Returns None for any other command line, e.g. --help or an
+    option it does not know, which main() then parses with argparse."""
+    if sys.platform == "win32":
+        return None  # The registry is read through setenv_win32.
+    options: dict[str, str] = {}
+    i = 0
+    while i < len(argv) and argv[i].startswith("-"):
+        name, sep, value = argv[i].partition("=")
+        if name not in _FAST_OPTIONS or name in options:
+            return None
+        if not sep:
+            if i + 1 == len(argv):
+                return None
+            i += 1
+            value = argv[i]
+        if not value or value.startswith("-"):
+            return None
+        options[name] = value
+        i += 1
+    command, args = (argv[i], argv[i + 1 :]) if i < len(argv) else ("", [])
+    if _FAST_COMMANDS.get(command) != len(args) or any(arg.startswith("-") for arg in args):
+        return None
+    from setenvironment import bash_parser
+
+    if "--config" in options:
+        bash_parser.bash_rc_set_file(options["--config"])
+    if command == "bashrc":
+        do_show_bashrc()
+        return 0
+    # Same as get_env_var(), there is no transaction open in a new process.
+    found = bash_parser.bash_read_variable(args[0], options.get("--namespace"))
+    if command == "get":
+        print(found or "")
+    else:
+        print(1 if found is not None else 0)
+    return 0
+
+
 def main() -> int:
     """Main entry point."""
+    code = _fast_main(sys.argv[1:])
+    if code is not None:
+        return code
     args = parse_args()
     if args.config is not None:
-        bash_rc_set_file(args.config)
+        from setenvironment.bash_parser import bash_rc_set_file
 
+        bash_rc_set_file(args.config)
+    if not args.trace:
+        return run_command(args)
+    from setenvironment import trace
+
+    collector = trace.SpanCollector()
+    trace.add_listener(collector)
+    try:
+        with trace.span(f"setenvironment {args.command}"):
+            return run_command(args)
+    finally:
+        trace.remove_listener(collector)
+        print(trace.format_tree(collector.spans), file=sys.stderr)
+
+
+def run_command(args: "argparse.Namespace") -> int:
+    """Runs the sub-command of the parsed arguments, returns the exit code."""
+    namespace = args.namespace
     if args.command == "set":
-        do_set(args.key, args.value)
+        do_set(args.key, args.value, namespace)
     elif args.command == "get":
-        print(do_get(args.key))
+        print(do_get(args.key, namespace))
     elif args.command == "del":
-        do_del(args.key)
+        do_del(args.key, namespace)
     elif args.command == "addpath":
-        do_addpath(args.path)
+        do_addpath(args.path, namespace)
     elif args.command == "delpath":
-        do_delpath(args.path)
+        do_delpath(args.path, namespace)
     elif args.command == "has":
-        exists = 1 if do_has(args.key) else 0
+        exists = 1 if do_has(args.key, namespace) else 0
         print(exists)
     elif args.command == "show":
         do_show()
@@ -155,9 +297,19 @@ def main() -> int:
         do_show_bashrc()
     elif args.command == "refresh":
         do_refresh(args.cmd)
+    elif args.command == "which":
+        exe = do_which(args.name)
+        if exe is None:
+            return 1
+        print(exe)
+    elif args.command == "doctor":
+        if not do_doctor(args.timeout, args.slow, args.prune):
+            return 1
+    elif args.command == "profile":
+        do_profile(args.top, args.bash)
 
     return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+Profiles the startup files that get_env() sources.
+
+Runs the same sequence as get_env_vars_from_shell (~/.profile, then the
+bash file) with xtrace on and a PS4 that stamps every traced command with
+EPOCHREALTIME, the file and the line. Each command is charged the time until
+the next traced command. Needs bash 5 or later for EPOCHREALTIME.
+"""
+
+import os
+import shlex
+import subprocess
+import tempfile
+from dataclasses import dataclass, field
+
+from setenvironment.bash_parser import bash_rc_file
+
+_SEP = "\x1f"
+_PS4 = f"+{_SEP}${{EPOCHREALTIME}}{_SEP}${{BASH_SOURCE[0]}}{_SEP}${{LINENO}}{_SEP}"
+_TRACE_FD = 9
+
+
+@dataclass
+class LineTiming:
+    """Time spent on one line of a sourced file, over all of its runs."""
+
+    file: str
+    lineno: int
+    command: str  # the first traced command of the line
+    seconds: float = 0.0
+    count: int = 0
+
+
+@dataclass
+class ProfileReport:
+    """The result of profile_startup."""
+
+    total: float = 0.0  # seconds
+    lines: list[LineTiming] = field(default_factory=list)
+    per_file: dict[str, float] = field(default_factory=dict)  # file -> seconds
+    sourced: dict[str, int] = field(default_factory=dict)  # file -> times sourced
+
+    def slowest(self, count: int = 10) -> list[LineTiming]:
+        """Returns the lines that took the most time."""
+        return sorted(self.lines, key=lambda line: line.seconds, reverse=True)[:count]
+
+    def duplicates(self) -> dict[str, int]:
+        """Returns the files that were sourced more than once."""
+        return {path: n for path, n in self.sourced.items() if n > 1}
+
+    def format(self, top: int = 10) -> str:
+        """Formats the report for the terminal."""
+        out = [f"Total: {self.total * 1000:.1f} ms", "", "Time per file:"]
+        for path, seconds in sorted(self.per_file.items(), key=lambda kv: -kv[1]):
+            out.append(f"  {seconds * 1000:9.1f} ms  {path}")
+        out += ["", f"Slowest {top} lines:"]
+        for line in self.slowest(top):
+            runs = f" (x{line.count})" if line.count > 1 else ""
+            out.append(
+                f"  {line.seconds * 1000:9.1f} ms  {line.file}:{line.lineno}{runs}  {line.command}"
+            )
+        duplicates = self.duplicates()
+        if duplicates:
+            out += ["", "Sourced more than once:"]
+            for path, count in sorted(duplicates.items()):
+                out.append(f"  {count}x  {path}")
+        return "\n".join(out)
+
+
+def _sourced_file(command: str) -> str | None:
+    """Returns the file of a traced `source file` or `. file` command."""
+    try:
+        words = shlex.split(command)
+    except ValueError:
+        return None
+    if len(words) < 2 or words[0] not in ("source", "."):
+        return None
+    return os.path.abspath(os.path.expanduser(words[1]))
+
+
+def parse_xtrace(text: str) -> ProfileReport:
+    """Builds the report from the xtrace output written with our PS4."""
+    records: list[tuple[float, str, int, str]] = []
+    for raw in text.split("\n"):
+        parts = raw.split(_SEP, 4)
+        if len(parts) != 5 or not parts[0] or parts[0].strip("+"):
+            continue  # the continuation of a multi line command
+        try:
+            stamp = float(parts[1])
+            lineno = int(parts[3])
+        except ValueError:
+            continue
+        records.append((stamp, parts[2], lineno, parts[4]))
+    report = ProfileReport()
+    if not records:
+        return report
+    report.total = records[-1][0] - records[0][0]
+    by_line: dict[tuple[str, int], LineTiming] = {}
+    for i, (stamp, path, lineno, command) in enumerate(records):
+        sourced = _sourced_file(command)
+        if sourced is not None:
+            report.sourced[sourced] = report.sourced.get(sourced, 0) + 1
+        if not path:
+            continue  # the wrapper script, not a sourced file
+        seconds = records[i + 1][0] - stamp if i + 1 < len(records) else 0.0
+        path = os.path.abspath(path)
+        timing = by_line.get((path, lineno))
+        if timing is None:
+            timing = by_line[(path, lineno)] = LineTiming(path, lineno, command)
+        timing.seconds += seconds
+        timing.count += 1
+        report.per_file[path] = report.per_file.get(path, 0.0) + seconds
+    report.lines = list(by_line.values())
+    return report
+
+
+def profile_script(settings_file: str, trace_file: str) -> str:
+    """The bash script that traces the sourcing of the settings into trace_file."""
+    return "; ".join(
+        [
+            '[ "${BASH_VERSINFO[0]}" -ge 5 ] || { echo "profile needs bash 5 or later" >&2; exit 3; }',
+            f"exec {_TRACE_FD}>{shlex.quote(trace_file)}",
+            f"BASH_XTRACEFD={_TRACE_FD}",
+            f"PS4=$'{_PS4}'",
+            "set -x",
+            "source ~/.profile",
+            f"source {shlex.quote(settings_file)}",
+            "set +x",
+        ]
+    )
+
+
+def profile_startup(
+    settings_file: str | None = None, bash: str = "/bin/bash", timeout: float | None = None
+) -> ProfileReport:
+    """Sources ~/.profile and the bash file like get_env() does, with xtrace
+    timestamps, and returns where the time went."""
+    settings_file = settings_file or bash_rc_file()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        trace_file = os.path.join(tmpdir, "xtrace")
+        completed = subprocess.run(
+            [bash, "-c", profile_script(settings_file, trace_file)],
+            capture_output=True,
+            env={},  # do not inherit parent environment, like get_env()
+            timeout=timeout,
+            check=False,
+        )
+        if completed.returncode == 3 or not os.path.exists(trace_file):
+            raise RuntimeError(completed.stderr.decode("utf-8", "replace").strip())
+        with open(trace_file, encoding="utf-8", errors="replace", mode="r") as file:
+            return parse_xtrace(file.read())
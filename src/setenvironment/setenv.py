@@ -8,10 +8,12 @@ This module provides functions for setting environment variables.
 
 import os
 import sys
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional, Union
+from typing import Iterator, Optional, Union
 
 from setenvironment.types import Environment
+from setenvironment.util import canonicalize_paths
 
 _IS_WINDOWS = sys.platform == "win32"
 
@@ -21,8 +23,13 @@ def set_env_var(
     var_value: Union[str, Path, int, float],
     verbose=False,
     update_curr_environment: bool = True,
+    namespace: Optional[str] = None,
 ) -> None:
-    """Sets an environment variable for the platform."""
+    """Sets an environment variable for the platform.
+
+    On unix, namespace selects a separate managed block of the bash file
+    ("# START setenvironment:<namespace>") so independent tools don't rewrite
+    each other's entries. It is ignored on windows."""
     var_value = str(var_value)
     if verbose:
         print(f"$$$ Setting {var_name} to {var_value}")
@@ -40,11 +47,16 @@ def set_env_var(
         var_name = str(var_name)
         var_value = str(var_value)
         unix_set_env_var(
-            var_name, var_value, update_curr_environment=update_curr_environment
+            var_name,
+            var_value,
+            update_curr_environment=update_curr_environment,
+            namespace=namespace,
         )
 
 
-def get_env_var(var_name: str, verbose=False, resolve=None) -> Optional[str]:
+def get_env_var(
+    var_name: str, verbose=False, resolve=None, namespace: Optional[str] = None
+) -> Optional[str]:
     """Gets an environment variable for the platform."""
     if verbose:
         print(f"$$$ Getting {var_name}")
@@ -54,13 +66,16 @@ def get_env_var(var_name: str, verbose=False, resolve=None) -> Optional[str]:
         var_name = str(var_name)
         return win32_get_env_var(var_name, resolve=resolve)
     else:
-        from .bash_parser import bash_read_variable
+        from .setenv_unix import get_env_var as unix_get_env_var
 
         var_name = str(var_name)
-        return bash_read_variable(var_name)
+        return unix_get_env_var(var_name, namespace=namespace)
 
 
-def get_paths(resolve=None) -> list[str]:
+def get_paths(resolve=None, normalize=False, realpath=False) -> list[str]:
+    """Returns the paths of the PATH in the settings. With normalize, entries
+    are expanded, trailing slashes dropped and duplicates removed, keeping the
+    first. realpath also treats symlinked directories as duplicates."""
     if resolve is None:
         resolve = True if _IS_WINDOWS else False
     paths = get_env_var("PATH", resolve=resolve) or ""
@@ -75,6 +90,8 @@ def get_paths(resolve=None) -> list[str]:
         else:
             resolved_paths.append(path)
     resolved_paths = [p for p in resolved_paths if p]
+    if normalize or realpath:
+        resolved_paths = canonicalize_paths(resolved_paths, realpath=realpath)
     return resolved_paths
 
 
@@ -84,7 +101,7 @@ def set_paths(paths: list[str]) -> None:
     set_env_var("PATH", new_path_str)
 
 
-def unset_env_var(var_name: str, verbose=False) -> None:
+def unset_env_var(var_name: str, verbose=False, namespace: Optional[str] = None) -> None:
     """Unsets an environment variable for the platform."""
     if verbose:
         print(f"$$$ Unsetting {var_name}")
@@ -97,10 +114,27 @@ def unset_env_var(var_name: str, verbose=False) -> None:
         from .setenv_unix import unset_env_var as unix_unset_env_var
 
         var_name = str(var_name)
-        unix_unset_env_var(var_name)
+        unix_unset_env_var(var_name, namespace=namespace)
+
+
+@contextmanager
+def transaction() -> Iterator[None]:
+    """Batches the mutations made inside the with block.
+
+    On unix every set/unset/path call is staged in memory and committed with
+    a single write of the bash file and a single update of os.environ when
+    the block exits. If the block raises, neither is touched. On windows the
+    registry is written on each call as usual."""
+    if _IS_WINDOWS:
+        yield
+    else:
+        from .setenv_unix import transaction as unix_transaction
+
+        with unix_transaction():
+            yield
 
 
-def add_env_path(new_path: Union[Path, str]) -> None:
+def add_env_path(new_path: Union[Path, str], namespace: Optional[str] = None) -> None:
     """Adds a path to the front of the PATH environment variable."""
     new_path = str(new_path)
     if _IS_WINDOWS:
@@ -110,10 +144,10 @@ def add_env_path(new_path: Union[Path, str]) -> None:
     else:
         from .setenv_unix import add_env_path as unix_add_env_path
 
-        unix_add_env_path(new_path)
+        unix_add_env_path(new_path, namespace=namespace)
 
 
-def remove_env_path(path: Union[Path, str]) -> None:
+def remove_env_path(path: Union[Path, str], namespace: Optional[str] = None) -> None:
     """Removes a path from the PATH environment variable."""
     path = str(path)
     if _IS_WINDOWS:
@@ -123,11 +157,15 @@ def remove_env_path(path: Union[Path, str]) -> None:
     else:
         from .setenv_unix import remove_env_path as unix_remove_env_path
 
-        unix_remove_env_path(path)
+        unix_remove_env_path(path, namespace=namespace)
 
 
-def reload_environment(verbose=False, resolve=False) -> None:
-    """Reloads the environment."""
+def reload_environment(
+    verbose=False, resolve=False, fast=False, normalize=False, realpath=False
+) -> None:
+    """Reloads the environment. On unix, fast evaluates simple managed blocks
+    in process instead of running bash, falling back to bash when needed.
+    normalize and realpath canonicalize the resulting PATH, see get_paths."""
     if _IS_WINDOWS:
         from .setenv_win32 import reload_environment as win32_reload_environment
 
@@ -136,7 +174,16 @@ def reload_environment(verbose=False, resolve=False) -> None:
     else:
         from .setenv_unix import reload_environment as unix_reload_environment
 
-        unix_reload_environment(verbose=verbose, resolve=resolve)
+        unix_reload_environment(verbose=verbose, resolve=resolve, fast=fast)
+    if normalize or realpath:
+        _normalize_os_path(realpath)
+
+
+def _normalize_os_path(realpath: bool) -> None:
+    paths = os.environ.get("PATH", "").split(os.pathsep)
+    path_str = os.pathsep.join(canonicalize_paths(paths, realpath=realpath))
+    if path_str != os.environ.get("PATH"):
+        os.environ["PATH"] = path_str
 
 
 def get_env() -> Environment:
@@ -151,7 +198,7 @@ def get_env() -> Environment:
         return unix_get_env()
 
 
-def add_to_path_group(group_name: str, new_path: str) -> None:
+def add_to_path_group(group_name: str, new_path: str, namespace: Optional[str] = None) -> None:
     """Adds a path to the front of the PATH environment variable."""
     if _IS_WINDOWS:
         from .setenv_win32 import add_path_group as win32_add_path_group
@@ -160,10 +207,12 @@ def add_to_path_group(group_name: str, new_path: str) -> None:
     else:
         from .setenv_unix import add_path_group as unix_add_path_group
 
-        unix_add_path_group(group_name, new_path)
+        unix_add_path_group(group_name, new_path, namespace=namespace)
 
 
-def remove_from_path_group(group_name: str, path_to_remove: str) -> None:
+def remove_from_path_group(
+    group_name: str, path_to_remove: str, namespace: Optional[str] = None
+) -> None:
     """Removes a path from the PATH environment variable."""
     if _IS_WINDOWS:
         from .setenv_win32 import remove_from_path_group as win32_remove_path_group
@@ -172,11 +221,11 @@ def remove_from_path_group(group_name: str, path_to_remove: str) -> None:
     else:
         from .setenv_unix import remove_from_path_group as unix_remove_path_group
 
-        unix_remove_path_group(group_name, path_to_remove)
+        unix_remove_path_group(group_name, path_to_remove, namespace=namespace)
 
 
 # remove_path_group
-def remove_path_group(group_name: str) -> None:
+def remove_path_group(group_name: str, namespace: Optional[str] = None) -> None:
     """Removes a path from the PATH environment variable."""
     if _IS_WINDOWS:
         from .setenv_win32 import remove_path_group as win32_remove_path_group
@@ -185,4 +234,4 @@ def remove_path_group(group_name: str) -> None:
     else:
         from .setenv_unix import remove_path_group as unix_remove_path_group
 
-        unix_remove_path_group(group_name)
+        unix_remove_path_group(group_name, namespace=namespace)
@@ -5,15 +5,100 @@ Adds setenv for unix.
 # pylint: disable=C0116
 # flake8: noqa: E501
 
-import json
+import functools
 import os
+import shlex
 import subprocess
-import sys
-import tempfile
-
-from setenvironment.bash_parser import bash_make_environment, bash_rc_file, bash_save
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterator, TypeVar
+
+from setenvironment import journal, trace
+from setenvironment.bash_parser import (
+    bash_journal_write,
+    bash_make_environment,
+    bash_rc_file,
+    bash_read_variable,
+)
+from setenvironment.lock import rc_file_lock
 from setenvironment.types import BashEnvironment, Environment, OsEnvironment
-from setenvironment.util import remove_adjascent_duplicates
+from setenvironment.util import parse_env0, parse_paths, remove_adjascent_duplicates
+
+_F = TypeVar("_F", bound=Callable[..., None])
+
+
+@dataclass
+class _Transaction:
+    """Mutations staged by transaction(), written out on commit."""
+
+    bash_envs: dict[str | None, BashEnvironment]  # namespace -> staged block
+    os_env: OsEnvironment
+
+
+_STATE = threading.local()
+
+
+def _current_transaction() -> _Transaction | None:
+    return getattr(_STATE, "transaction", None)
+
+
+@contextmanager
+def transaction() -> Iterator[None]:
+    """Stages every mutation made in the block in memory, then commits them
+    with one write of the bash file and one update of os.environ. If the
+    block raises, nothing is written. Nested transactions join the outer one."""
+    if _current_transaction() is not None:
+        yield
+        return
+    # Hold the lock for the whole transaction so the staged reads stay valid.
+    with rc_file_lock(bash_rc_file()):
+        txn = _Transaction({}, OsEnvironment())
+        _STATE.transaction = txn
+        try:
+            yield
+        finally:
+            _STATE.transaction = None
+        for env in txn.bash_envs.values():
+            env.save()
+        txn.os_env.store()
+
+
+def _locked(func: _F) -> _F:
+    """Runs a read-modify-write of the bash file under rc_file_lock."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with rc_file_lock(bash_rc_file()):
+            return func(*args, **kwargs)
+
+    return wrapper  # type: ignore
+
+
+def _load_bash_env(namespace: str | None = None) -> BashEnvironment:
+    txn = _current_transaction()
+    if txn is None:
+        return bash_make_environment(namespace)
+    if namespace not in txn.bash_envs:
+        txn.bash_envs[namespace] = bash_make_environment(namespace)
+    return txn.bash_envs[namespace]
+
+
+def _save_bash_env(env: BashEnvironment) -> None:
+    if _current_transaction() is None:
+        env.save()
+
+
+def _load_os_env() -> OsEnvironment:
+    txn = _current_transaction()
+    if txn is not None:
+        return txn.os_env
+    return OsEnvironment()
+
+
+def _store_os_env(os_env: OsEnvironment) -> None:
+    if _current_transaction() is None:
+        os_env.store()
 
 
 def os_update_variable(name: str, value: str) -> None:
@@ -26,104 +111,246 @@ def os_remove_variable(name: str) -> None:
     os.environ.pop(name, None)
 
 
-def set_env_var(name: str, value: str, update_curr_environment=True) -> None:
+@_locked
+def set_env_var(
+    name: str, value: str, update_curr_environment=True, namespace: str | None = None
+) -> None:
     """Sets an environment variable."""
+    txn = _current_transaction()
     if update_curr_environment:
-        os_update_variable(name, value)
-    env: BashEnvironment = bash_make_environment()
+        if txn is not None:
+            txn.os_env.vars[name] = value
+        else:
+            os_update_variable(name, value)
+    if journal.JOURNAL_MODE and txn is None:
+        bash_journal_write(name, str(value), namespace)
+        return
+    env: BashEnvironment = _load_bash_env(namespace)
     env.vars[name] = str(value)
-    bash_save(env)
+    _save_bash_env(env)
+
+
+def get_env_var(name: str, namespace: str | None = None) -> str | None:
+    """Gets an environment variable from the bash file, or from the staged
+    changes when inside a transaction."""
+    txn = _current_transaction()
+    if txn is None:
+        return bash_read_variable(name, namespace)
+    env = _load_bash_env(namespace)
+    if name == "PATH":
+        return ":".join(env.paths) if env.paths else None
+    return env.vars.get(name)
+
+
+# Printed (NUL terminated) between whatever the sourced files write to stdout
+# and the NUL delimited dump of the environment.
+SHELL_CAPTURE_DELIM = b"-------- BEGIN setenvironment env -0 --------"
+# Printed (NUL terminated) in front of the files the shell sourced, when the
+# capture records them for the environment cache.
+SHELL_SOURCED_DELIM = b"-------- BEGIN setenvironment sourced files --------"
+
+# Shadows source and . with functions that note the absolute path of every
+# file they are given, found the way bash finds it: a bare name on the PATH,
+# then in the current directory.
+_RECORD_SOURCES = r"""__setenvironment_sourced=()
+__setenvironment_record() {
+  local f="$1" d dirs
+  if [[ "$f" != */* ]]; then
+    IFS=: read -ra dirs <<< "$PATH"
+    for d in "${dirs[@]}"; do
+      if [[ -f "${d:-.}/$f" ]]; then f="${d:-.}/$f"; break; fi
+    done
+  fi
+  [[ "$f" == /* ]] || f="$PWD/$f"
+  __setenvironment_sourced+=("$f")
+}
+source() { __setenvironment_record "$1"; builtin source "$@"; }
+.() { __setenvironment_record "$1"; builtin . "$@"; }
+"""
 
 
-def get_env_vars_from_shell(settings_file: str | None = None) -> Environment:
-    # Source the provided bashrc_file, ~/.bashrc, and ~/.profile, then execute the command.
-    delim = "-------- BEGIN setenviorment.os_env_json --------"
-    settings_file = settings_file or bash_rc_file()
-    python_exe = sys.executable
+def shell_capture_script(settings_file: str, record_sources: bool = False) -> str:
+    """The bash script that sources the settings and dumps the environment.
+    With record_sources it also dumps the files that were sourced, see
+    parse_sourced_files()."""
     cmd = [
         "source ~/.profile",
-        f'source "{settings_file}"',
-        f'echo "{delim}"',
-        f'"{python_exe}" -m setenvironment.os_env_json',
+        f"source {shlex.quote(settings_file)}",
     ]
-    cmd_str = "; ".join(cmd)
-
-    # Create a temporary shell script and write the command to it
-    with tempfile.NamedTemporaryFile(suffix=".sh", delete=False) as tmpfile:
-        tmp_filename = tmpfile.name
-        tmpfile.write(cmd_str.encode("utf-8"))
-
-    # Make the shell script executable
-    os.chmod(tmp_filename, os.stat(tmp_filename).st_mode | 0o111)
-    # Execute the temporary shell script
-    completed_process = subprocess.run(
-        ["/bin/bash", tmp_filename],
-        capture_output=True,
-        universal_newlines=True,
-        check=True,
-        env={},  # type: ignore # do not inherit parent environment},
-    )
+    if record_sources:
+        delim = shlex.quote(SHELL_SOURCED_DELIM.decode())
+        cmd.append(f"printf '%s\\0' {delim} \"${{__setenvironment_sourced[@]}}\"")
+    cmd += [
+        f"printf '%s\\0' {shlex.quote(SHELL_CAPTURE_DELIM.decode())}",
+        "env -0",
+    ]
+    script = "; ".join(cmd)
+    return _RECORD_SOURCES + script if record_sources else script
 
-    # Cleanup: remove the temporary file
-    os.remove(tmp_filename)
 
-    stdout = completed_process.stdout
-    parts = stdout.split(delim)
-    if len(parts) < 2:
+def parse_shell_capture(stdout: bytes) -> Environment:
+    """Parses the output of shell_capture_script into an Environment."""
+    marker = SHELL_CAPTURE_DELIM + b"\0"
+    start = stdout.find(marker)
+    if start == -1:
         raise RuntimeError("Could not parse environment from shell.")
-    json_str = parts[1].strip()
-    json_data = json.loads(json_str)
-    paths = json_data["PATH"]
+    vars = parse_env0(stdout, start + len(marker))
+    paths = parse_paths(vars.pop("PATH", ""))
     # remove adjascent duplicates
     paths = remove_adjascent_duplicates(paths)
-    out = Environment(
-        vars=json_data["ENVIRONMENT"],
-        paths=paths,
-    )
-    return out
-
-
-def unset_env_var(name: str) -> None:
+    return Environment(vars=vars, paths=paths)
+
+
+def parse_sourced_files(stdout: bytes) -> list[str]:
+    """Returns the files that a shell_capture_script(record_sources=True)
+    sourced, in order and without duplicates."""
+    marker = SHELL_SOURCED_DELIM + b"\0"
+    start = stdout.find(marker)
+    end = stdout.find(SHELL_CAPTURE_DELIM + b"\0", start)
+    if start == -1 or end == -1:
+        raise RuntimeError("Could not parse sourced files from shell.")
+    names = stdout[start + len(marker) : end].split(b"\0")
+    return list(dict.fromkeys(name.decode("utf-8", "surrogateescape") for name in names if name))
+
+
+def _run_shell_capture(script: str, settings_file: str, home: str | None = None) -> bytes:
+    with trace.span("spawn bash", path=settings_file) as span:
+        completed_process = subprocess.run(
+            ["/bin/bash", "-c", script],
+            capture_output=True,
+            check=True,
+            # do not inherit parent environment
+            env={} if home is None else {"HOME": home},  # type: ignore
+        )
+        span.add_bytes(len(completed_process.stdout))
+    return completed_process.stdout
+
+
+def _parse_capture(stdout: bytes) -> Environment:
+    with trace.span("parse env -0") as span:
+        span.add_bytes(len(stdout))
+        return parse_shell_capture(stdout)
+
+
+def get_env_vars_from_shell(
+    settings_file: str | None = None, home: str | None = None
+) -> Environment:
+    # Source the provided bashrc_file, ~/.bashrc, and ~/.profile, then dump the
+    # environment from the shell itself with env -0. With home, ~ is that
+    # directory instead of the home of the current user.
+    settings_file = settings_file or bash_rc_file()
+    from setenvironment import coprocess
+
+    if coprocess.WARM_SHELL and home is None:
+        with trace.span("shell snapshot", path=settings_file):
+            return coprocess.shared_coprocess(settings_file).snapshot()
+    stdout = _run_shell_capture(shell_capture_script(settings_file), settings_file, home)
+    return _parse_capture(stdout)
+
+
+def _cached_env_vars_from_shell(settings_file: str) -> Environment:
+    """get_env_vars_from_shell, served from the on disk cache when none of the
+    files the shell sourced changed since the last evaluation."""
+    from setenvironment import coprocess, env_cache
+
+    # The warm shell watches its files itself and is fast enough without.
+    if not env_cache.ENV_CACHE or coprocess.WARM_SHELL:
+        return get_env_vars_from_shell(settings_file)
+    script = shell_capture_script(settings_file, record_sources=True)
+    shell_env = env_cache.cache_load(settings_file, script)
+    if shell_env is None:
+        # Taken before bash runs, so a file that changes meanwhile only
+        # leaves an entry behind that the next load does not match.
+        digests = {
+            path: env_cache.file_digest(path) for path in env_cache.watched_files(settings_file)
+        }
+        stdout = _run_shell_capture(script, settings_file)
+        shell_env = _parse_capture(stdout)
+        env_cache.cache_store(
+            settings_file, script, shell_env, parse_sourced_files(stdout), digests
+        )
+    return shell_env
+
+
+@_locked
+def unset_env_var(name: str, namespace: str | None = None) -> None:
     """Unsets an environment variable."""
     assert "$" not in name, "name should not contain $"
     assert name.lower() != "path", "Use remove_env_path to remove from PATH"
-    env: BashEnvironment = bash_make_environment()
-    os_env: OsEnvironment = OsEnvironment()
+    if journal.JOURNAL_MODE and _current_transaction() is None:
+        os_remove_variable(name)
+        if bash_read_variable(name, namespace) is not None:
+            bash_journal_write(name, None, namespace)
+        return
+    env: BashEnvironment = _load_bash_env(namespace)
+    os_env: OsEnvironment = _load_os_env()
     env.vars.pop(name, None)
     os_env.vars.pop(name, None)
-    os_env.store()
-    env.save()
+    _store_os_env(os_env)
+    _save_bash_env(env)
 
 
-def add_env_path(path: str, verbose: bool = False) -> None:
+@_locked
+def add_env_path(path: str, verbose: bool = False, namespace: str | None = None) -> None:
     """Adds a path to the PATH environment variable."""
-    env: BashEnvironment = bash_make_environment()
-    os_env: OsEnvironment = OsEnvironment()
+    env: BashEnvironment = _load_bash_env(namespace)
+    os_env: OsEnvironment = _load_os_env()
     env.paths.append(path)
     os_env.paths.insert(0, path)
-    os_env.store()
-    bash_save(env)
+    _store_os_env(os_env)
+    _save_bash_env(env)
 
 
-def remove_env_path(path: str) -> None:
+@_locked
+def remove_env_path(path: str, namespace: str | None = None) -> None:
     """Removes a path from the PATH environment variable."""
     # remove path from os.environ['PATH'] if it does not exist
-    env: BashEnvironment = bash_make_environment()
-    os_env: OsEnvironment = OsEnvironment()
+    env: BashEnvironment = _load_bash_env(namespace)
+    os_env: OsEnvironment = _load_os_env()
     if path in os_env.paths:
         os_env.paths.remove(path)
-        os_env.store()
+        _store_os_env(os_env)
     if path in env.paths:
         env.paths.remove(path)
-        bash_save(env)
+        _save_bash_env(env)
+
 
+def _fast_reload() -> bool:
+    """Applies the managed blocks to os.environ without bash. Returns False if
+    a block is outside of what static_eval understands."""
+    from setenvironment.static_eval import static_eval
 
-def reload_environment(verbose: bool, resolve: bool) -> None:
-    """Reloads the environment."""
-    env: Environment = get_env()
+    changes = static_eval(bash_rc_file())
+    if changes is None:
+        return False
+    os_env: OsEnvironment = _load_os_env()
+    for key, val in changes.items():
+        if key == "PATH":
+            # The blocks prepend to the current PATH, so drop the entries a
+            # previous reload already put in front.
+            paths = [path.strip() for path in parse_paths(val or "") if path.strip()]
+            os_env.paths = list(dict.fromkeys(paths))
+        elif val is None:
+            os_env.vars.pop(key, None)
+        else:
+            os_env.vars[key] = val
+    _store_os_env(os_env)
+    return True
+
+
+def reload_environment(verbose: bool, resolve: bool, fast: bool = False) -> None:
+    """Reloads the environment. With fast, simple managed blocks are evaluated
+    in process and bash only runs for the ones that need it."""
+    if fast and _fast_reload():
+        return
+    apply_environment(get_env(), resolve)
+
+
+def apply_environment(env: Environment, resolve: bool) -> None:
+    """Loads an environment from get_env() into os.environ."""
     path_list = env.paths
     env_vars = env.vars
-    os_env: OsEnvironment = OsEnvironment()
+    os_env: OsEnvironment = _load_os_env()
     for key, val in env_vars.items():
         if key == "PATH":
             continue
@@ -133,12 +360,12 @@ def reload_environment(verbose: bool, resolve: bool) -> None:
     path_list = remove_adjascent_duplicates(path_list)
     path_list = [path.strip() for path in path_list if path.strip()]
     os_env.paths = path_list
-    os_env.store()
+    _store_os_env(os_env)
 
 
 def combine_environments(parent: Environment, child: Environment) -> Environment:
     """Combines two environments."""
-    vars = parent.vars.copy()
+    vars = dict(parent.vars)
     vars.update(child.vars)
     paths = parent.paths.copy()
     paths.extend(child.paths)
@@ -153,36 +380,46 @@ def combine_environments(parent: Environment, child: Environment) -> Environment
 def get_env() -> Environment:
     """Returns the environment."""
     settings_file = bash_rc_file()
-    shell_env: Environment = get_env_vars_from_shell(settings_file)
+    shell_env: Environment = _cached_env_vars_from_shell(settings_file)
+    return combine_os_environment(shell_env)
+
+
+def combine_os_environment(shell_env: Environment) -> Environment:
+    """Layers the current os.environ on top of the environment of the shell."""
     bash_env: Environment = OsEnvironment()
     return combine_environments(parent=shell_env, child=bash_env)
 
 
-def remove_from_path_group(group_name: str, path_to_remove: str) -> None:
+@_locked
+def remove_from_path_group(
+    group_name: str, path_to_remove: str, namespace: str | None = None
+) -> None:
     assert group_name != "PATH"
-    env: BashEnvironment = bash_make_environment()
-    os_env: OsEnvironment = OsEnvironment()
+    env: BashEnvironment = _load_bash_env(namespace)
+    os_env: OsEnvironment = _load_os_env()
     env.remove_from_path_group(group_name, path_to_remove)
     os_env.remove_from_path_group(group_name, path_to_remove)
-    os_env.store()
-    env.save()
+    _store_os_env(os_env)
+    _save_bash_env(env)
 
 
-def remove_path_group(group_name: str) -> None:
+@_locked
+def remove_path_group(group_name: str, namespace: str | None = None) -> None:
     assert group_name != "PATH"
-    env: BashEnvironment = bash_make_environment()
-    os_env: OsEnvironment = OsEnvironment()
+    env: BashEnvironment = _load_bash_env(namespace)
+    os_env: OsEnvironment = _load_os_env()
     env.remove_path_group(group_name)
     os_env.remove_path_group(group_name)
-    os_env.store()
-    env.save()
+    _store_os_env(os_env)
+    _save_bash_env(env)
 
 
-def add_path_group(group_name: str, new_path: str) -> None:
+@_locked
+def add_path_group(group_name: str, new_path: str, namespace: str | None = None) -> None:
     assert group_name != "PATH"
-    env: BashEnvironment = bash_make_environment()
-    os_env: OsEnvironment = OsEnvironment()
+    env: BashEnvironment = _load_bash_env(namespace)
+    os_env: OsEnvironment = _load_os_env()
     env.add_to_path_group(group_name, new_path)
     os_env.add_to_path_group(group_name, new_path)
-    os_env.store()
-    env.save()
+    _store_os_env(os_env)
+    _save_bash_env(env)
@@ -48,9 +48,8 @@ def add_env_path(
     index_to_add=0,
 ) -> None:
     env: RegistryEnvironment = query_registry_environment()
-    user_paths = env.user.paths
-    while new_path in user_paths:
-        user_paths.remove(new_path)
+    user_paths = env.user.path_list()
+    user_paths.discard(new_path)
     user_paths.insert(index_to_add, new_path)
     new_path_str = path_list_to_str(user_paths)
     win32_registry_set_env_path_user(
@@ -93,10 +92,8 @@ def remove_env_path(path_to_remove: str, verbose=False, update_curr_environment=
     # convert / to \\ for Windows
     env: RegistryEnvironment = query_registry_environment()
     os_env: OsEnvironment = os_env_make_environment()
-    while path_to_remove in env.user.paths:
-        env.user.paths.remove(path_to_remove)
-    while path_to_remove in os_env.paths:
-        os_env.paths.remove(path_to_remove)
+    env.user.path_list().discard(path_to_remove)
+    os_env.path_list().discard(path_to_remove)
     env.save()
     os_env.store()
 
@@ -238,7 +235,7 @@ def query_registry_environment() -> RegistryEnvironment:
 
 def win32_registry_save(user_environment: Environment) -> None:
     """Saves the user environment. Note that system environment can't be saved."""
-    user_env = user_environment.vars.copy()
+    user_env = dict(user_environment.vars)
     user_path = user_environment.paths
     user_path_str = os.pathsep.join(user_path)
     user_env["PATH"] = user_path_str
@@ -0,0 +1,125 @@
+"""
+Evaluates the managed blocks of the bash file in process, without bash.
+
+Only a safe subset is understood: `export NAME=value` where the value is a
+literal, single quoted, or uses `$VAR`/`${VAR}` references (so PATH
+prepends like `export PATH=a:b:$PATH` work), `unset NAME`, comments, and the
+line that sources the journal of the block. Anything else, e.g. command
+substitution, globs or other commands, makes static_eval return None so that
+the caller falls back to bash.
+"""
+
+import os
+import re
+from typing import Mapping
+
+from setenvironment.bash_ast import tokenize_line
+from setenvironment.bash_parser import bash_namespaces, bash_rc_file, read_bash_file_lines
+from setenvironment.journal import journal_path, journal_source_line
+
+_NAME = r"[A-Za-z_][A-Za-z0-9_]*"
+_REF_RE = re.compile(rf"\$(?:\{{({_NAME})\}}|({_NAME}))")
+_UNSET_RE = re.compile(rf"^\s*unset\s+({_NAME})\s*$")
+# Characters that are taken literally outside of quotes.
+_UNQUOTED_SAFE_RE = re.compile(r"^[A-Za-z0-9_./:@%+,=-]*$")
+# Inside double quotes only these have a meaning we don't model.
+_DOUBLE_QUOTED_UNSAFE = ('"', "\\", "`", "!")
+
+
+class UnsupportedSyntax(ValueError):
+    """The line is outside of the subset that static_eval understands."""
+
+
+def _expand_refs(value: str, env: Mapping[str, str]) -> str:
+    """Expands $VAR and ${VAR}, any other $ is unsupported."""
+    out: list[str] = []
+    pos = 0
+    for match in _REF_RE.finditer(value):
+        out.append(value[pos : match.start()])
+        out.append(env.get(match.group(1) or match.group(2), ""))
+        pos = match.end()
+    out.append(value[pos:])
+    if "$" in _REF_RE.sub("", value):
+        raise UnsupportedSyntax(value)
+    return "".join(out)
+
+
+def _expand_tilde(value: str, env: Mapping[str, str]) -> str:
+    """Tilde expansion of an assignment, at the start and after each colon."""
+    parts = value.split(":")
+    for i, part in enumerate(parts):
+        if part == "~" or part.startswith("~/"):
+            parts[i] = env.get("HOME", os.path.expanduser("~")) + part[1:]
+        elif part.startswith("~"):
+            raise UnsupportedSyntax(value)  # ~user
+    return ":".join(parts)
+
+
+def evaluate_value(value: str, env: Mapping[str, str]) -> str:
+    """Evaluates the right hand side of an export."""
+    if len(value) >= 2 and value[0] == value[-1] == "'":
+        inner = value[1:-1]
+        if "'" in inner:
+            raise UnsupportedSyntax(value)
+        return inner
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        inner = value[1:-1]
+        if any(c in inner for c in _DOUBLE_QUOTED_UNSAFE):
+            raise UnsupportedSyntax(value)
+        return _expand_refs(inner, env)
+    if not _UNQUOTED_SAFE_RE.match(_REF_RE.sub("", value.replace("~", ""))):
+        raise UnsupportedSyntax(value)
+    return _expand_refs(_expand_tilde(value, env), env)
+
+
+def evaluate_line(
+    line: str, env: dict[str, str], changes: dict[str, str | None], hooks: dict[str, str]
+) -> None:
+    """Applies one line of a block (or journal) to env and records the change
+    in changes, None for an unset. hooks maps the lines that source a journal
+    to the journal file, which is then evaluated in place."""
+    node = tokenize_line(line)
+    if node.kind in ("blank", "comment"):
+        return
+    if node.kind == "export":
+        assert node.name is not None and node.value is not None
+        env[node.name] = changes[node.name] = evaluate_value(node.value, env)
+        return
+    match = _UNSET_RE.match(line)
+    if match is not None:
+        env.pop(match.group(1), None)
+        changes[match.group(1)] = None
+        return
+    journal_file = hooks.get(line.strip())
+    if journal_file is None:
+        raise UnsupportedSyntax(line)
+    try:
+        with open(journal_file, encoding="utf-8", mode="r") as file:
+            records = file.read().splitlines()
+    except FileNotFoundError:
+        return
+    for record in records:
+        evaluate_line(record, env, changes, {})
+
+
+def static_eval(
+    shell_file: str | None = None, environ: Mapping[str, str] | None = None
+) -> dict[str, str | None] | None:
+    """Evaluates every managed block of the bash file, in file order, on top of
+    environ (os.environ by default). Returns the variables the blocks set,
+    None for the ones they unset, or None if a block needs bash.
+
+    Only the managed blocks are evaluated, the rest of the bash file and
+    ~/.profile are not."""
+    shell_file = shell_file or bash_rc_file()
+    env = dict(os.environ if environ is None else environ)
+    changes: dict[str, str | None] = {}
+    try:
+        for namespace in bash_namespaces(shell_file):
+            journal_file = journal_path(shell_file, namespace)
+            hooks = {journal_source_line(journal_file): journal_file}
+            for line in read_bash_file_lines(shell_file, namespace):
+                evaluate_line(line, env, changes, hooks)
+    except (UnsupportedSyntax, UnicodeDecodeError):
+        return None
+    return changes
@@ -1,6 +1,7 @@
 # flake8: noqa: E501
 
 import os
+import tempfile
 import unittest
 
 from setenvironment.bash_parser import bash_rc_set_file
@@ -20,6 +21,15 @@ class BaseTest(unittest.TestCase):
     def setUp(self) -> None:
         bash_rc_set_file(BASHRC)
         self.clear_bash_rc()
+        # Keep the environment cache out of the user's ~/.cache.
+        self.cache_home = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.old_cache_home = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = self.cache_home.name
 
     def tearDown(self) -> None:
         bash_rc_set_file(None)
+        if self.old_cache_home is None:
+            os.environ.pop("XDG_CACHE_HOME", None)
+        else:
+            os.environ["XDG_CACHE_HOME"] = self.old_cache_home
+        self.cache_home.cleanup()
@@ -0,0 +1,97 @@
+"""
+Synthetic rc files and PATHs for the benchmarks and the scaling tests.
+
+The generated files look like the ones setenvironment manages in the wild:
+user content (aliases, functions, comments) around a managed block that
+exports the variables, the path groups and one long PATH line.
+
+    rc_file = write_corpus(home, exports=5000, paths=10000, size=10 * 1024 * 1024)
+"""
+
+import os
+
+from setenvironment.bash_parser import END_MARKER, START_MARKER
+
+# User content that is repeated in front of the managed block until the file
+# reaches the requested size.
+_FILLER = [
+    "# ~/.bashrc: executed by bash(1) for non-login shells.",
+    "alias ll='ls -alF'",
+    "alias la='ls -A'",
+    "HISTCONTROL=ignoreboth",
+    "shopt -s histappend",
+    "if [ -f ~/.bash_aliases ]; then",
+    "    . ~/.bash_aliases",
+    "fi",
+    'cdl() { cd "$1" && ls; }',
+    "",
+]
+
+
+def make_paths(count: int, duplicates: float = 0.0, prefix: str = "/opt/corpus") -> list[str]:
+    """Returns count PATH entries. A fraction `duplicates` of them repeat an
+    earlier entry, like stacked toolchain modules do."""
+    unique = max(1, count - int(count * duplicates))
+    return [f"{prefix}/{i % unique}/bin" for i in range(count)]
+
+
+def make_exports(count: int) -> dict[str, str]:
+    """Returns count variables with values of mixed length."""
+    return {f"CORPUS_VAR_{i}": f"value_{i}_" + "x" * (i % 64) for i in range(count)}
+
+
+def make_groups(paths: list[str], groups: int, group_size: int) -> dict[str, list[str]]:
+    """Returns path groups of group_size entries each, taken from paths."""
+    out: dict[str, list[str]] = {}
+    unique = list(dict.fromkeys(paths))
+    for i in range(groups):
+        start = (i * group_size) % max(1, len(unique))
+        out[f"CORPUS_GROUP_{i}"] = unique[start : start + group_size]
+    return out
+
+
+def make_block(
+    exports: dict[str, str], paths: list[str], groups: dict[str, list[str]] | None = None
+) -> list[str]:
+    """Returns the lines of a managed block, markers included."""
+    lines = [START_MARKER]
+    lines += [f"export {name}={value}" for name, value in exports.items()]
+    lines += [f"export {name}={':'.join(entries)}" for name, entries in (groups or {}).items()]
+    if paths:
+        lines.append(f"export PATH={':'.join(paths)}:$PATH")
+    lines.append(END_MARKER)
+    return lines
+
+
+def make_rc_text(
+    exports: int = 10,
+    paths: int = 10,
+    size: int = 0,
+    groups: int = 0,
+    group_size: int = 10,
+    duplicates: float = 0.0,
+) -> str:
+    """Returns an rc file with a managed block of `exports` variables, `groups`
+    path groups and a PATH of `paths` entries, padded with user content in
+    front of the block to at least size bytes."""
+    path_list = make_paths(paths, duplicates=duplicates)
+    block = make_block(make_exports(exports), path_list, make_groups(path_list, groups, group_size))
+    text = "\n".join(block) + "\n"
+    missing = size - len(text.encode("utf-8"))
+    if missing <= 0:
+        return text
+    filler = "\n".join(_FILLER) + "\n"
+    repeats = -(-missing // len(filler))  # ceil
+    return filler * repeats + text
+
+
+def write_corpus(home: str, **kwargs) -> str:
+    """Writes make_rc_text(**kwargs) as the .bashrc of home, next to an empty
+    .profile, and returns the path of the .bashrc."""
+    os.makedirs(home, exist_ok=True)
+    with open(os.path.join(home, ".profile"), encoding="utf-8", mode="w") as file:
+        file.write("")
+    rc_file = os.path.join(home, ".bashrc")
+    with open(rc_file, encoding="utf-8", mode="w", newline="\n") as file:
+        file.write(make_rc_text(**kwargs))
+    return rc_file
@@ -0,0 +1,149 @@
+"""
+Spans around the reads, parses, writes and subprocesses of setenvironment,
+for finding where a slow call spends its time.
+
+    from setenvironment import trace
+
+    trace.add_listener(lambda span: print(span.name, span.duration, span.bytes))
+
+A finished span carries its name, its duration in seconds, the bytes it
+read, wrote or captured, its attributes (e.g. the path) and its parent span,
+and is handed to every listener. With no listener span() returns one shared
+no-op context manager, so the instrumented code only pays a global lookup
+and a call.
+"""
+
+import contextvars
+import threading
+import time
+import warnings
+from dataclasses import dataclass, field
+from typing import Any, Callable, Literal
+
+TRACING = False  # True while there is a listener
+_LISTENERS: list[Callable[["Span"], None]] = []
+_LISTENERS_LOCK = threading.Lock()
+_CURRENT: contextvars.ContextVar["Span | None"] = contextvars.ContextVar(
+    "setenvironment_span", default=None
+)
+
+
+@dataclass
+class Span:
+    """One timed operation."""
+
+    name: str
+    attrs: dict[str, Any] = field(default_factory=dict)
+    parent: "Span | None" = None
+    start: float = 0.0  # time.perf_counter() when it started
+    duration: float = 0.0  # seconds
+    bytes: int = 0
+    error: str | None = None  # type of the exception that ended it
+    _token: Any = field(default=None, repr=False)
+
+    @property
+    def depth(self) -> int:
+        depth, parent = 0, self.parent
+        while parent is not None:
+            depth, parent = depth + 1, parent.parent
+        return depth
+
+    def add_bytes(self, count: int) -> None:
+        self.bytes += count
+
+    def __enter__(self) -> "Span":
+        self.parent = _CURRENT.get()
+        self._token = _CURRENT.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> Literal[False]:
+        self.duration = time.perf_counter() - self.start
+        _CURRENT.reset(self._token)
+        self._token = None
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        for listener in list(_LISTENERS):
+            try:
+                listener(self)
+            except Exception as err:  # pylint: disable=broad-except
+                warnings.warn(f"Trace listener {listener!r} failed: {err}")
+        return False
+
+
+class _NullSpan:
+    """What span() returns while nobody listens."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> Literal[False]:
+        return False
+
+    def add_bytes(self, count: int) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, **attrs: Any) -> Any:
+    """Returns a context manager that times the block as a span named name."""
+    if not TRACING:
+        return _NULL_SPAN
+    return Span(name, attrs)
+
+
+def add_listener(listener: Callable[[Span], None]) -> None:
+    """Calls listener with every span that finishes, on the thread that ran it."""
+    global TRACING
+    with _LISTENERS_LOCK:
+        _LISTENERS.append(listener)
+        TRACING = True
+
+
+def remove_listener(listener: Callable[[Span], None]) -> None:
+    global TRACING
+    with _LISTENERS_LOCK:
+        if listener in _LISTENERS:
+            _LISTENERS.remove(listener)
+        TRACING = bool(_LISTENERS)
+
+
+class SpanCollector:
+    """A listener that keeps the finished spans, see format_tree()."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.spans: list[Span] = []
+
+    def __call__(self, finished: Span) -> None:
+        with self._lock:
+            self.spans.append(finished)
+
+
+def format_tree(spans: list[Span]) -> str:
+    """Formats spans as a tree of timings, children under their parent in the
+    order they started. Spans whose parent is not in the list are roots."""
+    ids = {id(s) for s in spans}
+    children: dict[int | None, list[Span]] = {}
+    for s in spans:
+        parent = id(s.parent) if s.parent is not None and id(s.parent) in ids else None
+        children.setdefault(parent, []).append(s)
+    out: list[str] = []
+
+    def visit(parent: int | None, indent: int) -> None:
+        for s in sorted(children.get(parent, []), key=lambda s: s.start):
+            details = [f"{key}={value}" for key, value in s.attrs.items()]
+            if s.bytes:
+                details.insert(0, f"{s.bytes} bytes")
+            if s.error:
+                details.append(f"error={s.error}")
+            suffix = f"  ({', '.join(details)})" if details else ""
+            out.append(f"{s.duration * 1000:9.2f} ms  {'  ' * indent}{s.name}{suffix}")
+            visit(id(s), indent + 1)
+
+    visit(None, 0)
+    return "\n".join(out)
@@ -1,14 +1,135 @@
 import json
 import os
+import sys
+from collections import Counter
+from collections.abc import MutableMapping
 from dataclasses import dataclass
+from typing import Iterable, Iterator, SupportsIndex, cast
 
-CLEAR_ENVIRONMENT = True
+from setenvironment import trace
+
+
+class PathList(list[str]):
+    """A PATH list that keeps a count of each entry, so membership is O(1) and
+    removing an entry is a single pass, however long the PATH gets. It is
+    still a list: order and duplicate entries are kept."""
+
+    def __init__(self, paths: Iterable[str] = ()) -> None:
+        super().__init__(paths)
+        self._counts: Counter[str] = Counter(self)
+
+    def _add(self, path: str) -> None:
+        self._counts[path] = self._counts.get(path, 0) + 1
+
+    def _drop(self, path: str) -> None:
+        count = self._counts[path] - 1
+        if count:
+            self._counts[path] = count
+        else:
+            del self._counts[path]
+
+    def _recount(self) -> None:
+        self._counts = Counter(self)
+
+    def __contains__(self, path: object) -> bool:
+        return path in self._counts
+
+    def count(self, path: str) -> int:  # type: ignore[override]
+        return self._counts.get(path, 0)
+
+    def append(self, path: str) -> None:
+        super().append(path)
+        self._add(path)
+
+    def insert(self, index: SupportsIndex, path: str) -> None:
+        super().insert(index, path)
+        self._add(path)
+
+    def extend(self, paths: Iterable[str]) -> None:
+        paths = list(paths)
+        super().extend(paths)
+        for path in paths:
+            self._add(path)
+
+    def __iadd__(self, paths: Iterable[str]) -> "PathList":  # type: ignore[override, misc]
+        self.extend(paths)
+        return self
+
+    def remove(self, path: str) -> None:
+        super().remove(path)
+        self._drop(path)
+
+    def pop(self, index: SupportsIndex = -1) -> str:
+        path = super().pop(index)
+        self._drop(path)
+        return path
+
+    def clear(self) -> None:
+        super().clear()
+        self._counts.clear()
+
+    def __setitem__(self, index, value) -> None:  # type: ignore[override]
+        super().__setitem__(index, value)
+        self._recount()
+
+    def __delitem__(self, index) -> None:  # type: ignore[override]
+        super().__delitem__(index)
+        self._recount()
+
+    def __imul__(self, n: SupportsIndex) -> "PathList":  # type: ignore[override]
+        super().__imul__(n)
+        self._recount()
+        return self
+
+    def __reduce__(self):
+        return (PathList, (list(self),))
+
+    def discard(self, path: str) -> int:
+        """Removes every occurrence of the path, returns how many there were."""
+        count = self._counts.pop(path, 0)
+        for _ in range(count):
+            super().remove(path)
+        return count
+
+    def discard_all(self, paths: Iterable[str]) -> int:
+        """Removes every occurrence of each of the paths in one pass, returns
+        how many entries were removed."""
+        drop = {path for path in paths if path in self._counts}
+        if len(drop) <= 1:
+            return sum(self.discard(path) for path in drop)
+        kept = [path for path in self if path not in drop]
+        removed = len(self) - len(kept)
+        super().__setitem__(slice(None), kept)
+        for path in drop:
+            del self._counts[path]
+        return removed
+
+    def prepend(self, paths: Iterable[str]) -> None:
+        """Inserts the paths, in order, at the front."""
+        paths = list(paths)
+        super().__setitem__(slice(0, 0), paths)
+        for path in paths:
+            self._add(path)
+
+    def move_to_front(self, path: str) -> None:
+        """Puts the path first, removing any other occurrence of it."""
+        self.discard(path)
+        self.insert(0, path)
 
 
 @dataclass
 class Environment:
-    vars: dict[str, str]
-    paths: list[str]
+    vars: MutableMapping[str, str]
+    paths: list[str]  # a PathList once set, see path_list()
+
+    def __setattr__(self, name: str, value) -> None:
+        if name == "paths" and not isinstance(value, PathList):
+            value = PathList(value)
+        super().__setattr__(name, value)
+
+    def path_list(self) -> PathList:
+        """The paths as the PathList that __setattr__ turned them into."""
+        return cast(PathList, self.paths)
 
     def get_var_as_pathlist(self, key: str) -> list[str]:
         """Gets a path list from an environment variable."""
@@ -26,23 +147,17 @@ class Environment:
     def add_to_path_group(self, group_name: str, new_path: str) -> None:
         """Adds a path using the group feature."""
         assert group_name != "PATH"
-        group_path_list = self.get_var_as_pathlist(group_name)
-        while new_path in group_path_list:
-            group_path_list.remove(new_path)
-        while new_path in self.paths:
-            self.paths.remove(new_path)
-        group_path_list.insert(0, new_path)
-        self.paths.insert(0, new_path)
+        group_path_list = PathList(self.get_var_as_pathlist(group_name))
+        group_path_list.move_to_front(new_path)
+        self.path_list().move_to_front(new_path)
         self.set_var_pathlist(group_name, group_path_list)
 
     def remove_from_path_group(self, group_name: str, path_to_remove: str) -> None:
         """Removes a path from a group."""
         assert group_name != "PATH"
-        group_path_list = self.get_var_as_pathlist(group_name)
-        while path_to_remove in group_path_list:
-            group_path_list.remove(path_to_remove)
-        while path_to_remove in self.paths:
-            self.paths.remove(path_to_remove)
+        group_path_list = PathList(self.get_var_as_pathlist(group_name))
+        group_path_list.discard(path_to_remove)
+        self.path_list().discard(path_to_remove)
         if group_path_list:
             self.set_var_pathlist(group_name, group_path_list)
         else:
@@ -50,10 +165,7 @@ class Environment:
 
     def remove_path_group(self, group_name: str) -> None:
         assert group_name != "PATH"
-        group_path_list = self.get_var_as_pathlist(group_name)
-        for path in group_path_list:
-            while path in self.paths:
-                self.paths.remove(path)
+        self.path_list().discard_all(self.get_var_as_pathlist(group_name))
         if group_name in self.vars:
             del self.vars[group_name]
 
@@ -62,59 +174,123 @@ class Environment:
         raise NotImplementedError("Don't use [] operator on this object.")
 
     def __str__(self) -> str:
-        msg = ""
-        msg += "Environment:\n"
-        msg += "  Vars:\n"
-        for key, value in sorted(self.vars.items()):
-            msg += f"    {key} = {value}\n"
-        msg += "  Paths:\n"
-        for path in self.paths:
-            msg += f"    {path}\n"
-        return msg
+        lines = ["Environment:", "  Vars:"]
+        lines += [f"    {key} = {value}" for key, value in sorted(self.vars.items())]
+        lines.append("  Paths:")
+        lines += [f"    {path}" for path in self.paths]
+        return "\n".join(lines) + "\n"
 
     def to_json(self) -> str:
         """Returns a JSON representation of the object."""
-        return json.dumps({"vars": self.vars, "paths": self.paths}, indent=4)
+        return json.dumps({"vars": dict(self.vars), "paths": self.paths}, indent=4)
 
 
 @dataclass
 class BashEnvironment(Environment):
-    def save(self) -> None:
-        """Saves the environment."""
+    namespace: str | None = None  # which managed block of the bash file
+
+    def save(self) -> bool:
+        """Saves the environment, returns False if the file was left untouched."""
         from setenvironment.bash_parser import bash_save
 
-        bash_save(self)
+        return bash_save(self, self.namespace)
 
     def load(self) -> None:
         """Loads the environment."""
         from setenvironment.bash_parser import bash_make_environment
 
-        env = bash_make_environment()
+        env = bash_make_environment(self.namespace)
         self.vars = env.vars
         self.paths = env.paths
 
 
+class EnvOverlay(MutableMapping):
+    """A view of os.environ, without PATH, that records the keys set or
+    deleted through it instead of writing them through."""
+
+    def __init__(self) -> None:
+        self._changes: dict[str, str | None] = {}  # None: deleted
+
+    @staticmethod
+    def _key(key: str) -> str:
+        # Like os.environ, windows keys are case insensitive.
+        return key.upper() if sys.platform == "win32" else key
+
+    def __getitem__(self, key: str) -> str:
+        key = self._key(key)
+        if key in self._changes:
+            value = self._changes[key]
+            if value is None:
+                raise KeyError(key)
+            return value
+        if key == "PATH":
+            raise KeyError(key)
+        return os.environ[key]
+
+    def __setitem__(self, key: str, value: str) -> None:
+        self._changes[self._key(key)] = value
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self:
+            raise KeyError(key)
+        self._changes[self._key(key)] = None
+
+    def __iter__(self) -> Iterator[str]:
+        for key in list(os.environ):
+            if key != "PATH" and key not in self._changes:
+                yield key
+        for key, value in list(self._changes.items()):
+            if value is not None:
+                yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def copy(self) -> dict[str, str]:
+        return dict(self)
+
+    def changes(self) -> dict[str, str | None]:
+        """The keys set or deleted since the last store, None for a delete."""
+        return dict(self._changes)
+
+    def clear_changes(self) -> None:
+        self._changes.clear()
+
+
 @dataclass
 class OsEnvironment(Environment):
-    """Represents the OS environment."""
+    """Represents the OS environment, as an overlay that only holds the
+    changes made to it."""
+
+    vars: EnvOverlay
 
     def __init__(self):
         """Constructor that initializes from the OS environment."""
-        self.paths = os.environ["PATH"].split(os.pathsep)
-        self.vars = dict(os.environ)
-        self.vars.pop("PATH", None)
+        self.vars = EnvOverlay()
+        self.paths = os.environ.get("PATH", "").split(os.pathsep)
         self.paths = [path.strip() for path in self.paths if path.strip() != ""]
 
     def store(self) -> None:
-        """Stores the environment obj to the OS environment."""
-        path_str = os.pathsep.join(self.paths)
-        payload = {}
-        payload.update(self.vars)
-        payload["PATH"] = path_str
-        # Now write it out.
-        if CLEAR_ENVIRONMENT:
-            os.environ.clear()
-        os.environ.update(payload)
+        """Writes the changed keys, and PATH if it changed, to the OS environment."""
+        with trace.span("store os.environ") as span:
+            overlay = self.vars
+            if isinstance(overlay, EnvOverlay):
+                changes = overlay.changes()
+                overlay.clear_changes()
+            else:  # vars was replaced by a plain dict, write all of it
+                changes = dict(overlay)
+            for key, value in changes.items():
+                if key == "PATH":
+                    continue
+                if value is None:
+                    os.environ.pop(key, None)
+                elif os.environ.get(key) != value:
+                    os.environ[key] = value
+                    span.add_bytes(len(value))
+            path_str = os.pathsep.join(self.paths)
+            if os.environ.get("PATH") != path_str:
+                os.environ["PATH"] = path_str
+                span.add_bytes(len(path_str))
 
 
 @dataclass
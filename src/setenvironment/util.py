@@ -3,6 +3,109 @@ Utility functions for setenvironment.
 """
 
 import os
+import re
+import stat
+import sys
+import threading
+
+# How hard atomic_write_bytes works to get the data onto the disk:
+#   "none":     rely on os.replace alone, readers never see a torn file but a
+#               power loss can leave an empty one.
+#   "file":     fsync the temp file before it replaces the target.
+#   "file+dir": also fsync the directory so the rename itself is durable.
+FSYNC_POLICIES = ("none", "file", "file+dir")
+FSYNC_POLICY = os.environ.get("SETENVIRONMENT_FSYNC", "file")
+
+
+def set_fsync_policy(policy: str) -> None:
+    """Sets the fsync policy used by atomic_write_bytes."""
+    global FSYNC_POLICY
+    if policy not in FSYNC_POLICIES:
+        raise ValueError(f"Unknown fsync policy {policy!r}, expected one of {FSYNC_POLICIES}")
+    FSYNC_POLICY = policy
+
+
+def _default_file_mode() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+# Read once at import: os.umask() can only be read by setting it, which would
+# race with files created by other threads.
+_DEFAULT_FILE_MODE = _default_file_mode()
+
+
+def login_home() -> str:
+    """The home directory of the user in the passwd database. bash uses it
+    for ~ when HOME is not set, as in the shells that get_env() starts with
+    an empty environment."""
+    try:
+        import pwd  # pylint: disable=import-outside-toplevel
+
+        return pwd.getpwuid(os.getuid()).pw_dir
+    except (ImportError, KeyError):
+        return os.path.expanduser("~")
+
+
+def _fsync_dir(directory: str) -> None:
+    if sys.platform == "win32":
+        return  # Directories can't be opened for fsync on windows.
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write_bytes(
+    path: str, data: bytes, fsync: str | None = None, mode: int | None = None
+) -> os.stat_result:
+    """Writes a file through a temp file in the same directory and os.replace,
+    so readers see either the old or the new contents. Symlinks are followed
+    and the mode and owner of the existing file are kept, unless mode is
+    given. Returns the stat of the file written, taken before the rename so
+    that it can't be another writer's."""
+    import tempfile  # pylint: disable=import-outside-toplevel
+
+    policy = fsync or FSYNC_POLICY
+    if policy not in FSYNC_POLICIES:
+        raise ValueError(f"Unknown fsync policy {policy!r}, expected one of {FSYNC_POLICIES}")
+    target = os.path.realpath(path)
+    directory = os.path.dirname(target)
+    try:
+        st: os.stat_result | None = os.stat(target)
+    except FileNotFoundError:
+        st = None
+    fd, tmp = tempfile.mkstemp(prefix=f".{os.path.basename(target)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, mode="wb") as file:
+            file.write(data)
+            file.flush()
+            if policy != "none":
+                os.fsync(file.fileno())
+            written = os.fstat(file.fileno())
+        if mode is not None:
+            os.chmod(tmp, mode)
+        elif st is None:
+            os.chmod(tmp, _DEFAULT_FILE_MODE)
+        else:
+            os.chmod(tmp, stat.S_IMODE(st.st_mode))
+            if hasattr(os, "chown") and (st.st_uid, st.st_gid) != (os.getuid(), os.getgid()):
+                try:
+                    os.chown(tmp, st.st_uid, st.st_gid)
+                except PermissionError:
+                    pass
+        os.replace(tmp, target)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    if policy == "file+dir":
+        _fsync_dir(directory)
+    return written
 
 
 def read_utf8(path: str) -> str:
@@ -12,9 +115,10 @@ def read_utf8(path: str) -> str:
 
 
 def write_utf8(path: str, text: str) -> None:
-    """Writes a file as utf-8."""
-    with open(path, encoding="utf-8", mode="w") as file:
-        file.write(text)
+    """Writes a file as utf-8, atomically."""
+    if os.linesep != "\n":
+        text = text.replace("\n", os.linesep)
+    atomic_write_bytes(path, text.encode("utf-8"))
 
 
 def parse_paths(path_str: str) -> list[str]:
@@ -27,6 +131,26 @@ def parse_paths(path_str: str) -> list[str]:
     return out
 
 
+def parse_env0(data: bytes, start: int = 0) -> dict[str, str]:
+    """Parses the NUL delimited NAME=value records of `env -0`, decoding each
+    name and value straight out of the buffer without splitting it first."""
+    out: dict[str, str] = {}
+    view = memoryview(data)
+    find = data.find
+    end_of_data = len(data)
+    pos = start
+    while pos < end_of_data:
+        end = find(b"\0", pos)
+        if end == -1:
+            end = end_of_data
+        equals = find(b"=", pos, end)
+        if equals > pos:
+            name = str(view[pos:equals], "utf-8", "surrogateescape")
+            out[name] = str(view[equals + 1 : end], "utf-8", "surrogateescape")
+        pos = end + 1
+    return out
+
+
 def remove_adjascent_duplicates(path_list: list[str]) -> list[str]:
     """Removes adjascent duplicates."""
     out = []
@@ -41,3 +165,67 @@ def remove_adjascent_duplicates(path_list: list[str]) -> list[str]:
         else:
             out.append(path)
     return out
+
+
+# path -> ((st_dev, st_ino) of the directory it resolved to, resolved path)
+_REALPATH_CACHE: dict[str, tuple[tuple[int, int], str]] = {}
+_REALPATH_CACHE_LOCK = threading.Lock()
+
+
+def cached_realpath(path: str) -> str:
+    """os.path.realpath, cached. An entry is reused only while the path still
+    stats to the same file, so retargeted symlinks are picked up, at the cost
+    of one stat instead of an lstat per path component."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return os.path.realpath(path)  # missing entries are not cached
+    key = (st.st_dev, st.st_ino)
+    with _REALPATH_CACHE_LOCK:
+        cached = _REALPATH_CACHE.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    resolved = os.path.realpath(path)
+    with _REALPATH_CACHE_LOCK:
+        _REALPATH_CACHE[path] = (key, resolved)
+    return resolved
+
+
+def normalize_path(path: str) -> str:
+    """Expands ~ and variables and drops trailing and doubled separators."""
+    path = os.path.expandvars(os.path.expanduser(path.strip()))
+    if not path:
+        return path
+    return os.path.normpath(path)
+
+
+# A $NAME or ${NAME} left over after os.path.expandvars, i.e. an unset variable.
+_UNEXPANDED_RE = re.compile(r"\$(\w+|\{[^}]*\})")
+
+
+def expand_path(path: str) -> str | None:
+    """Expands ~ and variables in a PATH entry, like the shell does. Returns
+    None when part of it can't be expanded in this process, e.g. a variable
+    that is not set here or the home of an unknown user."""
+    expanded = os.path.expandvars(os.path.expanduser(path))
+    if expanded.startswith("~") or _UNEXPANDED_RE.search(expanded):
+        return None
+    return expanded
+
+
+def canonicalize_paths(paths: list[str], realpath: bool = False) -> list[str]:
+    """Normalizes each entry and removes duplicates anywhere in the list in
+    O(n), keeping the first occurrence. With realpath, entries that resolve
+    to the same directory through symlinks are duplicates too; the spelling
+    of the first one is kept."""
+    out: list[str] = []
+    seen: set[str] = set()
+    for path in paths:
+        path = normalize_path(path)
+        if not path:
+            continue
+        key = os.path.normcase(cached_realpath(path) if realpath else path)
+        if key not in seen:
+            seen.add(key)
+            out.append(path)
+    return out
@@ -13,6 +13,7 @@ import winreg  # type: ignore
 
 import win32gui  # type: ignore
 
+from setenvironment import trace
 from setenvironment.types import Environment
 from setenvironment.win.refresh_env import REFRESH_ENV
 
@@ -80,9 +81,9 @@ def get_env_from_shell() -> Environment:
     cmd = (
         f'cmd /c "{REFRESH_ENV}" > nul && "{python_exe}" -m setenvironment.os_env_json'
     )
-    stdout = subprocess.check_output(
-        cmd, cwd=WIN_BIN_DIR, shell=True, universal_newlines=True
-    )
+    with trace.span("spawn python os_env_json") as span:
+        stdout = subprocess.check_output(cmd, cwd=WIN_BIN_DIR, shell=True, universal_newlines=True)
+        span.add_bytes(len(stdout))
     json_data = json.loads(stdout)
     env = json_data["ENVIRONMENT"]
     path = json_data["PATH"]
@@ -0,0 +1,129 @@
+"""
+Test the asyncio API
+"""
+
+# pylint: disable=fixme,import-outside-toplevel
+# flake8: noqa: E501
+
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from setenvironment import aio
+from setenvironment.lock import LockTimeoutError, rc_file_lock
+from setenvironment.setenv import get_env_var, transaction
+from setenvironment.testing.basetest import BASHRC, BaseTest
+
+
+def hold_lock(release: threading.Event) -> threading.Thread:
+    """Holds the lock of the bash file on another thread until release is set."""
+    taken = threading.Event()
+
+    def run() -> None:
+        with rc_file_lock(BASHRC):
+            taken.set()
+            release.wait(10)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    taken.wait(10)
+    return thread
+
+
+@unittest.skipIf(sys.platform == "win32", "Windows does not have a shell.")
+class AioTester(BaseTest):
+    """Tester for setenvironment.aio."""
+
+    def tearDown(self) -> None:
+        os.environ.pop("AIO_FOO", None)
+        paths = os.environ["PATH"].split(os.pathsep)
+        os.environ["PATH"] = os.pathsep.join(p for p in paths if p != "/aio/bin")
+        super().tearDown()
+
+    def test_set_and_reload(self) -> None:
+        async def run() -> None:
+            await aio.set_env_var("AIO_FOO", "bar")
+            await aio.add_env_path("/aio/bin")
+            self.assertEqual("bar", await aio.get_env_var("AIO_FOO"))
+            os.environ.pop("AIO_FOO")
+            env = await aio.get_env()
+            self.assertEqual("bar", env.vars["AIO_FOO"])
+            self.assertIn("/aio/bin", env.paths)
+            await aio.reload_environment()
+            self.assertEqual("bar", os.environ["AIO_FOO"])
+            await aio.unset_env_var("AIO_FOO")
+
+        asyncio.run(run())
+        self.assertIsNone(get_env_var("AIO_FOO"))
+
+    def test_mutation_in_transaction_fails_fast(self) -> None:
+        start = time.monotonic()
+        with transaction():
+            with self.assertRaises(RuntimeError):
+                asyncio.run(aio.set_env_var("AIO_FOO", "bar"))
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertIsNone(get_env_var("AIO_FOO"))
+
+    def test_mutation_lock_timeout(self) -> None:
+        release = threading.Event()
+        thread = hold_lock(release)
+        try:
+            with self.assertRaises(LockTimeoutError):
+                asyncio.run(aio.set_env_var("AIO_FOO", "bar", timeout=0.2))
+        finally:
+            release.set()
+            thread.join()
+        self.assertIsNone(get_env_var("AIO_FOO"))
+
+    def test_mutation_cancelled_before_the_lock_is_skipped(self) -> None:
+        async def run() -> None:
+            task = asyncio.ensure_future(aio.set_env_var("AIO_FOO", "bar"))
+            await asyncio.sleep(0.2)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        release = threading.Event()
+        thread = hold_lock(release)
+        try:
+            # asyncio.run() waits for the executor, so release from a timer.
+            threading.Timer(0.5, release.set).start()
+            asyncio.run(run())
+        finally:
+            release.set()
+            thread.join()
+        self.assertIsNone(get_env_var("AIO_FOO"))
+
+    def test_timeout_kills_shell(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            slow_rc = os.path.join(tmpdir, "slow.bashrc")
+            with open(slow_rc, encoding="utf-8", mode="w") as file:
+                file.write("sleep 10\n")
+            start = time.monotonic()
+            with self.assertRaises(asyncio.TimeoutError):
+                asyncio.run(aio.get_env_vars_from_shell(slow_rc, timeout=0.5))
+            self.assertLess(time.monotonic() - start, 5)
+
+    def test_cancel(self) -> None:
+        async def run() -> None:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                slow_rc = os.path.join(tmpdir, "slow.bashrc")
+                with open(slow_rc, encoding="utf-8", mode="w") as file:
+                    file.write("sleep 10\n")
+                task = asyncio.ensure_future(aio.get_env_vars_from_shell(slow_rc))
+                await asyncio.sleep(0.2)
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+
+        start = time.monotonic()
+        asyncio.run(run())
+        self.assertLess(time.monotonic() - start, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+"""
+Test the managed block tokenizer and AST
+"""
+
+# pylint: disable=fixme,import-outside-toplevel
+# flake8: noqa: E501
+
+import os
+import sys
+import unittest
+
+from setenvironment import journal
+from setenvironment.bash_ast import tokenize_block
+from setenvironment.bash_parser import (
+    END_MARKER,
+    START_MARKER,
+    bash_journal_compact,
+    bash_make_environment,
+    bash_rc_file,
+    bash_read_block,
+    bash_read_lines,
+    bash_read_variable,
+    bash_save,
+)
+from setenvironment.setenv import get_paths, set_paths
+from setenvironment.testing.basetest import BaseTest
+from setenvironment.types import BashEnvironment
+from setenvironment.util import write_utf8
+
+
+class BashAstTester(BaseTest):
+    """Tester for the managed block AST."""
+
+    def test_tokenize_block(self) -> None:
+        lines = [
+            "# a comment",
+            'export FOO="hello world"',
+            "",
+            "export URL=http://host/?a=b",
+            "source /some/file",
+            "export PATH=/a:/b:$PATH",
+        ]
+        block = tokenize_block(lines, start_lineno=10)
+        self.assertEqual(lines, block.lines())
+        foo = block.get("FOO")
+        assert foo is not None
+        self.assertEqual('"hello world"', foo.value)
+        self.assertEqual('"', foo.quote)
+        url = block.get("URL")
+        assert url is not None
+        self.assertEqual("http://host/?a=b", url.value)
+        self.assertEqual(14, block.lineno_of("URL"))
+        self.assertEqual(
+            ["comment", "export", "blank", "export", "command", "export"],
+            [n.kind for n in block.nodes],
+        )
+        env = block.to_environment()
+        self.assertEqual(["/a", "/b"], env.paths)
+
+    @unittest.skipIf(sys.platform == "win32", "Uses the bash file.")
+    def test_set_paths(self) -> None:
+        old_path = os.environ["PATH"]
+        prev = (journal.JOURNAL_MODE, journal.JOURNAL_MAX_RECORDS, journal.JOURNAL_MAX_BYTES)
+        try:
+            set_paths(["/a", "/b"])
+            self.assertIn("export PATH=/a:/b", bash_read_lines())
+            self.assertEqual(["/a", "/b"], get_paths())
+            set_paths(["/c"])
+            self.assertEqual(["/c"], get_paths())
+            # Journaled, the value must survive the compaction.
+            journal.journal_set_mode(True)
+            set_paths(["/d", "/e"])
+            bash_journal_compact()
+            self.assertEqual(["/d", "/e"], get_paths())
+        finally:
+            journal.journal_set_mode(*prev)
+            os.environ["PATH"] = old_path
+
+    def test_read_variable_with_equals(self) -> None:
+        env: BashEnvironment = bash_make_environment()
+        env.vars["URL"] = "http://host/?a=b"
+        bash_save(env)
+        self.assertEqual("http://host/?a=b", bash_read_variable("URL"))
+
+    def test_save_keeps_comments_and_untouched_lines(self) -> None:
+        lines = [
+            START_MARKER,
+            "# keep me",
+            "export A='single quoted'",
+            "export B=1",
+            "export PATH=/a:$PATH",
+            END_MARKER,
+        ]
+        write_utf8(bash_rc_file(), "\n".join(lines))
+        env: BashEnvironment = bash_make_environment()
+        env.vars["B"] = "2"
+        env.vars["C"] = "3"
+        env.paths.append("/b")
+        bash_save(env)
+        self.assertEqual(
+            [
+                "# keep me",
+                "export A='single quoted'",
+                "export B=2",
+                "export C=3",
+                "export PATH=/a:/b:$PATH",
+            ],
+            bash_read_lines(),
+        )
+        block = bash_read_block()
+        self.assertEqual(4, block.lineno_of("C"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,15 +7,21 @@ Test the main module
 
 import os
 import unittest
+from unittest import mock
 
 from setenvironment.bash_parser import (
+    END_MARKER,
+    START_MARKER,
     BashEnvironment,
     bash_make_environment,
+    bash_rc_file,
     bash_rc_set_file,
     bash_read_lines,
+    bash_read_variable,
     bash_save,
 )
 from setenvironment.testing.basetest import BaseTest
+from setenvironment.util import write_utf8
 
 HERE = os.path.dirname(__file__)
 BASHRC = os.path.join(HERE, "bash_parser.mybashrc")
@@ -61,6 +67,60 @@ class BashParserTester(BaseTest):
         finally:
             env.paths.remove("/my/path")
 
+    def test_parse_cache_returns_copies(self) -> None:
+        """Mutating a parsed environment must not leak into the cache."""
+        env: BashEnvironment = bash_make_environment()
+        env.vars["FOO"] = "bar"
+        bash_save(env)
+        env2: BashEnvironment = bash_make_environment()
+        env2.vars["FOO"] = "changed"
+        env2.paths.append("/not/saved")
+        env3: BashEnvironment = bash_make_environment()
+        self.assertEqual("bar", env3.vars["FOO"])
+        self.assertNotIn("/not/saved", env3.paths)
+
+    def test_parse_cache_sees_external_writes(self) -> None:
+        """A write that bypasses bash_save must invalidate the cache."""
+        env: BashEnvironment = bash_make_environment()
+        env.vars["FOO"] = "bar"
+        bash_save(env)
+        self.assertEqual("bar", bash_read_variable("FOO"))
+        lines = [START_MARKER, "export FOO=other_value", END_MARKER]
+        write_utf8(bash_rc_file(), "\n".join(lines))
+        self.assertEqual("other_value", bash_read_variable("FOO"))
+        self.assertEqual("other_value", bash_make_environment().vars["FOO"])
+
+    def test_parse_cache_ignores_a_racing_write(self) -> None:
+        """A write that lands right after ours must not be cached as ours."""
+        lines = [START_MARKER, "export FOO=theirs", END_MARKER]
+        real_replace = os.replace
+
+        def replace_then_race(src: str, dst: str) -> None:
+            real_replace(src, dst)
+            with open(dst, encoding="utf-8", mode="w") as file:
+                file.write("\n".join(lines))
+
+        env: BashEnvironment = bash_make_environment()
+        env.vars["FOO"] = "ours"
+        with mock.patch("os.replace", replace_then_race):
+            bash_save(env)
+        self.assertEqual("theirs", bash_read_variable("FOO"))
+
+    def test_save_skips_unchanged_block(self) -> None:
+        """Saving an identical environment must not rewrite the file."""
+        env: BashEnvironment = bash_make_environment()
+        env.vars["FOO"] = "bar"
+        env.paths.append("/my/path")
+        self.assertTrue(bash_save(env))
+        mtime = os.stat(bash_rc_file()).st_mtime_ns
+        env2: BashEnvironment = bash_make_environment()
+        env2.vars.pop("NOT_THERE", None)
+        self.assertFalse(bash_save(env2))
+        self.assertFalse(env2.save())
+        self.assertEqual(mtime, os.stat(bash_rc_file()).st_mtime_ns)
+        env2.vars["FOO"] = "baz"
+        self.assertTrue(env2.save())
+
 
 if __name__ == "__main__":
     unittest.main()
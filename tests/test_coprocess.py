@@ -0,0 +1,84 @@
+"""
+Test the warm bash coprocess
+"""
+
+# pylint: disable=fixme,import-outside-toplevel
+# flake8: noqa: E501
+
+import os
+import sys
+import time
+import unittest
+
+from setenvironment import journal
+from setenvironment.bash_parser import bash_journal_compact
+from setenvironment.coprocess import BashCoprocess, set_warm_shell
+from setenvironment.setenv import get_env_var, set_env_var, unset_env_var
+from setenvironment.setenv_unix import get_env_vars_from_shell
+from setenvironment.testing.basetest import BASHRC, BaseTest
+
+
+@unittest.skipIf(sys.platform == "win32", "Windows does not have a shell.")
+class CoprocessTester(BaseTest):
+    """Tester for BashCoprocess."""
+
+    def tearDown(self) -> None:
+        set_warm_shell(False)
+        os.environ.pop("COPROC_FOO", None)
+        super().tearDown()
+
+    def test_snapshot_follows_file_changes(self) -> None:
+        coproc = BashCoprocess(BASHRC)
+        try:
+            set_env_var("COPROC_FOO", "1")
+            self.assertEqual("1", coproc.snapshot().vars["COPROC_FOO"])
+            self.assertTrue(coproc.ping())
+            time.sleep(0.01)  # Make sure the mtime moves.
+            unset_env_var("COPROC_FOO")
+            self.assertIsNone(get_env_var("COPROC_FOO"))
+            self.assertNotIn("COPROC_FOO", coproc.snapshot().vars)
+        finally:
+            coproc.close()
+        self.assertFalse(coproc.ping())
+
+    def test_snapshot_follows_namespaced_journal(self) -> None:
+        prev = (journal.JOURNAL_MODE, journal.JOURNAL_MAX_RECORDS, journal.JOURNAL_MAX_BYTES)
+        journal.journal_set_mode(True, max_records=1000, max_bytes=1024 * 1024)
+        coproc = BashCoprocess(BASHRC)
+        try:
+            set_env_var("COPROC_J", "1", namespace="tool")
+            self.assertEqual("1", coproc.snapshot().vars["COPROC_J"])
+            time.sleep(0.01)  # Make sure the mtime moves.
+            set_env_var("COPROC_J", "2", namespace="tool")
+            self.assertTrue(os.path.exists(journal.journal_path(BASHRC, "tool")))
+            self.assertEqual("2", coproc.snapshot().vars["COPROC_J"])
+        finally:
+            coproc.close()
+            bash_journal_compact("tool")
+            journal.journal_set_mode(*prev)
+            os.environ.pop("COPROC_J", None)
+
+    def test_restart_after_crash(self) -> None:
+        coproc = BashCoprocess(BASHRC)
+        try:
+            coproc.snapshot()
+            assert coproc._proc is not None  # pylint: disable=protected-access
+            coproc._proc.kill()  # pylint: disable=protected-access
+            coproc._proc.wait()  # pylint: disable=protected-access
+            env = coproc.snapshot()
+            self.assertTrue(env.paths)
+            self.assertTrue(coproc.ping())
+        finally:
+            coproc.close()
+
+    def test_warm_shell_matches_cold_capture(self) -> None:
+        set_env_var("COPROC_FOO", "warm")
+        cold = get_env_vars_from_shell(BASHRC)
+        set_warm_shell(True)
+        warm = get_env_vars_from_shell(BASHRC)
+        self.assertEqual("warm", warm.vars["COPROC_FOO"])
+        self.assertEqual(cold.paths, warm.paths)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+"""
+Test the synthetic rc file generator of the benchmarks and scaling tests
+"""
+
+# flake8: noqa: E501
+
+import os
+import sys
+import tempfile
+import unittest
+
+from setenvironment.bash_parser import bash_make_environment, bash_rc_set_file
+from setenvironment.testing.basetest import BaseTest
+from setenvironment.testing.corpus import make_paths, make_rc_text, write_corpus
+
+
+class CorpusTester(BaseTest):
+    """Tester for the corpus generator."""
+
+    def test_make_paths_duplicates(self) -> None:
+        paths = make_paths(100, duplicates=0.25)
+        self.assertEqual(100, len(paths))
+        self.assertEqual(75, len(set(paths)))
+
+    def test_size_is_padded(self) -> None:
+        text = make_rc_text(exports=5, paths=5, size=64 * 1024)
+        self.assertGreaterEqual(len(text.encode("utf-8")), 64 * 1024)
+        self.assertLess(len(text.encode("utf-8")), 65 * 1024)
+
+    @unittest.skipIf(sys.platform == "win32", "Uses the bash file.")
+    def test_corpus_parses(self) -> None:
+        with tempfile.TemporaryDirectory() as home:
+            rc_file = write_corpus(home, exports=50, paths=200, size=8192, groups=2, group_size=5)
+            self.assertTrue(os.path.exists(os.path.join(home, ".profile")))
+            bash_rc_set_file(rc_file)
+            env = bash_make_environment()
+        self.assertEqual(200, len(env.paths))
+        self.assertEqual(make_paths(200), list(env.paths))
+        self.assertEqual(52, len(env.vars))
+        self.assertEqual(5, len(env.vars["CORPUS_GROUP_1"].split(":")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+"""
+Test the doctor command
+"""
+
+# pylint: disable=fixme,import-outside-toplevel
+# flake8: noqa: E501
+
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from setenvironment import bash_parser, doctor
+from setenvironment.bash_parser import bash_make_environment
+from setenvironment.doctor import EntryCheck, check_entries, detect_path_groups, prune
+from setenvironment.exe_index import scan_directory
+from setenvironment.setenv import add_env_path, add_to_path_group, get_paths
+from setenvironment.testing.basetest import BASHRC, BaseTest
+
+
+@unittest.skipIf(sys.platform == "win32", "Uses unix executable bits.")
+class DoctorTester(BaseTest):
+    """Tester for doctor."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.old_path = os.environ["PATH"]
+        self.tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.first = os.path.join(self.tmpdir.name, "first")
+        self.second = os.path.join(self.tmpdir.name, "second")
+        self.dead = os.path.join(self.tmpdir.name, "uninstalled")
+        for directory in [self.first, self.second]:
+            os.mkdir(directory)
+            path = os.path.join(directory, "tool")
+            with open(path, encoding="utf-8", mode="w") as file:
+                file.write("#!/bin/sh\n")
+            os.chmod(path, 0o755)
+
+    def tearDown(self) -> None:
+        os.environ["PATH"] = self.old_path
+        os.environ.pop("DOCTOR_GROUP", None)
+        self.tmpdir.cleanup()
+        super().tearDown()
+
+    def test_report_and_prune(self) -> None:
+        add_env_path(self.second)
+        add_env_path(self.first)
+        add_env_path(self.first)
+        add_to_path_group("DOCTOR_GROUP", self.dead)
+        self.assertEqual(
+            {"DOCTOR_GROUP": [self.dead]},
+            detect_path_groups(bash_make_environment().vars, get_paths()),
+        )
+        report = doctor.doctor()
+        self.assertFalse(report.healthy)
+        (missing,) = report.with_status("missing")
+        self.assertEqual((self.dead, ["DOCTOR_GROUP"]), (missing.path, missing.groups))
+        self.assertEqual({self.first: 2}, report.duplicates)
+        self.assertEqual({"tool": [self.second, self.first]}, report.shadowed)
+        self.assertIn("Shadowed executables:", report.format())
+        mtime = os.stat(BASHRC).st_mtime_ns
+        writes = []
+        real_write = bash_parser.atomic_write_bytes
+
+        def counting_write(*args, **kwargs):
+            writes.append(args[0])
+            return real_write(*args, **kwargs)
+
+        with mock.patch.object(bash_parser, "atomic_write_bytes", counting_write):
+            self.assertEqual([self.dead], prune(report))
+        self.assertEqual(1, len(writes))
+        self.assertNotEqual(mtime, os.stat(BASHRC).st_mtime_ns)
+        self.assertNotIn(self.dead, get_paths())
+        self.assertNotIn("DOCTOR_GROUP", bash_make_environment().vars)
+
+    def test_unexpanded_entries_are_not_pruned(self) -> None:
+        os.environ["DOCTOR_HOME"] = self.tmpdir.name
+        os.environ.pop("DOCTOR_UNSET", None)
+        try:
+            add_env_path("$DOCTOR_HOME/first")
+            add_env_path("${DOCTOR_UNSET}/bin")
+            add_env_path(self.dead)
+            report = doctor.doctor()
+        finally:
+            os.environ.pop("DOCTOR_HOME", None)
+        by_path = {entry.path: entry for entry in report.entries}
+        self.assertEqual("ok", by_path["$DOCTOR_HOME/first"].status)
+        self.assertEqual(self.first, by_path["$DOCTOR_HOME/first"].expanded)
+        self.assertEqual("unexpanded", by_path["${DOCTOR_UNSET}/bin"].status)
+        self.assertIn("Not expandable here:", report.format())
+        self.assertEqual([self.dead], prune(report))
+        self.assertIn("$DOCTOR_HOME/first", get_paths())
+        self.assertIn("${DOCTOR_UNSET}/bin", get_paths())
+
+    def test_hung_entry_times_out(self) -> None:
+        release = threading.Event()
+
+        def scan(path: str):
+            if path == self.dead:
+                release.wait(10)  # an NFS mount that does not answer
+            return scan_directory(path)
+
+        entries = [EntryCheck(self.dead), EntryCheck(self.first), EntryCheck(self.second)]
+        start = time.monotonic()
+        try:
+            with mock.patch.object(doctor, "scan_directory", scan):
+                check_entries(entries, timeout=0.2, max_workers=1)
+        finally:
+            release.set()
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(["timeout", "ok", "ok"], [entry.status for entry in entries])
+        self.assertEqual(["tool"], entries[1].executables)
+
+
+if __name__ == "__main__":
+    unittest.main()
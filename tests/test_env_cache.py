@@ -0,0 +1,91 @@
+"""
+Test the on disk cache of the shell environment
+"""
+
+# pylint: disable=fixme,import-outside-toplevel,protected-access
+# flake8: noqa: E501
+
+import os
+import stat
+import sys
+import unittest
+from unittest import mock
+
+from setenvironment import setenv_unix
+from setenvironment.env_cache import cache_dir, set_env_cache
+from setenvironment.setenv import set_env_var
+from setenvironment.testing.basetest import BASHRC, BaseTest
+
+
+@unittest.skipIf(sys.platform == "win32", "Windows does not have a shell.")
+class EnvCacheTester(BaseTest):
+    """Tester for the environment cache."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        set_env_cache(True)
+
+    def tearDown(self) -> None:
+        os.environ.pop("CACHE_FOO", None)
+        super().tearDown()
+
+    def count_captures(self) -> tuple[list[str], mock._patch]:
+        calls: list[str] = []
+        real = setenv_unix._run_shell_capture  # pylint: disable=protected-access
+
+        def counting(script, settings_file, home=None):
+            calls.append(settings_file)
+            return real(script, settings_file, home)
+
+        return calls, mock.patch.object(setenv_unix, "_run_shell_capture", counting)
+
+    def test_get_env_served_from_cache(self) -> None:
+        calls, patch = self.count_captures()
+        with patch:
+            set_env_var("CACHE_FOO", "1")
+            self.assertEqual("1", setenv_unix.get_env().vars["CACHE_FOO"])
+            self.assertEqual("1", setenv_unix.get_env().vars["CACHE_FOO"])
+            self.assertEqual(1, len(calls))
+            self.assertEqual(1, len(os.listdir(cache_dir())))
+            # The entry holds the whole environment, only the user may read it.
+            self.assertEqual(0o700, stat.S_IMODE(os.stat(cache_dir()).st_mode))
+            (entry,) = os.listdir(cache_dir())
+            self.assertEqual(0o600, stat.S_IMODE(os.stat(os.path.join(cache_dir(), entry)).st_mode))
+            # Changing the bash file changes the key.
+            set_env_var("CACHE_FOO", "2")
+            self.assertEqual("2", setenv_unix.get_env().vars["CACHE_FOO"])
+            self.assertEqual(2, len(calls))
+            set_env_cache(False)
+            setenv_unix.get_env()
+            self.assertEqual(3, len(calls))
+
+    def test_files_sourced_by_the_settings_are_watched(self) -> None:
+        extra = os.path.join(self.cache_home.name, "extra.sh")
+        with open(extra, encoding="utf-8", mode="w") as file:
+            file.write("export CACHE_EXTRA=one\n")
+        with open(BASHRC, encoding="utf-8", mode="w") as file:
+            file.write(f"source {extra}\n")
+        calls, patch = self.count_captures()
+        with patch:
+            self.assertEqual("one", setenv_unix.get_env().vars["CACHE_EXTRA"])
+            self.assertEqual("one", setenv_unix.get_env().vars["CACHE_EXTRA"])
+            self.assertEqual(1, len(calls))
+            with open(extra, encoding="utf-8", mode="w") as file:
+                file.write("export CACHE_EXTRA=two\n")
+            self.assertEqual("two", setenv_unix.get_env().vars["CACHE_EXTRA"])
+            self.assertEqual(2, len(calls))
+
+    def test_parse_sourced_files(self) -> None:
+        stdout = (
+            b"noise"
+            + setenv_unix.SHELL_SOURCED_DELIM
+            + b"\0/a\0/b\0/a\0"
+            + setenv_unix.SHELL_CAPTURE_DELIM
+            + b"\0X=1\0"
+        )
+        self.assertEqual(["/a", "/b"], setenv_unix.parse_sourced_files(stdout))
+        self.assertEqual({"X": "1"}, setenv_unix.parse_shell_capture(stdout).vars)
+
+
+if __name__ == "__main__":
+    unittest.main()
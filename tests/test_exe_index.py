@@ -0,0 +1,108 @@
+"""
+Test the executable index
+"""
+
+# pylint: disable=fixme,import-outside-toplevel
+# flake8: noqa: E501
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import setenvironment
+from setenvironment.exe_index import ExecutableIndex, search_dirs
+from setenvironment.setenv import add_env_path, remove_env_path
+from setenvironment.testing.basetest import BaseTest
+
+
+def _make_exe(directory: str, name: str) -> str:
+    path = os.path.join(directory, name)
+    with open(path, encoding="utf-8", mode="w") as file:
+        file.write("#!/bin/sh\n")
+    os.chmod(path, 0o755)
+    return path
+
+
+def _age(directory: str) -> None:
+    """Moves the mtime out of the racy window, like a directory that was
+    last changed a while ago."""
+    st = os.stat(directory)
+    os.utime(directory, ns=(st.st_atime_ns, st.st_mtime_ns - 10_000_000_000))
+
+
+@unittest.skipIf(sys.platform == "win32", "Uses unix executable bits.")
+class ExecutableIndexTester(BaseTest):
+    """Tester for ExecutableIndex."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.first = os.path.join(self.tmpdir.name, "first")
+        self.second = os.path.join(self.tmpdir.name, "second")
+        os.mkdir(self.first)
+        os.mkdir(self.second)
+        _make_exe(self.second, "tool")
+        with open(os.path.join(self.first, "data"), encoding="utf-8", mode="w") as file:
+            file.write("not executable")
+        _age(self.first)
+        _age(self.second)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+        super().tearDown()
+
+    def test_lookup_and_rescan(self) -> None:
+        index = ExecutableIndex()
+        paths = [self.first, self.second]
+        self.assertEqual(os.path.join(self.second, "tool"), index.lookup("tool", paths))
+        self.assertIsNone(index.lookup("data", paths))
+        self.assertIsNone(index.lookup("missing", paths))
+        self.assertEqual(2, index.scans)
+        # Repeated lookups don't list the directories again.
+        index.lookup("tool", paths)
+        self.assertEqual(2, index.scans)
+        # A new executable in front wins, only its directory is rescanned.
+        _make_exe(self.first, "tool")
+        _age(self.first)
+        self.assertEqual(os.path.join(self.first, "tool"), index.lookup("tool", paths))
+        self.assertEqual(3, index.scans)
+
+    def test_path_order_change_does_not_rescan(self) -> None:
+        _make_exe(self.first, "tool")
+        _age(self.first)
+        index = ExecutableIndex()
+        self.assertEqual(
+            os.path.join(self.first, "tool"), index.lookup("tool", [self.first, self.second])
+        )
+        self.assertEqual(
+            os.path.join(self.second, "tool"), index.lookup("tool", [self.second, self.first])
+        )
+        self.assertEqual(2, index.scans)
+
+    def test_entries_are_expanded(self) -> None:
+        index = ExecutableIndex()
+        os.environ["EXE_INDEX_DIR"] = self.tmpdir.name
+        try:
+            paths = ["$EXE_INDEX_UNSET/second", "$EXE_INDEX_DIR/second"]
+            self.assertEqual(os.path.join(self.second, "tool"), index.lookup("tool", paths))
+            self.assertEqual([self.second], search_dirs(paths))
+        finally:
+            del os.environ["EXE_INDEX_DIR"]
+
+    def test_which_follows_add_env_path(self) -> None:
+        self.assertIsNone(setenvironment.which("tool"))
+        old_path = os.environ["PATH"]
+        try:
+            add_env_path(self.second)
+            self.assertEqual(os.path.join(self.second, "tool"), setenvironment.which("tool"))
+            remove_env_path(self.second)
+            self.assertIsNone(setenvironment.which("tool"))
+        finally:
+            os.environ["PATH"] = old_path
+        self.assertEqual(shutil.which("sh"), setenvironment.which("sh"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+"""
+Test the bulk fleet API
+"""
+
+# pylint: disable=fixme,import-outside-toplevel
+# flake8: noqa: E501
+
+import os
+import sys
+import tempfile
+import unittest
+
+from setenvironment.bash_parser import bash_rc_file
+from setenvironment.fleet import Target, resolve_target, run_fleet, run_target
+from setenvironment.testing.basetest import BASHRC, BaseTest
+
+
+@unittest.skipIf(sys.platform == "win32", "Windows does not have a bash file.")
+class FleetTester(BaseTest):
+    """Tester for run_fleet."""
+
+    def test_resolve_target(self) -> None:
+        with tempfile.TemporaryDirectory() as home:
+            self.assertEqual((home, os.path.join(home, ".bashrc")), resolve_target(home))
+            profile = os.path.join(home, ".profile")
+            with open(profile, encoding="utf-8", mode="w") as file:
+                file.write("")
+            self.assertEqual((home, profile), resolve_target(home))
+            self.assertEqual((home, profile), resolve_target(profile))
+
+    def test_run_target_restores_process_state(self) -> None:
+        environ = dict(os.environ)
+        with tempfile.TemporaryDirectory() as home:
+            result = run_target(
+                Target(home, [("set", "FLEET_FOO", "1"), ("addpath", "/fleet/bin")])
+            )
+        self.assertTrue(result.ok, result.error)
+        self.assertEqual(environ, dict(os.environ))
+        self.assertEqual(BASHRC, bash_rc_file())
+
+    def test_run_fleet(self) -> None:
+        environ = dict(os.environ)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            homes = [os.path.join(tmpdir, f"home{i}") for i in range(4)]
+            for home in homes:
+                os.mkdir(home)
+            targets = [
+                Target(
+                    home,
+                    [
+                        ("set", "FLEET_USER", os.path.basename(home)),
+                        ("addpath", "/fleet/bin"),
+                        ("get", "FLEET_USER"),
+                        ("env",),
+                    ],
+                )
+                for home in homes
+            ]
+            targets.append(Target(homes[0], [("bogus",), ("set", "NEVER", "1")]))
+            results = run_fleet(targets, max_workers=2)
+            self.assertEqual(5, len(results))
+            for home, result in zip(homes, results):
+                self.assertTrue(result.ok, result.error)
+                self.assertEqual(os.path.join(home, ".bashrc"), result.rc_file)
+                self.assertEqual(os.path.basename(home), result.results[2])
+                env = result.results[3]
+                self.assertEqual(os.path.basename(home), env.vars["FLEET_USER"])
+                self.assertEqual(home, env.vars["HOME"])
+                self.assertIn("/fleet/bin", env.paths)
+                self.assertEqual(4, len(result.timings))
+            self.assertFalse(results[4].ok)
+            self.assertIn("bogus", results[4].error or "")
+            self.assertEqual(1, len(results[4].timings))
+        self.assertEqual(environ, dict(os.environ))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+"""
+Test the journaled storage mode
+"""
+
+# pylint: disable=fixme,import-outside-toplevel
+# flake8: noqa: E501
+
+import os
+import sys
+import tempfile
+import unittest
+
+from setenvironment import journal
+from setenvironment.bash_parser import (
+    bash_journal_compact,
+    bash_make_environment,
+    bash_rc_set_file,
+    read_bash_file_lines,
+)
+from setenvironment.journal import (
+    journal_append,
+    journal_path,
+    journal_read,
+    journal_set_mode,
+    journal_source_line,
+)
+from setenvironment.setenv import get_env_var, set_env_var, unset_env_var
+from setenvironment.setenv_unix import get_env_vars_from_shell
+from setenvironment.static_eval import static_eval
+from setenvironment.testing.basetest import BASHRC, BaseTest
+
+
+@unittest.skipIf(sys.platform == "win32", "The journal is a unix feature.")
+class JournalTester(BaseTest):
+    """Tester for journal mode."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.prev = (journal.JOURNAL_MODE, journal.JOURNAL_MAX_RECORDS, journal.JOURNAL_MAX_BYTES)
+        journal_set_mode(True, max_records=1000, max_bytes=1024 * 1024)
+
+    def tearDown(self) -> None:
+        bash_journal_compact()
+        journal_set_mode(*self.prev)
+        for key in ["JOURNAL_A", "JOURNAL_B"]:
+            os.environ.pop(key, None)
+        super().tearDown()
+
+    def test_writes_append_to_journal(self) -> None:
+        set_env_var("JOURNAL_A", "1")
+        set_env_var("JOURNAL_B", "2")
+        set_env_var("JOURNAL_A", "3")
+        unset_env_var("JOURNAL_B")
+        journal_file = journal_path(BASHRC)
+        # The block only sources the journal, the values live in the journal.
+        self.assertEqual([journal_source_line(journal_file)], read_bash_file_lines(BASHRC))
+        self.assertTrue(os.path.exists(journal_file))
+        self.assertEqual("3", get_env_var("JOURNAL_A"))
+        self.assertIsNone(get_env_var("JOURNAL_B"))
+        env = bash_make_environment()
+        self.assertEqual({"JOURNAL_A": "3"}, env.vars)
+        shell_env = get_env_vars_from_shell(BASHRC)
+        self.assertEqual("3", shell_env.vars["JOURNAL_A"])
+        self.assertNotIn("JOURNAL_B", shell_env.vars)
+        # Compaction folds the journal into the block.
+        bash_journal_compact()
+        self.assertFalse(os.path.exists(journal_file))
+        self.assertEqual(
+            ["export JOURNAL_A=3", journal_source_line(journal_file)],
+            read_bash_file_lines(BASHRC),
+        )
+        self.assertEqual("3", get_env_var("JOURNAL_A"))
+
+    def test_threshold_triggers_compaction(self) -> None:
+        journal_set_mode(True, max_records=5)
+        for i in range(5):
+            set_env_var("JOURNAL_A", str(i))
+        bash_journal_compact()  # Waits for the background compaction.
+        self.assertFalse(os.path.exists(journal_path(BASHRC)))
+        self.assertIn("export JOURNAL_A=4", read_bash_file_lines(BASHRC))
+
+    def test_journal_path_with_shell_characters(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            directory = os.path.join(tmpdir, 'a$HOME`b`"c\' d')
+            os.mkdir(directory)
+            rc_file = os.path.join(directory, "rc")
+            bash_rc_set_file(rc_file)
+            try:
+                set_env_var("JOURNAL_A", "1")
+                self.assertTrue(os.path.exists(journal_path(rc_file)))
+                self.assertEqual({"JOURNAL_A": "1"}, static_eval(rc_file, {}))
+                self.assertEqual("1", get_env_vars_from_shell(rc_file).vars["JOURNAL_A"])
+                bash_journal_compact()
+            finally:
+                bash_rc_set_file(BASHRC)
+
+    def test_rewritten_journal_is_reparsed(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            journal_file = os.path.join(tmpdir, "rc.setenvironment.journal")
+            journal_append(journal_file, ["export A=1", "export B=2"])
+            # Rewritten in place, e.g. compacted and restarted by another
+            # process: same inode, and longer than what was parsed.
+            with open(journal_file, mode="wb") as file:
+                file.write(b"export C=3\nexport D=4\nexport E=5\n")
+            state = journal_read(journal_file)
+            assert state is not None
+            self.assertEqual({"C": "3", "D": "4", "E": "5"}, state.overrides)
+            # Same size, different content.
+            with open(journal_file, mode="wb") as file:
+                file.write(b"export F=6\nexport G=7\nexport H=8\n")
+            os.utime(journal_file, ns=(0, 0))  # ctime still moves
+            state = journal_read(journal_file)
+            assert state is not None
+            self.assertEqual({"F": "6", "G": "7", "H": "8"}, state.overrides)
+            state = journal_append(journal_file, ["unset F"])
+            self.assertEqual({"F": None, "G": "7", "H": "8"}, state.overrides)
+            self.assertEqual(4, state.records)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+"""
+Test locking of the bash file against concurrent writers
+"""
+
+# pylint: disable=fixme,import-outside-toplevel
+# flake8: noqa: E501
+
+import os
+import subprocess
+import sys
+import unittest
+
+from setenvironment.bash_parser import bash_make_environment
+from setenvironment.lock import (
+    LockTimeoutError,
+    get_lock_stats,
+    lock_path,
+    rc_file_lock,
+    reset_lock_stats,
+)
+from setenvironment.setenv import set_env_var, unset_env_var
+from setenvironment.testing.basetest import BASHRC, BaseTest
+
+WRITER = """
+import sys
+from setenvironment.bash_parser import bash_rc_set_file
+from setenvironment.setenv import set_env_var
+bash_rc_set_file(sys.argv[1])
+for i in range(10):
+    set_env_var(f"LOCK_TEST_{sys.argv[2]}_{i}", str(i), update_curr_environment=False)
+"""
+
+
+@unittest.skipIf(sys.platform == "win32", "fcntl locking is unix only.")
+class LockTester(BaseTest):
+    """Tester for rc_file_lock."""
+
+    def test_concurrent_writers_keep_every_update(self) -> None:
+        procs = [subprocess.Popen([sys.executable, "-c", WRITER, BASHRC, str(n)]) for n in range(6)]
+        for proc in procs:
+            self.assertEqual(0, proc.wait())
+        env = bash_make_environment()
+        for n in range(6):
+            for i in range(10):
+                self.assertEqual(str(i), env.vars.get(f"LOCK_TEST_{n}_{i}"))
+
+    def test_stats_and_timeout(self) -> None:
+        import fcntl
+
+        reset_lock_stats()
+        set_env_var("LOCK_TEST", "1")
+        unset_env_var("LOCK_TEST")
+        stats = get_lock_stats()
+        self.assertEqual(2, stats.acquisitions)
+        self.assertEqual(0, stats.timeouts)
+        # Another holder of the lock file makes us time out.
+        fd = os.open(lock_path(BASHRC), os.O_RDWR | os.O_CREAT)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            with self.assertRaises(LockTimeoutError):
+                with rc_file_lock(BASHRC, timeout=0.05):
+                    pass
+        finally:
+            os.close(fd)
+        stats = get_lock_stats()
+        self.assertEqual(1, stats.timeouts)
+        self.assertGreaterEqual(stats.total_wait, 0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+"""
+Test namespaced managed blocks
+"""
+
+# pylint: disable=fixme,import-outside-toplevel
+# flake8: noqa: E501
+
+import os
+import sys
+import unittest
+
+from setenvironment.bash_parser import (
+    END_MARKER,
+    START_MARKER,
+    end_marker,
+    read_bash_file_lines,
+    start_marker,
+)
+from setenvironment.setenv import (
+    add_env_path,
+    add_to_path_group,
+    get_env_var,
+    remove_path_group,
+    set_env_var,
+    unset_env_var,
+)
+from setenvironment.setenv_unix import get_env_vars_from_shell
+from setenvironment.testing.basetest import BASHRC, BaseTest
+from setenvironment.util import read_utf8
+
+
+@unittest.skipIf(sys.platform == "win32", "Namespaces are blocks of the bash file.")
+class NamespaceTester(BaseTest):
+    """Tester for namespaced blocks."""
+
+    def tearDown(self) -> None:
+        for key in ["NS_PLAIN", "NS_TOOL", "NS_TOOLCHAIN", "NS_GROUP"]:
+            os.environ.pop(key, None)
+        paths = os.environ["PATH"].split(os.pathsep)
+        os.environ["PATH"] = os.pathsep.join(p for p in paths if not p.startswith("/ns/"))
+        super().tearDown()
+
+    def test_markers(self) -> None:
+        self.assertEqual(START_MARKER, start_marker())
+        self.assertEqual(END_MARKER + ":tool", end_marker("tool"))
+        with self.assertRaises(ValueError):
+            start_marker("bad name")
+
+    def test_blocks_are_independent(self) -> None:
+        set_env_var("NS_PLAIN", "plain")
+        set_env_var("NS_TOOLCHAIN", "chain", namespace="toolchain")
+        set_env_var("NS_TOOL", "tool", namespace="tool")
+        add_env_path("/ns/bin", namespace="tool")
+        self.assertEqual(["export NS_PLAIN=plain"], read_bash_file_lines(BASHRC))
+        self.assertEqual(["export NS_TOOLCHAIN=chain"], read_bash_file_lines(BASHRC, "toolchain"))
+        self.assertEqual(
+            ["export NS_TOOL=tool", "export PATH=/ns/bin:$PATH"],
+            read_bash_file_lines(BASHRC, "tool"),
+        )
+        self.assertIsNone(get_env_var("NS_TOOL"))
+        self.assertEqual("tool", get_env_var("NS_TOOL", namespace="tool"))
+        # A write to one namespace leaves the text of the others alone.
+        before = read_utf8(BASHRC)
+        unset_env_var("NS_TOOL", namespace="tool")
+        after = read_utf8(BASHRC)
+        self.assertEqual(before.replace("export NS_TOOL=tool\n", ""), after)
+
+    def test_path_group_namespace(self) -> None:
+        add_to_path_group("NS_GROUP", "/ns/group", namespace="tool")
+        self.assertEqual("/ns/group", get_env_var("NS_GROUP", namespace="tool"))
+        self.assertIsNone(get_env_var("NS_GROUP"))
+        remove_path_group("NS_GROUP", namespace="tool")
+        self.assertEqual([], read_bash_file_lines(BASHRC, "tool"))
+
+    def test_shell_sources_every_block(self) -> None:
+        set_env_var("NS_PLAIN", "plain")
+        set_env_var("NS_TOOL", "tool", namespace="tool")
+        add_env_path("/ns/bin", namespace="tool")
+        env = get_env_vars_from_shell(BASHRC)
+        self.assertEqual("plain", env.vars["NS_PLAIN"])
+        self.assertEqual("tool", env.vars["NS_TOOL"])
+        self.assertIn("/ns/bin", env.paths)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -57,6 +57,28 @@ class OsEnvironmentTester(unittest.TestCase):
         # assert FOO has been removed from the system environment
         self.assertNotIn("FOO", os.environ)
 
+    def test_store_writes_only_the_delta(self) -> None:
+        """Test that store() leaves keys it did not change alone."""
+        os.environ["OSENV_KEEP"] = "keep"
+        os.environ["OSENV_DROP"] = "drop"
+        try:
+            os_env: OsEnvironment = OsEnvironment()
+            self.assertNotIn("PATH", os_env.vars)
+            os_env.vars["OSENV_NEW"] = "new"
+            del os_env.vars["OSENV_DROP"]
+            self.assertEqual({"OSENV_NEW": "new", "OSENV_DROP": None}, os_env.vars.changes())
+            # Set by someone else after the overlay was made, store keeps it.
+            os.environ["OSENV_LATE"] = "late"
+            os_env.store()
+            self.assertEqual("keep", os.environ["OSENV_KEEP"])
+            self.assertEqual("late", os.environ["OSENV_LATE"])
+            self.assertEqual("new", os.environ["OSENV_NEW"])
+            self.assertNotIn("OSENV_DROP", os.environ)
+            self.assertEqual({}, os_env.vars.changes())
+        finally:
+            for key in ["OSENV_KEEP", "OSENV_DROP", "OSENV_LATE", "OSENV_NEW"]:
+                os.environ.pop(key, None)
+
 
 if __name__ == "__main__":
     unittest.main()
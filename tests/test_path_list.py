@@ -0,0 +1,68 @@
+"""
+Test the PathList that backs Environment.paths
+"""
+
+# pylint: disable=fixme,import-outside-toplevel
+# flake8: noqa: E501
+
+import pickle
+import unittest
+
+from setenvironment.types import Environment, PathList
+
+
+class PathListTester(unittest.TestCase):
+    """Tester for PathList."""
+
+    def assert_consistent(self, paths: PathList) -> None:
+        for path in set(paths):
+            self.assertEqual(list(paths).count(path), paths.count(path))
+        self.assertEqual(len(set(paths)), len(paths._counts))  # pylint: disable=protected-access
+
+    def test_list_operations_keep_counts(self) -> None:
+        paths = PathList(["/a", "/b", "/a"])
+        self.assertIn("/a", paths)
+        self.assertEqual(2, paths.count("/a"))
+        paths.append("/c")
+        paths.insert(0, "/d")
+        paths.extend(["/e", "/a"])
+        paths += ["/f"]
+        paths.remove("/b")
+        paths.pop()
+        paths[0] = "/g"
+        del paths[-1]
+        self.assertEqual(["/g", "/a", "/a", "/c", "/e"], paths)
+        self.assertNotIn("/b", paths)
+        self.assert_consistent(paths)
+        paths.clear()
+        self.assertNotIn("/a", paths)
+
+    def test_bulk_operations(self) -> None:
+        paths = PathList(["/a", "/b", "/a", "/c", "/b"])
+        self.assertEqual(2, paths.discard("/a"))
+        self.assertEqual(0, paths.discard("/missing"))
+        self.assertEqual(["/b", "/c", "/b"], paths)
+        paths.prepend(["/x", "/y"])
+        paths.move_to_front("/c")
+        self.assertEqual(["/c", "/x", "/y", "/b", "/b"], paths)
+        self.assertEqual(3, paths.discard_all(["/b", "/x", "/missing"]))
+        self.assertEqual(["/c", "/y"], paths)
+        self.assert_consistent(paths)
+
+    def test_environment_wraps_paths(self) -> None:
+        env = Environment(vars={"GROUP": "/a:/b"}, paths=["/a", "/b", "/a", "/c"])
+        self.assertIsInstance(env.paths, PathList)
+        env.paths = ["/a", "/b", "/a", "/c"]
+        self.assertIsInstance(env.paths, PathList)
+        self.assertIs(env.paths, env.path_list())
+        env.remove_path_group("GROUP")
+        self.assertEqual(["/c"], env.paths)
+        env.add_to_path_group("GROUP", "/c")
+        self.assertEqual(["/c"], env.paths)
+        copy = pickle.loads(pickle.dumps(env))
+        self.assertEqual(env, copy)
+        self.assertIn("/c", copy.paths)
+
+
+if __name__ == "__main__":
+    unittest.main()
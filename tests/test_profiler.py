@@ -0,0 +1,80 @@
+"""
+Test the startup profiler
+"""
+
+# pylint: disable=fixme,import-outside-toplevel
+# flake8: noqa: E501
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from setenvironment.profiler import _SEP, parse_xtrace, profile_startup
+from setenvironment.testing.basetest import BASHRC, BaseTest
+
+
+def _bash_major() -> int:
+    if sys.platform == "win32":
+        return 0
+    out = subprocess.run(
+        ["/bin/bash", "-c", "echo ${BASH_VERSINFO[0]}"], capture_output=True, check=False
+    )
+    try:
+        return int(out.stdout)
+    except ValueError:
+        return 0
+
+
+def _record(depth: int, stamp: float, path: str, lineno: int, command: str) -> str:
+    return _SEP.join(["+" * depth, f"{stamp:.6f}", path, str(lineno), command])
+
+
+class ParseXtraceTester(unittest.TestCase):
+    """Tester for parse_xtrace."""
+
+    def test_parse(self) -> None:
+        text = "\n".join(
+            [
+                _record(1, 10.0, "", 1, "source /a/rc"),
+                _record(1, 10.001, "/a/rc", 1, "export A=1"),
+                _record(1, 10.5, "/a/rc", 2, "source /a/lib"),
+                "continuation of a multi line command",
+                _record(2, 10.501, "/a/lib", 1, "slow"),
+                _record(1, 11.501, "/a/rc", 3, "source /a/lib"),
+                _record(1, 11.502, "", 1, "set +x"),
+            ]
+        )
+        report = parse_xtrace(text)
+        self.assertAlmostEqual(1.502, report.total, places=3)
+        slowest = report.slowest(1)[0]
+        self.assertEqual(("/a/lib", 1), (slowest.file, slowest.lineno))
+        self.assertAlmostEqual(1.0, slowest.seconds, places=3)
+        self.assertAlmostEqual(0.501, report.per_file["/a/rc"], places=3)
+        self.assertEqual({"/a/lib": 2}, report.duplicates())
+        self.assertIn("/a/lib", report.format())
+
+
+@unittest.skipIf(_bash_major() < 5, "EPOCHREALTIME needs bash 5 or later.")
+class ProfileStartupTester(BaseTest):
+    """Tester for profile_startup."""
+
+    def test_profile(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            lib = os.path.join(tmpdir, "lib.sh")
+            with open(lib, encoding="utf-8", mode="w") as file:
+                file.write("sleep 0.2\n")
+            with open(BASHRC, encoding="utf-8", mode="w") as file:
+                file.write(f"source {lib}\nsource {lib}\n")
+            report = profile_startup(BASHRC)
+        self.assertEqual(2, report.duplicates()[lib])
+        # ~/.profile of the machine may have slower lines, so look ours up.
+        (sleep,) = [line for line in report.lines if line.file == lib]
+        self.assertEqual((1, 2), (sleep.lineno, sleep.count))
+        self.assertGreaterEqual(sleep.seconds, 0.35)
+        self.assertGreaterEqual(report.per_file[lib], 0.35)
+
+
+if __name__ == "__main__":
+    unittest.main()
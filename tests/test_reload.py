@@ -38,6 +38,22 @@ class EnvironmentTester(BaseTest):
         reload_environment()
         self.assertIn("MY_PATH", get_paths())
 
+    @unittest.skipIf(sys.platform == "win32", "Uses the bash file.")
+    def test_normalize(self) -> None:
+        """Tests that normalize drops spelled differently duplicates."""
+        old_path = os.environ["PATH"]
+        try:
+            add_env_path("/norm/bin/")
+            add_env_path("/norm/bin")
+            self.assertEqual({"/norm/bin", "/norm/bin/"}, set(get_paths()[:2]))
+            self.assertEqual(1, get_paths(normalize=True).count("/norm/bin"))
+            os.environ["PATH"] = os.pathsep.join(["/norm/bin", old_path, "/norm/bin/"])
+            reload_environment(normalize=True)
+            self.assertEqual(1, os.environ["PATH"].split(os.pathsep).count("/norm/bin"))
+            self.assertNotIn("/norm/bin/", os.environ["PATH"].split(os.pathsep))
+        finally:
+            os.environ["PATH"] = old_path
+
 
 if __name__ == "__main__":
     unittest.main()
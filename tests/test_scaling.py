@@ -0,0 +1,155 @@
+"""
+Scaling tests: the parser and the path operations must stay linear in the
+size of the rc file and of the PATH.
+
+Each operation is timed at doubling input sizes and a line is fitted through
+log(time) against log(size). Linear work has a slope of about 1, quadratic
+work about 2, so anything above MAX_SLOPE fails. Every size keeps the best of
+a few runs, and a failing fit is measured again before the test fails, so a
+noisy machine does not make it flaky.
+"""
+
+# flake8: noqa: E501
+
+import gc
+import math
+import os
+import sys
+import tempfile
+import time
+import unittest
+from typing import Callable
+
+from setenvironment.bash_parser import (
+    bash_cache_clear,
+    bash_make_environment,
+    bash_rc_set_file,
+    set_bash_file_lines,
+)
+from setenvironment.testing.basetest import BaseTest
+from setenvironment.testing.corpus import (
+    make_block,
+    make_exports,
+    make_paths,
+    write_corpus,
+)
+from setenvironment.types import Environment
+
+SIZES = [2500, 5000, 10000, 20000]
+REPEAT = 5
+ATTEMPTS = 3
+MAX_SLOPE = 1.5
+
+
+def _best_time(func: Callable[[], object], setup: Callable[[], object]) -> float:
+    best = float("inf")
+    for _ in range(REPEAT):
+        arg = setup()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            func(arg)  # type: ignore[call-arg]
+            best = min(best, time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return best
+
+
+def fit_slope(sizes: list[int], timings: list[float]) -> float:
+    """Least squares slope of log(timing) against log(size)."""
+    xs = [math.log(n) for n in sizes]
+    ys = [math.log(max(t, 1e-9)) for t in timings]
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    num = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    den = sum((x - mean_x) ** 2 for x in xs)
+    return num / den
+
+
+class ScalingTester(BaseTest):
+    """Fails when an operation grows clearly faster than linearly."""
+
+    def assert_linear(
+        self, make_setup: Callable[[int], Callable[[], object]], func, sizes=None
+    ) -> None:
+        sizes = sizes or SIZES
+        slopes = []
+        for _ in range(ATTEMPTS):
+            timings = [_best_time(func, make_setup(n)) for n in sizes]
+            slope = fit_slope(sizes, timings)
+            if slope <= MAX_SLOPE:
+                return
+            slopes.append(slope)
+        self.fail(f"Superlinear growth, log-log slopes {slopes} over sizes {sizes}")
+
+    def test_fit_slope(self) -> None:
+        sizes = [1, 2, 4, 8]
+        self.assertAlmostEqual(1.0, fit_slope(sizes, [n * 0.001 for n in sizes]))
+        self.assertAlmostEqual(2.0, fit_slope(sizes, [n * n * 0.001 for n in sizes]))
+
+    def test_remove_path_group(self) -> None:
+        def make_setup(n: int):
+            paths = make_paths(n, duplicates=0.5)
+            group = list(dict.fromkeys(paths))[: n // 10]
+            return lambda: Environment({"GROUP": ":".join(group)}, list(paths))
+
+        self.assert_linear(make_setup, lambda env: env.remove_path_group("GROUP"))
+
+    def test_add_and_remove_from_path_group(self) -> None:
+        def make_setup(n: int):
+            paths = make_paths(n, duplicates=0.5)
+            return lambda: Environment({"GROUP": ":".join(paths[:10])}, list(paths))
+
+        def run(env: Environment) -> None:
+            for i in range(20):
+                env.add_to_path_group("GROUP", f"/opt/corpus/{i}/bin")
+            for i in range(20):
+                env.remove_from_path_group("GROUP", f"/opt/corpus/{i}/bin")
+
+        self.assert_linear(make_setup, run)
+
+    def test_environment_str(self) -> None:
+        def make_setup(n: int):
+            env = Environment(make_exports(n), make_paths(n))
+            return lambda: env
+
+        self.assert_linear(make_setup, str)
+
+    @unittest.skipIf(sys.platform == "win32", "Uses the bash file.")
+    def test_set_bash_file_lines(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            shell_file = os.path.join(tmpdir, "rc")
+
+            def make_setup(n: int):
+                lines = make_block(make_exports(n), make_paths(n))[1:-1]
+
+                def setup():
+                    with open(shell_file, mode="wb"):
+                        pass
+                    bash_cache_clear()
+                    return lines
+
+                return setup
+
+            self.assert_linear(make_setup, lambda lines: set_bash_file_lines(lines, shell_file))
+
+    @unittest.skipIf(sys.platform == "win32", "Uses the bash file.")
+    def test_parse(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+
+            def make_setup(n: int):
+                rc_file = write_corpus(
+                    os.path.join(tmpdir, str(n)), exports=n, paths=n, size=n * 100
+                )
+
+                def setup():
+                    bash_rc_set_file(rc_file)
+                    bash_cache_clear()
+
+                return setup
+
+            self.assert_linear(make_setup, lambda _: bash_make_environment())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+"""
+Test the cold start of the command line: the read-only commands must not
+import argparse, subprocess or setenvironment.setenv, and must start within
+a budget.
+"""
+
+# pylint: disable=import-outside-toplevel
+# flake8: noqa: E501
+
+import io
+import statistics
+import subprocess
+import sys
+import time
+import unittest
+from contextlib import redirect_stdout
+
+from setenvironment.main import _fast_main
+from setenvironment.setenv import set_env_var
+from setenvironment.testing.basetest import BASHRC, BaseTest
+
+# Modules the read-only commands used to import and must not any more.
+HEAVY_MODULES = ["argparse", "subprocess", "setenvironment.setenv", "setenvironment.setenv_unix"]
+# Milliseconds a read-only command may add to the start of a bare interpreter.
+STARTUP_BUDGET_MS = 200
+RUNS = 7
+
+
+def imported_modules(args: list[str]) -> set[str]:
+    """Runs python -X importtime with args, returns the modules it imported."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = set()
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            modules.add(line.rsplit("|", 1)[1].strip())
+    return modules
+
+
+def median_ms(args: list[str]) -> float:
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], stdout=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+@unittest.skipIf(sys.platform == "win32", "The fast path reads the bash file.")
+class StartupTester(BaseTest):
+    """Tester for the cold start of the command line."""
+
+    def fast_main(self, *argv: str) -> tuple[int | None, str]:
+        out = io.StringIO()
+        with redirect_stdout(out):
+            code = _fast_main(list(argv))
+        return code, out.getvalue()
+
+    def test_fast_path_output(self) -> None:
+        set_env_var("FOO", "BAR")
+        set_env_var("FOO", "NS", namespace="tool")
+        self.assertEqual((0, "BAR\n"), self.fast_main("--config", BASHRC, "get", "FOO"))
+        self.assertEqual(
+            (0, "NS\n"), self.fast_main(f"--config={BASHRC}", "--namespace", "tool", "get", "FOO")
+        )
+        self.assertEqual((0, "\n"), self.fast_main("get", "MISSING"))
+        self.assertEqual((0, "1\n"), self.fast_main("has", "FOO"))
+        self.assertEqual((0, "0\n"), self.fast_main("has", "MISSING"))
+        code, out = self.fast_main("bashrc")
+        self.assertEqual(0, code)
+        self.assertIn("export FOO=BAR", out)
+
+    def test_falls_back_to_argparse(self) -> None:
+        for argv in [
+            ["--help"],
+            ["--trace", "get", "FOO"],
+            ["--conf", BASHRC, "get", "FOO"],
+            ["get"],
+            ["get", "FOO", "extra"],
+            ["get", "--help"],
+            ["set", "FOO", "BAR"],
+            ["--config"],
+            [],
+        ]:
+            self.assertIsNone(self.fast_main(*argv)[0], argv)
+
+    def test_read_only_commands_skip_heavy_imports(self) -> None:
+        set_env_var("FOO", "BAR")
+        commands = [
+            ["-m", "setenvironment.main", "--config", BASHRC, "get", "FOO"],
+            ["-m", "setenvironment.main", "--config", BASHRC, "has", "FOO"],
+            ["-m", "setenvironment.main", "--config", BASHRC, "bashrc"],
+            [
+                "-c",
+                "from setenvironment.cli import getenv; getenv()",
+                "FOO",
+                "--config-file",
+                BASHRC,
+            ],
+        ]
+        for args in commands:
+            modules = imported_modules(args)
+            self.assertIn("setenvironment.bash_parser", modules, args)
+            self.assertFalse(modules.intersection(HEAVY_MODULES), args)
+
+    def test_startup_budget(self) -> None:
+        set_env_var("FOO", "BAR")
+        bare = median_ms(["-c", "pass"])
+        get = median_ms(["-m", "setenvironment.main", "--config", BASHRC, "get", "FOO"])
+        self.assertLess(
+            get - bare, STARTUP_BUDGET_MS, f"get took {get:.0f} ms, a bare python {bare:.0f} ms"
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+"""
+Test the in process evaluator of the managed blocks
+"""
+
+# pylint: disable=fixme,import-outside-toplevel
+# flake8: noqa: E501
+
+import os
+import sys
+import unittest
+
+from setenvironment.bash_parser import bash_namespaces, set_bash_file_lines
+from setenvironment.journal import journal_set_mode
+from setenvironment.setenv import (
+    add_env_path,
+    reload_environment,
+    set_env_var,
+    transaction,
+)
+from setenvironment.static_eval import UnsupportedSyntax, evaluate_value, static_eval
+from setenvironment.testing.basetest import BASHRC, BaseTest
+
+
+@unittest.skipIf(sys.platform == "win32", "Windows does not have a bash file.")
+class StaticEvalTester(BaseTest):
+    """Tester for static_eval."""
+
+    def tearDown(self) -> None:
+        journal_set_mode(False)
+        for key in ["SE_FOO", "SE_BAR", "SE_TOOL"]:
+            os.environ.pop(key, None)
+        paths = os.environ["PATH"].split(os.pathsep)
+        os.environ["PATH"] = os.pathsep.join(p for p in paths if not p.startswith("/se/"))
+        super().tearDown()
+
+    def test_evaluate_value(self) -> None:
+        env = {"HOME": "/home/me", "A": "a"}
+        self.assertEqual("lit", evaluate_value("lit", env))
+        self.assertEqual("a/b", evaluate_value("$A/b", env))
+        self.assertEqual("a b", evaluate_value('"${A} b"', env))
+        self.assertEqual("$A", evaluate_value("'$A'", env))
+        self.assertEqual("/home/me/bin:x", evaluate_value("~/bin:x", env))
+        self.assertEqual("", evaluate_value("$MISSING", env))
+        for value in ["$(date)", "`date`", "*.txt", '"$1"', "${A:-x}", "a b", "~root"]:
+            with self.assertRaises(UnsupportedSyntax, msg=value):
+                evaluate_value(value, env)
+
+    def test_matches_blocks(self) -> None:
+        set_env_var("SE_FOO", "foo")
+        set_env_var("SE_BAR", "$SE_FOO/bar")
+        set_env_var("SE_TOOL", "tool", namespace="tool")
+        add_env_path("/se/bin")
+        self.assertEqual([None, "tool"], bash_namespaces(BASHRC))
+        changes = static_eval(BASHRC, {"PATH": "/usr/bin"})
+        self.assertIsNotNone(changes)
+        assert changes is not None
+        self.assertEqual("foo/bar", changes["SE_BAR"])
+        self.assertEqual("tool", changes["SE_TOOL"])
+        self.assertEqual("/se/bin:/usr/bin", changes["PATH"])
+
+    def test_journal_is_replayed(self) -> None:
+        journal_set_mode(True)
+        set_env_var("SE_FOO", "one")
+        set_env_var("SE_FOO", "two")
+        changes = static_eval(BASHRC, {})
+        assert changes is not None
+        self.assertEqual("two", changes["SE_FOO"])
+
+    def test_falls_back_to_bash(self) -> None:
+        set_bash_file_lines(["export SE_FOO=$(echo foo)"], BASHRC)
+        self.assertIsNone(static_eval(BASHRC))
+        os.environ.pop("SE_FOO", None)
+        reload_environment(fast=True)
+        self.assertEqual("foo", os.environ["SE_FOO"])
+
+    def test_fast_reload(self) -> None:
+        set_env_var("SE_FOO", "foo")
+        add_env_path("/se/bin")
+        os.environ.pop("SE_FOO")
+        reload_environment(fast=True)
+        reload_environment(fast=True)
+        self.assertEqual("foo", os.environ["SE_FOO"])
+        self.assertEqual(1, os.environ["PATH"].split(os.pathsep).count("/se/bin"))
+
+    def test_fast_reload_unset_is_transactional(self) -> None:
+        set_bash_file_lines(["unset SE_BAR"], BASHRC)
+        os.environ["SE_BAR"] = "bar"
+        with self.assertRaises(KeyError):
+            with transaction():
+                reload_environment(fast=True)
+                raise KeyError("abort")
+        self.assertEqual("bar", os.environ["SE_BAR"])
+        reload_environment(fast=True)
+        self.assertNotIn("SE_BAR", os.environ)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+"""
+Test the tracing spans
+"""
+
+# pylint: disable=fixme,import-outside-toplevel
+# flake8: noqa: E501
+
+import subprocess
+import sys
+import unittest
+
+from setenvironment import trace
+from setenvironment.bash_parser import bash_cache_clear
+from setenvironment.setenv import get_env_var, set_env_var
+from setenvironment.testing.basetest import BASHRC, BaseTest
+
+
+class TraceTester(BaseTest):
+    """Tester for trace."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.collector = trace.SpanCollector()
+
+    def tearDown(self) -> None:
+        trace.remove_listener(self.collector)
+        super().tearDown()
+
+    def test_disabled_is_a_shared_no_op(self) -> None:
+        self.assertFalse(trace.TRACING)
+        with trace.span("read", path="x") as span:
+            span.add_bytes(10)
+        self.assertIs(trace._NULL_SPAN, span)  # pylint: disable=protected-access
+
+    def test_nesting_and_errors(self) -> None:
+        trace.add_listener(self.collector)
+        with self.assertRaises(KeyError):
+            with trace.span("outer"):
+                with trace.span("inner", path="/x") as inner:
+                    inner.add_bytes(3)
+                raise KeyError("boom")
+        inner_span, outer_span = self.collector.spans
+        self.assertEqual("inner", inner_span.name)
+        self.assertIs(outer_span, inner_span.parent)
+        self.assertEqual(1, inner_span.depth)
+        self.assertEqual(3, inner_span.bytes)
+        self.assertEqual("KeyError", outer_span.error)
+        self.assertGreaterEqual(outer_span.duration, inner_span.duration)
+        lines = trace.format_tree(self.collector.spans).splitlines()
+        self.assertIn("  outer  (error=KeyError)", lines[0])
+        self.assertIn("    inner  (3 bytes, path=/x)", lines[1])
+
+    def test_listener_error_only_warns(self) -> None:
+        def broken(_span: trace.Span) -> None:
+            raise RuntimeError("backend down")
+
+        trace.add_listener(broken)
+        try:
+            with self.assertWarns(UserWarning):
+                with trace.span("read"):
+                    pass
+        finally:
+            trace.remove_listener(broken)
+        self.assertFalse(trace.TRACING)
+
+    @unittest.skipIf(sys.platform == "win32", "Uses the bash file.")
+    def test_reads_parses_and_writes(self) -> None:
+        trace.add_listener(self.collector)
+        set_env_var("FOO", "BAR")
+        bash_cache_clear()
+        self.assertEqual("BAR", get_env_var("FOO"))
+        names = [span.name for span in self.collector.spans]
+        self.assertIn("write", names)
+        self.assertIn("parse", names)
+        write = next(span for span in self.collector.spans if span.name == "write")
+        self.assertEqual(BASHRC, write.attrs["path"])
+        self.assertGreater(write.bytes, 0)
+
+    @unittest.skipIf(sys.platform == "win32", "Uses the bash file.")
+    def test_cli_trace(self) -> None:
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "setenvironment.main",
+                "--config",
+                BASHRC,
+                "--trace",
+                "set",
+                "FOO",
+                "BAR",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.assertEqual("", result.stdout)
+        self.assertIn("setenvironment set", result.stderr)
+        self.assertIn("write", result.stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()
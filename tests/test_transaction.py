@@ -0,0 +1,65 @@
+"""
+Test batching mutations with transaction()
+"""
+
+# pylint: disable=fixme,import-outside-toplevel
+# flake8: noqa: E501
+
+import os
+import sys
+import unittest
+
+from setenvironment import (
+    add_env_path,
+    get_env_var,
+    set_env_var,
+    transaction,
+    unset_env_var,
+)
+from setenvironment.setenv import add_to_path_group
+from setenvironment.testing.basetest import BASHRC, BaseTest
+
+
+@unittest.skipIf(sys.platform == "win32", "Transactions only batch on unix.")
+class TransactionTester(BaseTest):
+    """Tester for transaction()."""
+
+    def tearDown(self) -> None:
+        for key in ["TXN_FOO", "TXN_BAR", "TXN_GROUP"]:
+            os.environ.pop(key, None)
+        paths = os.environ["PATH"].split(os.pathsep)
+        os.environ["PATH"] = os.pathsep.join(p for p in paths if not p.startswith("/txn/"))
+        super().tearDown()
+
+    def test_commit_writes_once(self) -> None:
+        mtime = os.stat(BASHRC).st_mtime_ns
+        with transaction():
+            set_env_var("TXN_FOO", "1")
+            set_env_var("TXN_BAR", "2")
+            unset_env_var("TXN_BAR")
+            add_env_path("/txn/path")
+            add_to_path_group("TXN_GROUP", "/txn/group")
+            # Staged, visible to reads but not written yet.
+            self.assertEqual("1", get_env_var("TXN_FOO"))
+            self.assertEqual(mtime, os.stat(BASHRC).st_mtime_ns)
+            self.assertNotIn("TXN_FOO", os.environ)
+        self.assertEqual("1", get_env_var("TXN_FOO"))
+        self.assertIsNone(get_env_var("TXN_BAR"))
+        self.assertEqual("/txn/group", get_env_var("TXN_GROUP"))
+        self.assertEqual("1", os.environ["TXN_FOO"])
+        self.assertIn("/txn/path", os.environ["PATH"].split(os.pathsep))
+        self.assertIn("/txn/group", os.environ["PATH"].split(os.pathsep))
+
+    def test_rollback_on_exception(self) -> None:
+        with self.assertRaises(RuntimeError):
+            with transaction():
+                set_env_var("TXN_FOO", "1")
+                add_env_path("/txn/path")
+                raise RuntimeError("abort")
+        self.assertIsNone(get_env_var("TXN_FOO"))
+        self.assertNotIn("TXN_FOO", os.environ)
+        self.assertNotIn("/txn/path", os.environ["PATH"].split(os.pathsep))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -53,6 +53,20 @@ class UnixPathTester(BaseTest):
         self.assertEqual("foo", lines[0])
         self.assertEqual("bar", lines[1])
 
+    def test_set_lines_keeps_bytes_outside_block(self) -> None:
+        """Bytes that are not utf-8 before and after the block survive a write."""
+        prefix = b"# latin-1 \xe9t\xe9\r\nalias ll='ls -l'\n"
+        suffix = b"# trailing \xff\xfe garbage"
+        block = (START_MARKER + "\nold\n" + END_MARKER + "\n").encode("utf-8")
+        with open(BASHRC, mode="wb") as file:
+            file.write(prefix + block + suffix)
+        set_bash_file_lines(["new1", "new2"], BASHRC)
+        with open(BASHRC, mode="rb") as file:
+            data = file.read()
+        new_block = (START_MARKER + "\nnew1\nnew2\n" + END_MARKER + "\n").encode("utf-8")
+        self.assertEqual(prefix + new_block + suffix, data)
+        self.assertEqual(["new1", "new2"], read_bash_file_lines(BASHRC))
+
     @unittest.skipIf(sys.platform == "win32", "Windows does not have a shell.")
     def test_get_env_vars_from_shell(self) -> None:
         """Test setting an env variable and then reloading it fromn the shell."""
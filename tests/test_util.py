@@ -0,0 +1,104 @@
+"""
+Test the util module
+"""
+
+# pylint: disable=fixme,import-outside-toplevel
+
+import os
+import sys
+import tempfile
+import unittest
+
+from setenvironment.util import (
+    FSYNC_POLICIES,
+    atomic_write_bytes,
+    cached_realpath,
+    canonicalize_paths,
+    parse_env0,
+    read_utf8,
+    write_utf8,
+)
+
+
+class AtomicWriteTester(unittest.TestCase):
+    """Tester for the atomic write engine."""
+
+    def test_policies_replace_contents(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "bashrc")
+            for policy in FSYNC_POLICIES:
+                atomic_write_bytes(path, policy.encode("utf-8"), fsync=policy)
+                self.assertEqual(policy, read_utf8(path))
+            self.assertEqual(["bashrc"], os.listdir(tmpdir))  # No temp files left.
+            with self.assertRaises(ValueError):
+                atomic_write_bytes(path, b"", fsync="bogus")
+
+    @unittest.skipIf(sys.platform == "win32", "Unix permissions and symlinks.")
+    def test_keeps_mode_and_symlink(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            target = os.path.join(tmpdir, "dotfiles_bashrc")
+            link = os.path.join(tmpdir, "bashrc")
+            write_utf8(target, "old")
+            os.chmod(target, 0o640)
+            os.symlink(target, link)
+            write_utf8(link, "new")
+            self.assertTrue(os.path.islink(link))
+            self.assertEqual("new", read_utf8(target))
+            self.assertEqual(0o640, os.stat(target).st_mode & 0o777)
+
+
+class ParseEnv0Tester(unittest.TestCase):
+    """Tester for the env -0 splitter."""
+
+    def test_parse_env0(self) -> None:
+        data = b"junk\0A=1\0MULTI=line1\nline2\0EQ=a=b\0EMPTY=\0BIN=\xff\0"
+        out = parse_env0(data, start=5)
+        self.assertEqual("1", out["A"])
+        self.assertEqual("line1\nline2", out["MULTI"])
+        self.assertEqual("a=b", out["EQ"])
+        self.assertEqual("", out["EMPTY"])
+        self.assertEqual("\udcff", out["BIN"])
+        self.assertNotIn("junk", out)
+
+
+class CanonicalizePathsTester(unittest.TestCase):
+    """Tester for the PATH canonicalization."""
+
+    def test_normalize_and_dedupe(self) -> None:
+        os.environ["CANON_DIR"] = "/opt/canon"
+        try:
+            paths = [
+                "/usr/bin",
+                "/usr/bin/",
+                "",
+                "/opt/canon/bin",
+                "$CANON_DIR/bin",
+                "/usr//bin",
+                "/a",
+            ]
+            self.assertEqual(["/usr/bin", "/opt/canon/bin", "/a"], canonicalize_paths(paths))
+        finally:
+            os.environ.pop("CANON_DIR")
+        home = os.path.expanduser("~")
+        self.assertEqual([home], canonicalize_paths(["~", home]))
+
+    @unittest.skipIf(sys.platform == "win32", "Symlinks need privileges on windows.")
+    def test_realpath(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            real = os.path.join(tmpdir, "real")
+            other = os.path.join(tmpdir, "other")
+            link = os.path.join(tmpdir, "link")
+            os.mkdir(real)
+            os.mkdir(other)
+            os.symlink(real, link)
+            self.assertEqual([link, real], canonicalize_paths([link, real]))
+            self.assertEqual([link], canonicalize_paths([link, real], realpath=True))
+            self.assertEqual(os.path.realpath(real), cached_realpath(link))
+            # Retargeting the symlink invalidates the cached entry.
+            os.remove(link)
+            os.symlink(other, link)
+            self.assertEqual(os.path.realpath(other), cached_realpath(link))
+
+
+if __name__ == "__main__":
+    unittest.main()